@@ -0,0 +1,510 @@
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# asyncio SunSpec client for Modbus TCP devices. Requires Python 3.5 or later, the module does not import on
+# Python 2 and is not imported by the blocking client.
+
+import asyncio
+import hashlib
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.aioclient as aiomodbus
+from sunspec.core.client import SunSpecClientError
+
+class AsyncClientDevice(client.ClientDevice):
+    """A :const:`sunspec.core.client.ClientDevice` accessed through an asyncio
+    Modbus TCP transport. The model, read plan and decode logic are shared
+    with the blocking client, only the device access methods are coroutines.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            Device IP address.
+
+        ipport :
+            Device IP port. Defaults to 502.
+
+        pathlist :
+            Pathlist object containing alternate paths to support files.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5.
+
+        trace :
+            Enable low level trace.
+
+        tls :
+            Use TLS (Modbus/TCP Security). Defaults to `tls=False`.
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only
+            used if `tls=True`.
+
+        insecure_skip_tls_verify :
+            Skip verification of server TLS certificate. Only used if
+            `tls=True`.
+
+        idle_timeout :
+            Idle time in seconds after which the connection is re-established
+            before the next request.
+
+        pipeline :
+            Maximum number of read requests in flight on the connection.
+
+    Raises:
+
+        SunSpecClientError: Raised for any sunspec module error.
+    """
+
+    def __init__(self, slave_id, ipaddr, ipport=None, pathlist=None, timeout=None, trace=False, tls=False, cafile=None,
+                 certfile=None, keyfile=None, insecure_skip_tls_verify=False, idle_timeout=None, pipeline=1):
+        client.ClientDevice.__init__(self, None, slave_id=slave_id, pathlist=pathlist)
+
+        self.type = client.TCP
+        self.modbus_device = aiomodbus.AsyncModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls,
+                                                                  cafile, certfile, keyfile, insecure_skip_tls_verify,
+                                                                  idle_timeout=idle_timeout, pipeline=pipeline)
+
+    async def read(self, addr, count):
+        """Read Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Register count.
+
+        Returns:
+            Byte string containing register contents.
+        """
+
+        try:
+            return await self.modbus_device.read(addr, count)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus read error: %s' % str(e))
+
+    async def write(self, addr, data):
+        """Write Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+        """
+
+        try:
+            await self.modbus_device.write(addr, data)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus write error: %s' % str(e))
+
+    async def scan(self, progress=None, delay=None, cache=None):
+        """Scan all the models of the physical device and create the
+        corresponding model objects within the device object based on the
+        SunSpec model definitions. See :meth:`ClientDevice.scan`, the model
+        headers are always parsed from reads of up to the maximum request
+        size.
+
+        Parameters:
+
+            progress :
+                Function called with a progress message for each model. The
+                scan is terminated if it returns False.
+
+            delay :
+                Delay in seconds between scan requests.
+
+            cache :
+                Path of the scan cache file, see :meth:`ClientDevice.scan`.
+                The file is read and written with blocking file operations.
+        """
+
+        error = ''
+
+        if cache is not None and self.base_addr is None and await self.scan_cache_load(cache):
+            return
+
+        if self.base_addr is None:
+            for addr in self.base_addr_list:
+                try:
+                    data = await self.read(addr, 3)
+                    if data[:4] == b'SunS':
+                        self.base_addr = addr
+                        break
+                    else:
+                        error = 'Device responded - not SunSpec register map'
+                except SunSpecClientError as e:
+                    if not error:
+                        error = str(e)
+
+                if delay is not None:
+                    await asyncio.sleep(delay)
+
+        if self.base_addr is None:
+            if not error:
+                error = 'Unknown error'
+            raise SunSpecClientError(error)
+
+        for model_id, addr, model_len in await self.scan_headers(self.base_addr + 2, delay):
+            if progress is not None:
+                cont = progress('Scanning model %s' % (model_id))
+                if not cont:
+                    raise SunSpecClientError('Device scan terminated')
+            model = AsyncClientModel(self, model_id, addr, model_len)
+            try:
+                model.load()
+            except Exception as e:
+                model.load_error = str(e)
+            self.add_model(model)
+
+        await self.probe_max_count()
+
+        if cache is not None:
+            await self.scan_cache_save(cache)
+
+    async def probe_max_count(self):
+        """Detect the largest register count the device accepts in a single
+        request. See :meth:`ClientDevice.probe_max_count`.
+        """
+
+        request = self.probe_max_count_request()
+        if request is None:
+            return
+
+        try:
+            await self.read(*request)
+        except SunSpecClientError:
+            pass
+
+    async def scan_fingerprint(self, base_addr, count):
+        """Read the fingerprint used to check that a scan cache file still
+        matches the device. See :meth:`ClientDevice.scan_fingerprint`.
+
+        Returns:
+
+            Hex digest of the registers.
+        """
+
+        return hashlib.sha1(bytes(await self.read(base_addr, count))).hexdigest()
+
+    async def scan_cache_load(self, filename):
+        """Create the models of the device from a scan cache file if the
+        device still matches the fingerprint stored in the file. See
+        :meth:`ClientDevice.scan_cache_load`.
+
+        Returns:
+
+            True if the models were created from the cache, False otherwise.
+        """
+
+        cache = self.scan_cache_read(filename)
+        if cache is None:
+            return False
+
+        try:
+            fingerprint = await self.scan_fingerprint(cache['base_addr'], cache['fingerprint_len'])
+        except SunSpecClientError:
+            return False
+        if fingerprint != cache['fingerprint']:
+            return False
+
+        self.scan_cache_apply(cache, AsyncClientModel)
+        return True
+
+    async def scan_cache_save(self, filename):
+        """Write the scan results of the device to a scan cache file. See
+        :meth:`ClientDevice.scan_cache_save`.
+        """
+
+        count = self.scan_cache_fingerprint_len()
+        if count is None:
+            return
+
+        try:
+            self.scan_cache_write(filename, count, await self.scan_fingerprint(self.base_addr, count))
+        except SunSpecClientError:
+            pass
+
+    async def scan_headers(self, addr, delay=None):
+        """Read the model headers of the device starting at the header of the
+        first model. See :meth:`ClientDevice.scan_headers`.
+
+        Returns:
+
+            List of (model id, model address, model length) tuples.
+        """
+
+        headers = []
+        reads = self.scan_headers_reads(addr, headers)
+        try:
+            read_addr, count = next(reads)
+            while True:
+                try:
+                    data = await self.read(read_addr, count)
+                except SunSpecClientError as e:
+                    read_addr, count = reads.throw(e)
+                    continue
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                read_addr, count = reads.send(data)
+        except StopIteration:
+            pass
+
+        return headers
+
+    async def read_points(self, scheduled=False):
+        """Read the points for all models in the device from the physical
+        device. See :meth:`ClientDevice.read_points`.
+
+        Parameters:
+
+            scheduled :
+                If True, only the models that are due according to
+                *poll_intervals* are read.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the point values just read.
+        """
+
+        prev, models, now = self.read_points_begin(scheduled)
+
+        try:
+            if self.read_gap_max is not None and len(models) > 1:
+                try:
+                    await self.read_models(models)
+                except modbus.ModbusClientException as e:
+                    if e.except_code not in client.READ_GAP_EXCEPT_CODES:
+                        raise
+                    # device rejected the unused registers of a coalesced request, fall back to reading each
+                    # model on its own
+                    self.read_gap_max = None
+                    for model in models:
+                        await self.read_model(model)
+            else:
+                for model in models:
+                    await self.read_model(model)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus read error: %s' % str(e))
+
+        return self.read_points_end(prev, models, now)
+
+    async def read_models(self, models):
+        """Read the registers of the specified models using the requests
+        computed by :meth:`read_plan` and decode the points of each model.
+        See :meth:`ClientDevice.read_models`.
+
+        Parameters:
+
+            models :
+                List of model objects to read.
+        """
+
+        while True:
+            max_count = self.modbus_device.max_count
+            plan = self.read_plan(models)
+            responses = await self.modbus_device.read_multiple(plan)
+            # requests split for a maximum count lowered during the read may have split a point
+            if self.modbus_device.max_count == max_count:
+                break
+
+        self.decode_models(models, plan, responses)
+
+    async def read_model(self, model):
+        """Read the registers of a model and decode its points. Models longer
+        than the maximum register count of the Modbus device are read with
+        requests that do not split a point.
+
+        Parameters:
+
+            model :
+                Model object to read.
+        """
+
+        max_count = self.modbus_device.max_count
+        if model.len <= max_count:
+            data = await self.modbus_device.read(model.addr, model.len)
+            if model.len <= self.modbus_device.max_count:
+                model.decode_points(data)
+                return
+        await self.read_models([model])
+
+    async def write_points(self):
+        """Write all points of all models in the device that have been
+        modified since the last write operation to the physical device.
+        """
+
+        for model in self.models_list:
+            if model.model_type is not None:
+                await model.write_points()
+
+class AsyncClientModel(client.ClientModel):
+    """A :const:`sunspec.core.client.ClientModel` of an
+    :const:`AsyncClientDevice`. The device access methods are coroutines.
+    """
+
+    __slots__ = ()
+
+    def load(self):
+        """Create the block and point objects within the model object based on
+        the corresponding SunSpec model definition.
+        """
+
+        device.Model.load(self, block_class=client.ClientBlock, point_class=AsyncClientPoint)
+        self.decode_plan = self.compile()
+        self.diff_plan = self.compile_diff()
+
+    async def read_points(self):
+        """Read all points in the model from the physical device.
+        """
+
+        if self.model_type is not None:
+            try:
+                await self.device.read_model(self)
+            except modbus.ModbusClientError as e:
+                raise SunSpecClientError('Modbus error: %s' % str(e))
+
+    async def write_points(self):
+        """Write all points that have been modified since the last write
+        operation to the physical device.
+        """
+
+        for addr, data in self.write_requests():
+            await self.device.write(addr, data)
+
+class AsyncClientPoint(client.ClientPoint):
+    """A :const:`sunspec.core.client.ClientPoint` of an
+    :const:`AsyncClientDevice`. The device access methods are coroutines.
+    """
+
+    __slots__ = ()
+
+    async def write(self):
+        """Write the point to the physical device.
+        """
+
+        data = self.point_type.to_data(self.value_base, (int(self.point_type.len) * 2))
+        await self.block.model.device.write(int(self.addr), data)
+        self.dirty = False
+
+class AsyncSunSpecClientDevice(client.SunSpecClientDevice):
+    """The asyncio counterpart of
+    :const:`sunspec.core.client.SunSpecClientDevice` for Modbus TCP devices.
+    The device is not scanned on creation, the named model attributes are
+    created by :meth:`scan`. Points are read and written for the whole device
+    with :meth:`read` and :meth:`write`, the read and write methods of the
+    model attributes are coroutines as well.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            Device IP address.
+
+        ipport :
+            Device IP port. Defaults to 502.
+
+        pathlist :
+            Pathlist object containing alternate paths to support files.
+
+        timeout :
+            Modbus request timeout in seconds.
+
+        idle_timeout :
+            Idle time in seconds after which the connection is re-established
+            before the next request.
+
+        pipeline :
+            Maximum number of read requests in flight on the connection.
+
+    Attributes:
+
+        device
+            The :const:`AsyncClientDevice` associated with this object.
+
+        models
+            List of model names present in the device after the scan.
+    """
+
+    def __init__(self, slave_id, ipaddr, ipport=None, pathlist=None, timeout=None, trace=False, tls=False,
+                 cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, idle_timeout=None,
+                 pipeline=1):
+
+        self.device = AsyncClientDevice(slave_id, ipaddr, ipport, pathlist, timeout, trace, tls, cafile, certfile,
+                                        keyfile, insecure_skip_tls_verify, idle_timeout=idle_timeout,
+                                        pipeline=pipeline)
+        self.models = []
+
+    async def scan(self, progress=None, delay=None, cache=None):
+        """Scan the device and create the named model attributes.
+        """
+
+        try:
+            await self.device.scan(progress=progress, delay=delay, cache=cache)
+            self._set_model_attributes()
+        except Exception:
+            self.device.close()
+            raise
+
+    async def read(self, scheduled=False):
+        """Read the points for all models in the device from the physical
+        device.
+
+        Parameters:
+
+            scheduled :
+                If True, only read the models that are due according to the
+                poll intervals of the device.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the point values just read.
+        """
+
+        return await self.device.read_points(scheduled)
+
+    async def write(self):
+        """Write all modified points of all models in the device to the
+        physical device.
+        """
+
+        await self.device.write_points()
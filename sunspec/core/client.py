@@ -21,6 +21,9 @@
     IN THE SOFTWARE.
 """
 
+import collections
+import hashlib
+import json
 import os
 import time
 import struct
@@ -31,16 +34,138 @@ import sunspec.core.util as util
 import sunspec.core.suns as suns
 from sunspec.core.util import SunSpecError
 
+# numpy is optional and only used for vectorized decoding of repeating blocks
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 RTU = 'RTU'
 TCP = 'TCP'
 MAPPED = 'Mapped'
+# RTU frames over TCP to a transparent serial converter
+RTU_TCP = 'RTU_TCP'
 
 PARITY_NONE = modbus.PARITY_NONE
 PARITY_EVEN = modbus.PARITY_EVEN
 
+# default largest register gap spanned by a coalesced read request
+READ_GAP_MAX = 8
+# exception codes of devices rejecting the unused registers of a coalesced read request, illegal data value is
+# only left once the request size can not be lowered any further
+READ_GAP_EXCEPT_CODES = (modbus.EXCEPT_ILLEGAL_ADDRESS, modbus.EXCEPT_ILLEGAL_VALUE)
+
+# format version of the scan cache file
+SCAN_CACHE_VERSION = 1
+
+# default scheduled read intervals in seconds by model id, models not listed are read on every
+# scheduled read
+MODEL_POLL_INTERVALS = {
+    1: 3600,        # common
+    120: 3600,      # nameplate ratings
+    121: 300,       # basic settings
+    123: 60,        # immediate controls
+    126: 300,       # volt-var curves
+    127: 300,       # freq-watt parameters
+    128: 300,       # dynamic reactive current
+    132: 300        # volt-watt curves
+}
+
+# struct format code and value conversion for each point data_to function,
+# values of other point types are decoded by the data_to function from a
+# byte string of the point length
+def _nan_to_none(value):
+    if value == value:
+        return value
+
+decode_codes = {
+    util.data_to_s16: ('h', None),
+    util.data_to_u16: ('H', None),
+    util.data_to_s32: ('l', None),
+    util.data_to_u32: ('L', None),
+    util.data_to_s64: ('q', None),
+    util.data_to_u64: ('Q', None),
+    util.data_to_float: ('f', _nan_to_none),
+    util.data_to_double: ('d', _nan_to_none)
+}
+
+# precompiled decoder for the register contents of a model
+DecodePlan = collections.namedtuple('DecodePlan', ['struct', 'points_sf', 'points'])
+
+# numpy dtype and unimplemented value for each numeric point type used for
+# vectorized decoding of repeating blocks
+column_dtypes = {
+    util.data_to_s16: '>i2',
+    util.data_to_u16: '>u2',
+    util.data_to_s32: '>i4',
+    util.data_to_u32: '>u4',
+    util.data_to_s64: '>i8',
+    util.data_to_u64: '>u8',
+    util.data_to_float: '>f4',
+    util.data_to_double: '>f8'
+}
+
+column_unimpl = {
+    suns.suns_is_impl_int16: suns.SUNS_UNIMPL_INT16,
+    suns.suns_is_impl_uint16: suns.SUNS_UNIMPL_UINT16,
+    suns.suns_is_impl_acc16: suns.SUNS_UNIMPL_ACC16,
+    suns.suns_is_impl_enum16: suns.SUNS_UNIMPL_ENUM16,
+    suns.suns_is_impl_bitfield16: suns.SUNS_UNIMPL_BITFIELD16,
+    suns.suns_is_impl_int32: suns.SUNS_UNIMPL_INT32,
+    suns.suns_is_impl_uint32: suns.SUNS_UNIMPL_UINT32,
+    suns.suns_is_impl_acc32: suns.SUNS_UNIMPL_ACC32,
+    suns.suns_is_impl_enum32: suns.SUNS_UNIMPL_ENUM32,
+    suns.suns_is_impl_bitfield32: suns.SUNS_UNIMPL_BITFIELD32,
+    suns.suns_is_impl_ipaddr: suns.SUNS_UNIMPL_IPADDR,
+    suns.suns_is_impl_int64: suns.SUNS_UNIMPL_INT64,
+    suns.suns_is_impl_uint64: suns.SUNS_UNIMPL_UINT64,
+    suns.suns_is_impl_acc64: suns.SUNS_UNIMPL_ACC64,
+    suns.suns_is_impl_sunssf: suns.SUNS_UNIMPL_SUNSSF
+}
+
+# scale factor sources for a repeating block column
+SF_NONE = 0
+SF_CONST = 1
+SF_FIXED = 2
+SF_REPEATING = 3
+
+# precompiled numpy decoder for the repeating blocks of a model
+ColumnsPlan = collections.namedtuple('ColumnsPlan', ['offset', 'count', 'dtype', 'fields'])
+ColumnField = collections.namedtuple('ColumnField', ['name', 'point_type', 'numeric', 'unimpl', 'sf_type', 'sf',
+                                                     'points'])
+
 class SunSpecClientError(SunSpecError):
     pass
 
+# immutable view of a point value taken at the end of a device read
+PointSnapshot = collections.namedtuple('PointSnapshot', ['model_id', 'model_name', 'model_index', 'block_index',
+                                                         'point_id', 'value', 'units', 'description'])
+
+# immutable view of all point values in a device taken at the end of a device read, changed holds the
+# points that changed since the previous snapshot
+DeviceSnapshot = collections.namedtuple('DeviceSnapshot', ['time', 'points', 'changed'])
+
+# copy of the contents of a PointStore, buf holds the value, scale factor and flag columns of capacity points
+StoreSnapshot = collections.namedtuple('StoreSnapshot', ['capacity', 'count', 'buf', 'objects'])
+
+# point store indexes and value columns of the points of a decode plan
+StorePlan = collections.namedtuple('StorePlan', ['plan', 'points_sf', 'points'])
+
+# point value kinds of a PointStore
+STORE_KIND_OBJECT = 0
+STORE_KIND_INT = 1
+STORE_KIND_FLOAT = 2
+
+# point flags of a PointStore
+STORE_FLAG_VALUE = 1
+STORE_FLAG_OBJECT = 2
+STORE_FLAG_SF = 4
+
+# bytes per point of a PointStore buffer: 8 value, 2 scale factor and 1 flags
+STORE_POINT_SIZE = 11
+STORE_INT_MIN = -(1 << 63)
+STORE_INT_MAX = (1 << 63) - 1
+
 class ClientDevice(device.Device):
 
     """ClientDevice
@@ -52,7 +177,7 @@ class ClientDevice(device.Device):
 
         device_type :
              Device type. Possible values: :const:`RTU`, :const:`TCP`,
-             :const:`MAPPED`.
+             :const:`RTU_TCP`, :const:`MAPPED`.
 
         slave_id :
             Modbus slave id.
@@ -68,6 +193,8 @@ class ClientDevice(device.Device):
         baudrate :
             For :const:`RTU` devices, baud rate such as 9600 or 19200. Defaulted
             by modbus module to 9600.
+            For :const:`RTU_TCP` devices, baud rate of the bus behind the
+            converter, used for the inter-frame gap.
 
         parity :
             For :const:`RTU` devices, parity. Possible values:
@@ -75,11 +202,12 @@ class ClientDevice(device.Device):
             Defaulted by modbus module to :const:`PARITY_NONE`.
 
         ipaddr :
-            For :const:`TCP` devices, device IP address.
+            For :const:`TCP` devices, device IP address. For :const:`RTU_TCP`
+            devices, IP address of the serial converter.
 
         ipport :
-            For :const:`TCP` devices, device IP port. Defaulted by modbus module
-            to 502.
+            For :const:`TCP` and :const:`RTU_TCP` devices, device IP port.
+            Defaulted by modbus module to 502.
 
         tls :
             For :const:`TCP` devices, use TLS (Modbus/TCP Security). Defaults
@@ -109,6 +237,30 @@ class ClientDevice(device.Device):
         trace :
             Enable low level trace.
 
+        persistent :
+            For :const:`TCP` devices, keep the connection open between
+            requests instead of connecting for each request. Defaults to
+            `persistent=False`.
+
+        idle_timeout :
+            For persistent :const:`TCP` connections, idle time in seconds after
+            which the connection is re-established before the next request.
+
+        pipeline :
+            For :const:`TCP` devices, maximum number of read requests in flight
+            on the connection. Defaults to 1.
+
+        pool :
+            For :const:`TCP` devices, a
+            :const:`sunspec.core.modbus.client.ModbusTCPPool` shared with the
+            other devices behind the same gateway. See
+            :func:`sunspec.core.modbus.client.modbus_tcp_pool`.
+
+        store :
+            If True, the point values of the device are kept in a
+            :class:`PointStore` instead of the point objects. Requires Python
+            3.3 or later. Defaults to `store=False`.
+
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
@@ -117,7 +269,7 @@ class ClientDevice(device.Device):
 
         type
             Device type. Possible values: :const:`RTU`, :const:`TCP`,
-            :const:`MAPPED`.
+            :const:`RTU_TCP`, :const:`MAPPED`.
 
         name
             For :const:`RTU` devices, the name of the serial port such as 'com4'
@@ -139,10 +291,33 @@ class ClientDevice(device.Device):
         base_addr_list
             List of Modbus base addresses to try when scanning a device for the
             first time.
+
+        snapshot
+            :const:`DeviceSnapshot` taken at the end of the last
+            :meth:`read_points` call or None if the device has not been read.
+
+        changed_points
+            List of the points whose value changed in the last
+            :meth:`read_points` call.
+
+        read_gap_max
+            Largest gap in registers between needed points that a single read
+            request spans when reading all models of the device. If None, each
+            model is read with its own requests.
+
+        poll_intervals
+            Dictionary of the scheduled read interval in seconds by model id.
+            Models not present are read on every scheduled read. Defaults to
+            a copy of :const:`MODEL_POLL_INTERVALS`.
+
+        store
+            :class:`PointStore` holding the point values of the device or
+            None if the values are kept in the point objects.
     """
 
     def __init__(self, device_type, slave_id=None, name=None, pathlist=None, baudrate=None, parity=None, ipaddr=None, ipport=None,
-                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False):
+                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False,
+                 persistent=False, idle_timeout=None, pipeline=1, pool=None, store=False):
         device.Device.__init__(self, addr=None)
 
         self.type = device_type
@@ -152,12 +327,25 @@ class ClientDevice(device.Device):
         self.modbus_device = None
         self.retry_count = 2
         self.base_addr_list = [40000, 0, 50000]
+        self.snapshot = None
+        self.snapshot_index = None
+        self.snapshot_raw = []
+        self.changed_points = []
+        self.read_gap_max = READ_GAP_MAX
+        self.read_plans = {}
+        self.poll_intervals = dict(MODEL_POLL_INTERVALS)
+        self.store = PointStore() if store else None
 
         try:
             if device_type == RTU:
                 self.modbus_device = modbus.ModbusClientDeviceRTU(slave_id, name, baudrate, parity, timeout, self, trace)
             elif device_type == TCP:
-                self.modbus_device = modbus.ModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls, cafile, certfile, keyfile, insecure_skip_tls_verify)
+                self.modbus_device = modbus.ModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls, cafile, certfile, keyfile, insecure_skip_tls_verify,
+                                                                  persistent=persistent, idle_timeout=idle_timeout, pipeline=pipeline,
+                                                                  pool=pool)
+            elif device_type == RTU_TCP:
+                self.modbus_device = modbus.ModbusClientDeviceRTUTCP(slave_id, ipaddr, ipport, timeout, self, trace,
+                                                                     baudrate=baudrate)
             elif device_type == MAPPED:
                 if name is not None:
                     self.modbus_device = modbus.ModbusClientDeviceMapped(slave_id, name, pathlist, self)
@@ -218,30 +406,358 @@ class ClientDevice(device.Device):
         except modbus.ModbusClientError as e:
             raise SunSpecClientError('Modbus write error: %s' % str(e))
 
-    def read_points(self):
+    def vectorize(self, enable=True, points=True):
+        """Enable or disable vectorized (numpy) decoding of the repeating
+        blocks of all models in the device. See
+        :meth:`ClientModel.vectorize`.
+
+        Parameters:
+
+            enable :
+                Enable vectorized decoding if True, disable if False.
+
+            points :
+                Update the point objects of the repeating blocks as well.
+        """
+
+        for model in self.models_list:
+            if model.model_type is not None:
+                model.vectorize(enable, points)
+
+    def read_points(self, scheduled=False):
         """Read the points for all models in the device from the physical
         device.
+
+        Unless *read_gap_max* is None, the registers of all models are read
+        with the minimum set of requests computed by :meth:`read_plan` and
+        each model is decoded from a view into the shared buffer.
+
+        Parameters:
+
+            scheduled :
+                If True, only the models that are due according to
+                *poll_intervals* are read. The other models keep the values of
+                their last read.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the point values just read. The snapshot
+            is also kept in the *snapshot* attribute of the device.
+        """
+
+        prev, models, now = self.read_points_begin(scheduled)
+
+        if self.read_gap_max is not None and len(models) > 1:
+            try:
+                self.read_models(models)
+            except modbus.ModbusClientException as e:
+                if e.except_code not in READ_GAP_EXCEPT_CODES:
+                    raise SunSpecClientError('Modbus read error: %s' % str(e))
+                # device rejected the unused registers of a coalesced request, fall back to reading each model
+                # on its own
+                self.read_gap_max = None
+                for model in models:
+                    model.read_points()
+            except modbus.ModbusClientError as e:
+                raise SunSpecClientError('Modbus read error: %s' % str(e))
+        else:
+            for model in models:
+                model.read_points()
+
+        return self.read_points_end(prev, models, now)
+
+    def read_points_begin(self, scheduled=False):
+        """Prepare a read of the device points. Used by :meth:`read_points`
+        and by transports that perform the reads themselves.
+
+        Parameters:
+
+            scheduled :
+                If True, only the models that are due are read.
+
+        Returns:
+
+            Tuple of the previous snapshot (None if it can not be updated
+            incrementally), the list of models to read and the time of the
+            read to pass to :meth:`read_points_end`.
+        """
+
+        all_models = [model for model in self.models_list if model.model_type is not None]
+
+        # the previous snapshot can only be updated with the changed points if no model was read or
+        # modified on its own since the snapshot was taken
+        prev = self.snapshot
+        if len(all_models) != len(self.snapshot_raw):
+            prev = None
+        else:
+            for model, raw in zip(all_models, self.snapshot_raw):
+                if model.raw is not raw:
+                    prev = None
+                    break
+        self.snapshot_raw = []
+
+        now = time.time()
+        if scheduled:
+            models = self.models_due(now)
+        else:
+            models = all_models
+
+        return prev, models, now
+
+    def read_points_end(self, prev, models, now):
+        """Complete a read of the device points started with
+        :meth:`read_points_begin` once the models have been decoded.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the point values just read.
+        """
+
+        for model in models:
+            model.next_poll = now + self.poll_intervals.get(int(model.id), 0)
+
+        self.changed_points = [point for model in models for point in model.changed_points]
+        self.snapshot = self.create_snapshot(prev, self.changed_points)
+        self.snapshot_raw = [model.raw for model in self.models_list if model.model_type is not None]
+        return self.snapshot
+
+    def write_points(self):
+        """Write all points of all models in the device that have been
+        modified since the last write operation to the physical device.
         """
 
         for model in self.models_list:
-            model.read_points()
+            if model.model_type is not None:
+                model.write_points()
+
+    def models_due(self, now=None):
+        """Return the models that are due to be read according to the
+        *poll_intervals* of the device.
+
+        Parameters:
+
+            now :
+                Current time as returned by time.time(). Defaults to the
+                current time.
+
+        Returns:
+
+            List of model objects.
+        """
+
+        if now is None:
+            now = time.time()
+        return [model for model in self.models_list if model.model_type is not None and model.next_poll <= now]
+
+    def read_models(self, models):
+        """Read the registers of the specified models using the requests
+        computed by :meth:`read_plan` and decode the points of each model.
+
+        Parameters:
+
+            models :
+                List of model objects to read.
+        """
+
+        if self.modbus_device is None:
+            raise SunSpecClientError('No modbus device set for SunSpec device')
+
+        while True:
+            max_count = getattr(self.modbus_device, 'max_count', None)
+            plan = self.read_plan(models)
+
+            # devices that support it send the requests without waiting for each response
+            read_multiple = getattr(self.modbus_device, 'read_multiple', None)
+            if read_multiple is not None:
+                responses = read_multiple(plan)
+            else:
+                responses = [self.modbus_device.read(addr, count) for addr, count in plan]
+
+            # requests split for a maximum count lowered during the read may have split a point
+            if getattr(self.modbus_device, 'max_count', None) == max_count:
+                break
+
+        self.decode_models(models, plan, responses)
+
+    def decode_models(self, models, plan, responses):
+        """Decode the points of the specified models from the responses to
+        the requests of a read plan.
+
+        Parameters:
+
+            models :
+                List of model objects to decode.
+
+            plan :
+                List of (address, count) requests as returned by
+                :meth:`read_plan`.
+
+            responses :
+                Register contents returned for each request of the plan.
+        """
+
+        # registers not covered by the plan (pads, unused gaps) are left as zero
+        start = min([model.addr for model in models])
+        end = max([model.addr + model.len for model in models])
+
+        buf = bytearray((end - start) * 2)
+        for (addr, count), data in zip(plan, responses):
+            if len(data) != count * 2:
+                raise SunSpecClientError('Error reading %d registers at %d: %d bytes received' % (count, addr, len(data)))
+            offset = (addr - start) * 2
+            buf[offset:offset + len(data)] = data
+
+        view = memoryview(buf)
+        for model in models:
+            offset = (model.addr - start) * 2
+            model.decode_points(view[offset:offset + (model.len * 2)])
+
+    def read_plan(self, models):
+        """Compute the minimum set of requests needed to read the points of the
+        specified models. Requests never split a point, never exceed the
+        maximum register count of the Modbus device and span unused register
+        gaps of up to *read_gap_max* registers.
+
+        Parameters:
+
+            models :
+                List of model objects to read.
+
+        Returns:
+
+            List of (address, count) tuples in address order.
+        """
+
+        max_count = getattr(self.modbus_device, 'max_count', None) or modbus.REQ_COUNT_MAX
+
+        # the maximum count of the device is lowered if it rejects the request size
+        key = (max_count,) + tuple([(model.addr, model.len) for model in models])
+        plan = self.read_plans.get(key)
+        if plan is not None:
+            return plan
+        gap_max = self.read_gap_max or 0
+
+        # register ranges that must be read, one per point
+        ranges = []
+        for model in models:
+            for block in model.blocks:
+                for point in list(block.points_sf.values()) + block.points_list:
+                    ranges.append((int(point.addr), int(point.point_type.len)))
+        ranges.sort()
+
+        plan = []
+        req_addr = None
+        req_end = None
+        for addr, count in ranges:
+            end = addr + count
+            if req_addr is not None and addr - req_end <= gap_max and max(end, req_end) - req_addr <= max_count:
+                req_end = max(end, req_end)
+            else:
+                if req_addr is not None:
+                    plan.append((req_addr, req_end - req_addr))
+                req_addr = addr
+                req_end = end
+        if req_addr is not None:
+            plan.append((req_addr, req_end - req_addr))
+
+        self.read_plans[key] = plan
+        return plan
+
+    def create_snapshot(self, prev=None, changed=None):
+        """Create an immutable snapshot of the current point values of all
+        models in the device. The snapshot only holds plain values so it can be
+        handed to other threads while the device continues to be read.
+
+        Parameters:
+
+            prev :
+                Previous snapshot of the device. If present along with
+                *changed*, only the entries of the changed points are
+                recreated and the point tuple of the previous snapshot is
+                reused if no point changed.
 
-    def scan(self, progress=None, delay=None):
+            changed :
+                List of points whose value changed since *prev* was taken.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the current point values.
+        """
+
+        if prev is not None and changed is not None:
+            if not changed:
+                return DeviceSnapshot(time.time(), prev.points, ())
+            points = list(prev.points)
+            changed_points = []
+            for point in changed:
+                index = self.snapshot_index.get(id(point))
+                if index is not None:
+                    entry = prev.points[index]._replace(value=point.value)
+                    points[index] = entry
+                    changed_points.append(entry)
+            return DeviceSnapshot(time.time(), tuple(points), tuple(changed_points))
+
+        points = []
+        index = {}
+        for model in self.models_list:
+            if model.model_type is not None:
+                model_name = model.model_type.name
+            else:
+                model_name = 'model_' + str(model.id)
+            for block in model.blocks:
+                for point in block.points_list:
+                    index[id(point)] = len(points)
+                    points.append(PointSnapshot(model.id, model_name, model.index, block.index, point.point_type.id,
+                                                point.value, point.point_type.units, point.point_type.description))
+
+        self.snapshot_index = index
+        points = tuple(points)
+        return DeviceSnapshot(time.time(), points, points)
+
+    def scan(self, progress=None, delay=None, cache=None, fast=True):
         """Scan all the models of the physical device and create the
         corresponding model objects within the device object based on the
         SunSpec model definitions.
+
+        Parameters:
+
+            progress :
+                Function called with a progress message for each model. The
+                scan is terminated if it returns False.
+
+            delay :
+                Delay in seconds between scan requests.
+
+            cache :
+                Path of the scan cache file. If the file is present and the
+                device still matches the fingerprint stored in it, the models
+                are created from the file instead of scanning the device. The
+                file is written after a full scan.
+
+            fast :
+                If True (default), the model headers are parsed from reads of
+                up to the maximum request size, see :meth:`scan_headers`. If
+                False, the id and length of each model are read with separate
+                requests.
         """
 
         error = ''
 
         connect = False
         if self.modbus_device and type(self.modbus_device) == modbus.ModbusClientDeviceTCP:
-            self.modbus_device.connect()
-            connect = True
+            # a persistent connection is kept open after the scan
+            if not self.modbus_device.persistent:
+                self.modbus_device.connect()
+                connect = True
 
             if delay is not None:
                 time.sleep(delay)
 
+        if cache is not None and self.base_addr is None and self.scan_cache_load(cache):
+            if connect:
+                self.modbus_device.disconnect()
+            return
+
         if self.base_addr is None:
             for addr in self.base_addr_list:
                 # print('trying base address %s' % (addr))
@@ -260,7 +776,20 @@ class ClientDevice(device.Device):
                 if delay is not None:
                     time.sleep(delay)
 
-        if self.base_addr is not None:
+        if self.base_addr is not None and fast:
+            for model_id, addr, model_len in self.scan_headers(self.base_addr + 2, delay):
+                if progress is not None:
+                    cont = progress('Scanning model %s' % (model_id))
+                    if not cont:
+                        raise SunSpecClientError('Device scan terminated')
+                model = ClientModel(self, model_id, addr, model_len)
+                try:
+                    model.load()
+                except Exception as e:
+                    model.load_error = str(e)
+                self.add_model(model)
+
+        elif self.base_addr is not None:
             # print('base address = %s' % (self.base_addr))
             model_id = util.data_to_u16(data[4:6])
             addr = self.base_addr + 2
@@ -303,9 +832,316 @@ class ClientDevice(device.Device):
                 error = 'Unknown error'
             raise SunSpecClientError(error)
 
+        self.probe_max_count()
+
+        if cache is not None:
+            self.scan_cache_save(cache)
+
         if connect:
             self.modbus_device.disconnect()
 
+    def probe_max_count(self):
+        """Detect the largest register count the device accepts in a single
+        request. The registers from the base address are read with a request
+        of the current maximum count of the Modbus device, which lowers its
+        maximum count if the device rejects the request size with an illegal
+        data value exception or returns fewer registers than requested.
+        """
+
+        request = self.probe_max_count_request()
+        if request is None:
+            return
+
+        try:
+            self.read(*request)
+        except SunSpecClientError:
+            pass
+
+    def probe_max_count_request(self):
+        """Compute the read used by :meth:`probe_max_count`.
+
+        Returns:
+
+            (address, count) tuple of the probe read or None if there is
+            nothing to probe.
+        """
+
+        max_count = getattr(self.modbus_device, 'max_count', None)
+        if max_count is None or self.base_addr is None or not self.models_list:
+            return None
+
+        last = self.models_list[-1]
+        return self.base_addr, min(int(last.addr) + int(last.len) - self.base_addr, max_count)
+
+    def scan_headers(self, addr, delay=None):
+        """Read the model headers of the device starting at the header of the
+        first model. The headers are parsed from reads of up to the maximum
+        request size and a new read is only issued when the next header is
+        outside of the registers already read. If a read fails, for example
+        because it extends past the end of the device register map, the
+        remaining headers are read one register at a time.
+
+        Parameters:
+
+            addr :
+                Modbus address of the first model header.
+
+            delay :
+                Delay in seconds between requests.
+
+        Returns:
+
+            List of (model id, model address, model length) tuples where the
+            model address is the address of the first point of the model.
+        """
+
+        headers = []
+        reads = self.scan_headers_reads(addr, headers)
+        try:
+            read_addr, count = next(reads)
+            while True:
+                try:
+                    data = self.read(read_addr, count)
+                except SunSpecClientError as e:
+                    read_addr, count = reads.throw(e)
+                    continue
+                if delay is not None:
+                    time.sleep(delay)
+                read_addr, count = reads.send(data)
+        except StopIteration:
+            pass
+
+        return headers
+
+    def scan_headers_reads(self, addr, headers):
+        """Generator of the reads of :meth:`scan_headers`, shared by the
+        blocking and the asyncio devices. Each read is yielded as an
+        (address, count) tuple and the caller sends back the register
+        contents read or throws the SunSpecClientError of a failed read into
+        the generator.
+
+        Parameters:
+
+            addr :
+                Modbus address of the first model header.
+
+            headers :
+                List to which the (model id, model address, model length)
+                tuples of the headers are appended.
+        """
+
+        max_count = getattr(self.modbus_device, 'max_count', None) or modbus.REQ_COUNT_MAX
+        data = b''
+        data_addr = addr
+        careful = False
+
+        while True:
+            offset = (addr - data_addr) * 2
+            if offset < 0 or offset + 4 > len(data):
+                if careful:
+                    # read model id and model len separately due to some devices not supplying
+                    # count for the end model id
+                    data = yield addr, 1
+                    if len(data) == 2 and util.data_to_u16(data) != suns.SUNS_END_MODEL_ID:
+                        data += yield addr + 1, 1
+                else:
+                    try:
+                        data = yield addr, max_count
+                    except SunSpecClientError:
+                        careful = True
+                        continue
+                data_addr = addr
+                offset = 0
+
+            if offset + 2 > len(data):
+                break
+            model_id = util.data_to_u16(data[offset:offset + 2])
+            if model_id == suns.SUNS_END_MODEL_ID or offset + 4 > len(data):
+                break
+            model_len = util.data_to_u16(data[offset + 2:offset + 4])
+            headers.append((model_id, addr + 2, model_len))
+            addr += model_len + 2
+
+    def scan_fingerprint(self, base_addr, count):
+        """Read the fingerprint used to check that a scan cache file still
+        matches the device. The fingerprint is a hash of the SunSpec marker,
+        the common model and the header of the following model which are
+        read with a single request.
+
+        Parameters:
+
+            base_addr :
+                Modbus base address of the device.
+
+            count :
+                Register count of the fingerprint read.
+
+        Returns:
+
+            Hex digest of the registers.
+        """
+
+        return hashlib.sha1(bytes(self.read(base_addr, count))).hexdigest()
+
+    def scan_cache_load(self, filename):
+        """Create the models of the device from a scan cache file if the
+        device still matches the fingerprint stored in the file.
+
+        Parameters:
+
+            filename :
+                Path of the scan cache file.
+
+        Returns:
+
+            True if the models were created from the cache, False otherwise.
+        """
+
+        cache = self.scan_cache_read(filename)
+        if cache is None:
+            return False
+
+        try:
+            # the fingerprint read is never longer than the max count of the device when the cache was written
+            fingerprint = self.scan_fingerprint(cache['base_addr'], cache['fingerprint_len'])
+        except SunSpecClientError:
+            return False
+        if fingerprint != cache['fingerprint']:
+            return False
+
+        self.scan_cache_apply(cache)
+        return True
+
+    def scan_cache_read(self, filename):
+        """Read a scan cache file without accessing the device.
+
+        Parameters:
+
+            filename :
+                Path of the scan cache file.
+
+        Returns:
+
+            Dictionary of the cache contents or None if the file is missing,
+            invalid or of another version.
+        """
+
+        try:
+            with open(filename) as f:
+                cache = json.load(f)
+            if cache.get('version') != SCAN_CACHE_VERSION:
+                return None
+            max_count = cache.get('max_count')
+            if max_count is not None:
+                max_count = int(max_count)
+            return {
+                'base_addr': int(cache['base_addr']),
+                'fingerprint_len': int(cache['fingerprint_len']),
+                'fingerprint': cache['fingerprint'],
+                'max_count': max_count,
+                'models': [(int(model_id), int(addr), int(model_len)) for model_id, addr, model_len in cache['models']]
+            }
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def scan_cache_apply(self, cache, model_class=None):
+        """Create the models of the device from the contents of a scan cache
+        file whose fingerprint matched the device.
+
+        Parameters:
+
+            cache :
+                Dictionary returned by :meth:`scan_cache_read`.
+
+            model_class :
+                Class of the model objects. Defaults to :const:`ClientModel`.
+        """
+
+        if model_class is None:
+            model_class = ClientModel
+
+        # cached values only apply to the device that matched the fingerprint
+        if cache['max_count'] is not None and getattr(self.modbus_device, 'max_count', None) is not None:
+            self.modbus_device.max_count = cache['max_count']
+        self.base_addr = cache['base_addr']
+        for model_id, addr, model_len in cache['models']:
+            model = model_class(self, model_id, addr, model_len)
+            try:
+                model.load()
+            except Exception as e:
+                model.load_error = str(e)
+            self.add_model(model)
+
+    def scan_cache_save(self, filename):
+        """Write the scan results of the device to a scan cache file. Errors
+        writing the file are ignored as the cache is only an optimization.
+
+        Parameters:
+
+            filename :
+                Path of the scan cache file.
+        """
+
+        count = self.scan_cache_fingerprint_len()
+        if count is None:
+            return
+
+        try:
+            self.scan_cache_write(filename, count, self.scan_fingerprint(self.base_addr, count))
+        except SunSpecClientError:
+            pass
+
+    def scan_cache_fingerprint_len(self):
+        """Compute the register count of the fingerprint read of a new scan
+        cache file.
+
+        Returns:
+
+            Register count or None if the device has not been scanned.
+        """
+
+        if self.base_addr is None or not self.models_list:
+            return None
+
+        # SunSpec marker, common model header and contents and the header of the next model
+        first = self.models_list[0]
+        max_count = getattr(self.modbus_device, 'max_count', None)
+        return min(int(first.addr) + int(first.len) + 2 - self.base_addr, max_count or modbus.REQ_COUNT_MAX)
+
+    def scan_cache_write(self, filename, count, fingerprint):
+        """Write the scan results of the device and the fingerprint read by
+        :meth:`scan_fingerprint` to a scan cache file. Errors writing the file
+        are ignored.
+
+        Parameters:
+
+            filename :
+                Path of the scan cache file.
+
+            count :
+                Register count of the fingerprint read.
+
+            fingerprint :
+                Hex digest of the fingerprint registers.
+        """
+
+        cache = {
+            'version': SCAN_CACHE_VERSION,
+            'base_addr': self.base_addr,
+            'fingerprint_len': count,
+            'fingerprint': fingerprint,
+            'models': [[int(model.id), int(model.addr), int(model.len)] for model in self.models_list]
+        }
+        max_count = getattr(self.modbus_device, 'max_count', None)
+        if max_count is not None:
+            cache['max_count'] = max_count
+
+        try:
+            with open(filename, 'w') as f:
+                json.dump(cache, f)
+        except (IOError, OSError):
+            pass
+
 class ClientModel(device.Model):
     """A derived class based on :const:`sunspec.core.device.Model`. It adds
     Modbus device access capability to the model base class.
@@ -330,18 +1166,314 @@ class ClientModel(device.Model):
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
+
+    Attributes:
+
+        raw
+            Register contents of the model from the last read or None.
+
+        diff
+            If True (default), only the points whose registers changed since
+            the last read are decoded.
+
+        changed_points
+            List of the non-scale factor points whose value changed in the
+            last read.
+
+        next_poll
+            Time at which the model is due for the next scheduled read of the
+            device.
+
+        columns
+            Dictionary of the repeating block point values by point id when
+            vectorized decoding is enabled. See :meth:`vectorize`.
     """
 
+    __slots__ = ('decode_plan', 'diff_plan', 'diff', 'raw', 'changed_points', 'next_poll', 'columns_plan', 'columns',
+                 'columns_points', 'store_plan')
+
     def __init__(self, dev=None, mid=None, addr=0, mlen=None, index=1):
 
         device.Model.__init__(self, device=dev, mid=mid, addr=addr, mlen=mlen, index=index)
+        self.decode_plan = None
+        self.diff_plan = None
+        self.diff = True
+        self.raw = None
+        self.changed_points = []
+        self.next_poll = 0
+        self.columns_plan = None
+        self.columns = None
+        self.columns_points = True
+        self.store_plan = None
 
     def load(self):
         """Create the block and point objects within the model object based on
         the corresponding SunSpec model definition.
         """
 
-        device.Model.load(self, block_class=ClientBlock, point_class=ClientPoint)
+        if getattr(self.device, 'store', None) is not None:
+            device.Model.load(self, block_class=ClientBlock, point_class=StoredClientPoint)
+        else:
+            device.Model.load(self, block_class=ClientBlock, point_class=ClientPoint)
+        self.decode_plan = self.compile()
+        self.diff_plan = self.compile_diff()
+
+    def compile(self, blocks=None):
+        """Compile the decode plan for the model. The plan holds a single
+        struct.Struct covering the whole model and tables mapping the unpacked
+        values to the scale factor and non-scale factor points.
+
+        Parameters:
+
+            blocks :
+                Blocks to include in the plan. Defaults to all the blocks of
+                the model.
+
+        Returns:
+
+            :const:`DecodePlan` for the model or None if the points of the model
+            can not be described by a single struct format.
+        """
+
+        if blocks is None:
+            blocks = self.blocks
+
+        points = []
+        for block in blocks:
+            points.extend(block.points_sf.values())
+            points.extend(block.points_list)
+        points.sort(key=lambda point: int(point.addr))
+
+        fmt = '>'
+        offset = 0
+        index = 0
+        points_sf = []
+        points_non_sf = []
+        for point in points:
+            point_offset = int(point.addr) - int(self.addr)
+            point_len = int(point.point_type.len)
+            if point_offset < offset or point.point_type.data_to is None:
+                return None
+            if point_offset > offset:
+                fmt += '%dx' % ((point_offset - offset) * 2)
+
+            code, conv = decode_codes.get(point.point_type.data_to, (None, None))
+            if code is None or struct.calcsize('>' + code) != point_len * 2:
+                code = '%ds' % (point_len * 2)
+                conv = point.point_type.data_to
+            fmt += code
+
+            if point.point_type.type == suns.SUNS_TYPE_SUNSSF:
+                points_sf.append((point, index, conv, point.point_type.is_impl))
+            else:
+                points_non_sf.append((point, index, conv, point.point_type.is_impl, point.sf_point))
+            offset = point_offset + point_len
+            index += 1
+
+        if offset > self.len:
+            return None
+        if offset < self.len and blocks is self.blocks:
+            fmt += '%dx' % ((self.len - offset) * 2)
+
+        return DecodePlan(struct.Struct(fmt), tuple(points_sf), tuple(points_non_sf))
+
+    def vectorize(self, enable=True, points=True):
+        """Enable or disable vectorized decoding of the repeating blocks of
+        the model. When enabled, the repeating blocks are decoded with numpy as
+        a structured big-endian array and the resulting values are available as
+        columns in the *columns* attribute after each read. Each column is
+        indexed by repeating block and holds the scaled point values as
+        float64 (NaN if not implemented) or an object array for string type
+        points.
+
+        Parameters:
+
+            enable :
+                Enable vectorized decoding if True, disable if False.
+
+            points :
+                If True, the point objects of the repeating blocks are updated
+                as well. If False, only the columns are updated which is
+                considerably faster for models with many repeating blocks.
+
+        Raises:
+
+            SunSpecClientError: numpy is not installed.
+        """
+
+        self.columns_plan = None
+        self.columns = None
+        self.columns_points = points
+        self.decode_plan = self.compile()
+        self.diff_plan = self.compile_diff()
+        # points not kept in sync so far are all decoded on the next read
+        self.raw = None
+
+        if enable:
+            if numpy is None:
+                raise SunSpecClientError('Vectorized decoding requires numpy')
+            if len(self.blocks) > 1:
+                self.columns_plan = self.compile_columns()
+                if self.columns_plan is not None:
+                    self.decode_plan = self.compile(self.blocks[:1])
+                    self.diff_plan = self.compile_diff(self.blocks[:1])
+
+    def compile_columns(self):
+        """Compile the numpy decode plan for the repeating blocks of the
+        model.
+
+        Returns:
+
+            :const:`ColumnsPlan` for the model or None if the model has no
+            repeating blocks.
+        """
+
+        if len(self.blocks) < 2:
+            return None
+
+        first = self.blocks[1]
+        block_len = int(first.len)
+        offset = int(first.addr) - int(self.addr)
+        count = len(self.blocks) - 1
+
+        names = []
+        formats = []
+        offsets = []
+        fields = []
+        for point_type in first.block_type.points_list:
+            point = first.points.get(point_type.id) or first.points_sf.get(point_type.id)
+            if point is None:
+                continue
+            point_len = int(point_type.len) * 2
+            dtype = column_dtypes.get(point_type.data_to)
+            numeric = dtype is not None and numpy.dtype(dtype).itemsize == point_len
+            if not numeric:
+                dtype = 'V%d' % point_len
+
+            unimpl = column_unimpl.get(point_type.is_impl)
+            if numeric and unimpl is not None and numpy.dtype(dtype).kind in 'iu':
+                info = numpy.iinfo(numpy.dtype(dtype))
+                # unimplemented value not representable in the decoded type
+                if unimpl < info.min or unimpl > info.max:
+                    unimpl = None
+
+            sf_type = SF_NONE
+            sf = None
+            if point.sf_point is not None:
+                if isinstance(point.sf_point, device.ScaleFactor):
+                    sf_type = SF_CONST
+                    sf = point.sf_point.value_base
+                elif point.sf_point.block is first:
+                    sf_type = SF_REPEATING
+                    sf = point.sf_point.point_type.id
+                else:
+                    sf_type = SF_FIXED
+                    sf = point.sf_point
+
+            points = []
+            for block in self.blocks[1:]:
+                points.append(block.points.get(point_type.id) or block.points_sf.get(point_type.id))
+
+            names.append(point_type.id)
+            formats.append(dtype)
+            offsets.append((int(point.addr) - int(first.addr)) * 2)
+            fields.append(ColumnField(point_type.id, point_type, numeric, unimpl, sf_type, sf, tuple(points)))
+
+        dtype = numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': block_len * 2})
+        return ColumnsPlan(offset * 2, count, dtype, tuple(fields))
+
+    def _decode_columns(self, data):
+        # decode the repeating blocks with numpy and optionally update the repeating block points, returns the
+        # repeating block points whose value changed if the points are updated
+
+        plan = self.columns_plan
+        prev_columns = self.columns
+        changed = []
+        blocks = numpy.frombuffer(data, dtype=plan.dtype, count=plan.count, offset=plan.offset)
+
+        # raw values and implemented masks for each field
+        raw = {}
+        for field in plan.fields:
+            values = blocks[field.name]
+            if not field.numeric:
+                conv = field.point_type.data_to
+                is_impl = field.point_type.is_impl
+                values = [conv(v) for v in values.tolist()]
+                impl = numpy.array([is_impl(v) for v in values], dtype=bool)
+            elif values.dtype.kind == 'f':
+                impl = ~numpy.isnan(values)
+            elif field.unimpl is not None:
+                impl = values != field.unimpl
+            else:
+                impl = numpy.ones(plan.count, dtype=bool)
+            raw[field.name] = (values, impl)
+
+        columns = {}
+        for field in plan.fields:
+            values, impl = raw[field.name]
+
+            # scale factor exponent for all repeats, None if the point has no usable scale factor
+            sf = None
+            if field.sf_type == SF_REPEATING:
+                sf_values, sf_impl = raw[field.sf]
+                sf = numpy.where(sf_impl, sf_values, 0)
+            elif field.sf_type == SF_FIXED:
+                sf = field.sf.value_base
+            elif field.sf_type == SF_CONST:
+                sf = field.sf
+
+            if field.numeric:
+                column = numpy.where(impl, values.astype(numpy.float64), numpy.nan)
+                if sf is not None:
+                    with numpy.errstate(over='ignore'):
+                        column *= numpy.power(10.0, sf)
+            else:
+                column = numpy.array(values, dtype=object)
+                column[~impl] = None
+            columns[field.name] = column
+
+            if not self.columns_points:
+                continue
+
+            # keep the point objects in sync
+            is_sf = field.point_type.type == suns.SUNS_TYPE_SUNSSF
+            if not is_sf:
+                prev = prev_columns.get(field.name) if prev_columns is not None else None
+                if prev is None:
+                    diff = numpy.ones(plan.count, dtype=bool)
+                elif field.numeric:
+                    diff = (prev != column) & ~(numpy.isnan(prev) & numpy.isnan(column))
+                else:
+                    diff = numpy.array([a != b for a, b in zip(prev.tolist(), column.tolist())], dtype=bool)
+                changed.append((field.points, diff))
+            if field.numeric:
+                values = values.tolist()
+            if field.sf_type == SF_REPEATING:
+                sf_values, sf_impl = raw[field.sf]
+                sf_list = numpy.where(sf_impl, sf_values, None).tolist()
+            elif field.sf_type != SF_NONE:
+                sf_list = [sf] * plan.count
+            else:
+                sf_list = None
+            for point, value, ok in zip(field.points, values, impl.tolist()):
+                if ok:
+                    point.value_base = value
+                else:
+                    point.value_base = None
+                    if not is_sf:
+                        point.value_sf = None
+            if sf_list is not None:
+                for point, sf, ok in zip(field.points, sf_list, impl.tolist()):
+                    if ok:
+                        point.value_sf = sf
+
+        self.columns = columns
+
+        # changed points ordered by repeating block
+        if not changed:
+            return []
+        diffs = numpy.array([diff for points, diff in changed])
+        return [changed[field][0][index] for index, field in zip(*numpy.nonzero(diffs.T))]
 
     def read_points(self):
         """Read all points in the model from the physical device.
@@ -350,6 +1482,12 @@ class ClientModel(device.Model):
         if self.model_type is not None:
             # read current model
             try:
+                max_count = getattr(getattr(self.device, 'modbus_device', None), 'max_count', None)
+                if max_count is not None and self.len > max_count:
+                    # requests that do not split a point
+                    self.device.read_models([self])
+                    return
+
                 end_index = len(self.read_blocks)
                 if end_index == 1:
                     data = self.device.read(self.addr, self.len)
@@ -364,44 +1502,11 @@ class ClientModel(device.Model):
                         else:
                             read_len = self.addr + self.len - addr
                         data += self.device.read(addr, read_len)
-                if data:
-                    # print('data len = ', len(data))
-                    data_len = len(data)/2
-                    if data_len != self.len:
-                        raise SunSpecClientError('Error reading model %s' % self.model_type)
-
-                    #  for each repeating block
-                    for block in self.blocks:
-                        # scale factor points
-                        for pname, point in block.points_sf.items():
-                            offset = int(point.addr) - int(self.addr)
-                            if point.point_type.data_to is not None:
-                                byte_offset = offset * 2
-                                # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
-                                point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
-                                if not point.point_type.is_impl(point.value_base):
-                                    point.value_base = None
-                            else:
-                                raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
-
-                        # non-scale factor points
-                        for pname, point in block.points.items():
-                            offset = int(point.addr) - int(self.addr)
-                            if point.point_type.data_to is not None:
-                                byte_offset = offset * 2
-                                # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
-                                point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
-                                if (type(point.value_base) == bytes and
-                                        sys.version_info > (3,)):
-                                    point.value_base = str(point.value_base, 'latin-1')
-                                if point.point_type.is_impl(point.value_base):
-                                    if point.sf_point is not None:
-                                        point.value_sf = point.sf_point.value_base
-                                else:
-                                    point.value_base = None
-                                    point.value_sf = None
-                            else:
-                                raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
+                if max_count is not None and self.len > self.device.modbus_device.max_count:
+                    # the maximum count was lowered during the read
+                    self.device.read_models([self])
+                elif data:
+                    self.decode_points(data)
 
             except SunSpecError as e:
                 raise SunSpecClientError(e)
@@ -410,11 +1515,340 @@ class ClientModel(device.Model):
             except:
                 raise
 
+    def decode_points(self, data):
+        """Set all points in the model from the register contents of the
+        model.
+
+        The register contents are kept in the *raw* attribute. If the previous
+        contents are available and *diff* is True, only the points whose
+        registers (or scale factor registers) changed are decoded. The
+        non-scale factor points whose value changed are available in the
+        *changed_points* attribute after each call.
+
+        Parameters:
+
+            data :
+                Byte string, bytearray or memoryview containing the register
+                contents of the model starting at the model address.
+        """
+
+        if self.model_type is not None:
+            if len(data) != self.len * 2:
+                raise SunSpecClientError('Error reading model %s' % self.model_type)
+
+            # bytes() of a memoryview is its repr on python 2
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            else:
+                data = bytes(data)
+            prev = self.raw
+            self.raw = None
+
+            if self.diff and prev is not None and self.diff_plan is not None:
+                if prev == data:
+                    self.changed_points = []
+                else:
+                    try:
+                        self.changed_points = self._decode_points_changed(prev, data)
+                        if self.columns_plan is not None:
+                            self.changed_points.extend(self._decode_columns(data))
+                    except SunSpecError as e:
+                        raise SunSpecClientError(e)
+                    except struct.error as e:
+                        raise SunSpecClientError('Error decoding model %s: %s' % (self.id, str(e)))
+            else:
+                self._decode_points_all(data)
+                # repeating block points are not updated when only the columns are
+                if self.columns_plan is not None and not self.columns_points:
+                    blocks = self.blocks[:1]
+                else:
+                    blocks = self.blocks
+                self.changed_points = [point for block in blocks for point in block.points_list]
+
+            self.raw = data
+
+    def _decode_points_all(self, data):
+        # decode all points using the decode plan if available
+
+        plan = self.decode_plan
+        if plan is None:
+            return self._decode_points_generic(data)
+
+        try:
+            values = plan.struct.unpack_from(data)
+
+            store = getattr(self.device, 'store', None)
+            if store is not None:
+                self._decode_points_store(store, plan, values)
+                if self.columns_plan is not None:
+                    self._decode_columns(data)
+                return
+
+            # scale factor points
+            for point, index, conv, is_impl in plan.points_sf:
+                value = values[index]
+                if conv is not None:
+                    value = conv(value)
+                if is_impl(value):
+                    point.value_base = value
+                else:
+                    point.value_base = None
+
+            # non-scale factor points
+            for point, index, conv, is_impl, sf_point in plan.points:
+                value = values[index]
+                if conv is not None:
+                    value = conv(value)
+                if is_impl(value):
+                    point.value_base = value
+                    if sf_point is not None:
+                        point.value_sf = sf_point.value_base
+                else:
+                    point.value_base = None
+                    point.value_sf = None
+
+            if self.columns_plan is not None:
+                self._decode_columns(data)
+
+        except SunSpecError as e:
+            raise SunSpecClientError(e)
+        except struct.error as e:
+            raise SunSpecClientError('Error decoding model %s: %s' % (self.id, str(e)))
+
+    def _store_plan(self, store, plan):
+        # point store indexes and value columns of the points of a decode plan
+
+        def kind(point):
+            # the decode plan only yields values of the point type, objects are set through the store
+            return store.kinds[point.store_index] if point.point_type.data_to in decode_codes else STORE_KIND_OBJECT
+
+        points_sf = tuple((point.store_index, index, conv, is_impl, kind(point))
+                          for point, index, conv, is_impl in plan.points_sf)
+        points = []
+        for point, index, conv, is_impl, sf_point in plan.points:
+            sf_index = getattr(sf_point, 'store_index', None)
+            # constant scale factors are not in the store
+            sf_value = sf_point.value_base if sf_point is not None and sf_index is None else None
+            # scale factors in the int column are read directly
+            sf_int = sf_index is not None and store.kinds[sf_index] == STORE_KIND_INT
+            points.append((point.store_index, index, conv, is_impl, kind(point), sf_point is not None, sf_index,
+                           sf_int, sf_value))
+        return StorePlan(plan, points_sf, tuple(points))
+
+    def _decode_points_store(self, store, plan, values):
+        # decode plan values written directly to the columns of the point store of the device
+
+        store_plan = self.store_plan
+        if store_plan is None or store_plan.plan is not plan:
+            store_plan = self.store_plan = self._store_plan(store, plan)
+
+        ints = store.ints
+        floats = store.floats
+        sfs = store.sfs
+        flags = store.flags
+        objects = store.objects
+
+        # values of the int and float columns never leave an object behind, a stale object is ignored as
+        # its flag is cleared
+        for store_index, index, conv, is_impl, kind in store_plan.points_sf:
+            value = values[index]
+            if conv is not None:
+                value = conv(value)
+            f = flags[store_index] & STORE_FLAG_SF
+            if is_impl(value):
+                if kind == STORE_KIND_INT:
+                    ints[store_index] = value
+                    f |= STORE_FLAG_VALUE
+                elif kind == STORE_KIND_FLOAT:
+                    floats[store_index] = value
+                    f |= STORE_FLAG_VALUE
+                else:
+                    objects[store_index] = value
+                    f |= STORE_FLAG_VALUE | STORE_FLAG_OBJECT
+            flags[store_index] = f
+
+        for store_index, index, conv, is_impl, kind, has_sf, sf_index, sf_int, sf_value in store_plan.points:
+            value = values[index]
+            if conv is not None:
+                value = conv(value)
+            if is_impl(value):
+                if kind == STORE_KIND_INT:
+                    ints[store_index] = value
+                    f = STORE_FLAG_VALUE
+                elif kind == STORE_KIND_FLOAT:
+                    floats[store_index] = value
+                    f = STORE_FLAG_VALUE
+                else:
+                    objects[store_index] = value
+                    f = STORE_FLAG_VALUE | STORE_FLAG_OBJECT
+                if has_sf:
+                    if sf_index is not None:
+                        if sf_int and flags[sf_index] == STORE_FLAG_VALUE:
+                            sf_value = ints[sf_index]
+                        else:
+                            sf_value = store.get(sf_index)
+                    if sf_value is not None:
+                        sfs[store_index] = sf_value
+                        f |= STORE_FLAG_SF
+                else:
+                    f |= flags[store_index] & STORE_FLAG_SF
+            else:
+                f = 0
+            flags[store_index] = f
+
+    def _decode_points_changed(self, prev, data):
+        # decode only the points whose registers differ from the previous read
+
+        changed = []
+        for start, end, points_sf, points in self.diff_plan:
+            if prev[start:end] == data[start:end]:
+                continue
+
+            # scale factor points, dependent points that did not change themselves get the new scale factor
+            for point, point_start, point_end, dependents in points_sf:
+                if prev[point_start:point_end] != data[point_start:point_end]:
+                    value = point.point_type.data_to(data[point_start:point_end])
+                    if point.point_type.is_impl(value):
+                        point.value_base = value
+                    else:
+                        point.value_base = None
+                    for dep, dep_start, dep_end in dependents:
+                        if prev[dep_start:dep_end] == data[dep_start:dep_end] and dep.value_base is not None:
+                            dep.value_sf = point.value_base
+                            changed.append(dep)
+
+            # non-scale factor points
+            for point, point_start, point_end in points:
+                if prev[point_start:point_end] != data[point_start:point_end]:
+                    value = point.point_type.data_to(data[point_start:point_end])
+                    if type(value) == bytes and sys.version_info > (3,):
+                        value = str(value, 'latin-1')
+                    if point.point_type.is_impl(value):
+                        point.value_base = value
+                        if point.sf_point is not None:
+                            point.value_sf = point.sf_point.value_base
+                    else:
+                        point.value_base = None
+                        point.value_sf = None
+                    changed.append(point)
+
+        return changed
+
+    def compile_diff(self, blocks=None):
+        """Compile the tables used to find the points whose registers changed
+        between two reads. For each block the table holds the byte range of
+        the block and the byte range of each point. Scale factor points also
+        list the points in any block scaled by them.
+
+        Parameters:
+
+            blocks :
+                List of blocks covered by the tables. Defaults to all the
+                blocks of the model.
+
+        Returns:
+
+            Tuple of (start, end, points_sf, points) tuples, one per block, or
+            None if a point can not be decoded.
+        """
+
+        def byte_range(point):
+            start = (int(point.addr) - int(self.addr)) * 2
+            return start, start + int(point.point_type.len) * 2
+
+        if blocks is None:
+            blocks = self.blocks
+
+        dependents = {}
+        for block in blocks:
+            for point in block.points_list:
+                if point.point_type.data_to is None:
+                    return None
+                if isinstance(point.sf_point, device.Point):
+                    dependents.setdefault(id(point.sf_point), []).append((point,) + byte_range(point))
+
+        plan = []
+        for block in blocks:
+            start = (int(block.addr) - int(self.addr)) * 2
+            end = start + int(block.len) * 2
+            points_sf = []
+            for point in block.points_sf.values():
+                if point.point_type.data_to is None:
+                    return None
+                points_sf.append((point,) + byte_range(point) + (tuple(dependents.get(id(point), ())),))
+            points = [(point,) + byte_range(point) for point in block.points_list]
+            plan.append((start, end, tuple(points_sf), tuple(points)))
+
+        return tuple(plan)
+
+    def _decode_points_generic(self, data):
+        # decode point by point for models that have no decode plan
+
+        if self.model_type is not None:
+            try:
+                # print('data len = ', len(data))
+                data_len = len(data)/2
+                if data_len != self.len:
+                    raise SunSpecClientError('Error reading model %s' % self.model_type)
+
+                #  for each repeating block
+                for block in self.blocks:
+                    # scale factor points
+                    for pname, point in block.points_sf.items():
+                        offset = int(point.addr) - int(self.addr)
+                        if point.point_type.data_to is not None:
+                            byte_offset = offset * 2
+                            # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
+                            point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
+                            if not point.point_type.is_impl(point.value_base):
+                                point.value_base = None
+                        else:
+                            raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
+
+                    # non-scale factor points
+                    for pname, point in block.points.items():
+                        offset = int(point.addr) - int(self.addr)
+                        if point.point_type.data_to is not None:
+                            byte_offset = offset * 2
+                            # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
+                            point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
+                            if (type(point.value_base) == bytes and
+                                    sys.version_info > (3,)):
+                                point.value_base = str(point.value_base, 'latin-1')
+                            if point.point_type.is_impl(point.value_base):
+                                if point.sf_point is not None:
+                                    point.value_sf = point.sf_point.value_base
+                            else:
+                                point.value_base = None
+                                point.value_sf = None
+                        else:
+                            raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
+
+            except SunSpecClientError:
+                raise
+            except SunSpecError as e:
+                raise SunSpecClientError(e)
+
     def write_points(self):
         """Write all points that have been modified since the last write
         operation to the physical device.
         """
 
+        for addr, data in self.write_requests():
+            self.device.write(addr, data)
+
+    def write_requests(self):
+        """Collect the points that have been modified since the last write
+        operation into write requests. Adjacent modified points in a block
+        are combined into a single request. The points are no longer marked
+        as modified once collected.
+
+        Returns:
+
+            List of (address, data) tuples.
+        """
+
+        requests = []
         addr = None
         next_addr = None
         data = b''
@@ -430,16 +1864,18 @@ class ClientModel(device.Model):
                         data = b''
                     else:
                         if point_addr != next_addr:
-                            block.model.device.write(addr, data)
+                            requests.append((addr, data))
                             addr = point_addr
                             data = b''
                     next_addr = point_addr + point_len
                     data += point_data
                     point.dirty = False
             if addr is not None:
-                block.model.device.write(addr, data)
+                requests.append((addr, data))
                 addr = None
 
+        return requests
+
 class ClientBlock(device.Block):
     """A derived class based on :const:`sunspec.core.device.Block`. It adds
     Modbus device access capability to the block base class.
@@ -463,6 +1899,8 @@ class ClientBlock(device.Block):
             Block index.
     """
 
+    __slots__ = ()
+
     def __init__(self, model, addr, blen, block_type, index=1):
 
         device.Block.__init__(self, model, addr, blen, block_type, index)
@@ -493,10 +1931,20 @@ class ClientPoint(device.Point):
         SunSpecClientError: Raised for any sunspec module error.
     """
 
+    __slots__ = ()
+
     def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
 
         device.Point.__init__(self, block, point_type, addr, sf_point, value)
 
+    def value_setter(self, v):
+
+        device.Point.value_setter(self, v)
+        # the local value no longer matches the registers of the last read
+        self.block.model.raw = None
+
+    value = property(device.Point.value_getter, value_setter, None)
+
     def write(self):
         """Write the point to the physical device.
         """
@@ -505,6 +1953,298 @@ class ClientPoint(device.Point):
         self.block.model.device.write(int(self.addr), data)
         self.dirty = False
 
+class StoredClientPoint(ClientPoint):
+    """A :const:`ClientPoint` whose value and scale factor value are kept in
+    the :class:`PointStore` of the device instead of the point object.
+
+    Attributes:
+
+        store
+            :class:`PointStore` holding the point values.
+
+        store_index
+            Index of the point in the store.
+    """
+
+    __slots__ = ('store', 'store_index')
+
+    def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
+
+        self.store = block.model.device.store
+        self.store_index = self.store.add(self, point_type)
+        ClientPoint.__init__(self, block, point_type, addr, sf_point, value)
+
+    def value_base_getter(self):
+
+        return self.store.get(self.store_index)
+
+    def value_base_setter(self, v):
+
+        self.store.set(self.store_index, v)
+
+    value_base = property(value_base_getter, value_base_setter, None)
+
+    def value_sf_getter(self):
+
+        return self.store.get_sf(self.store_index)
+
+    def value_sf_setter(self, v):
+
+        self.store.set_sf(self.store_index, v)
+
+    value_sf = property(value_sf_getter, value_sf_setter, None)
+
+class PointStore(object):
+    """Columnar store of the point values of a device. Each point added to
+    the store gets an index into three typed columns sharing a single
+    buffer: the 8 byte value, viewed as int64 or float64 depending on the
+    point type, the int16 scale factor value and the flags telling which of
+    them are set. Values that fit neither column, such as strings, are kept
+    in a list by index. A copy of the whole store is a single buffer copy,
+    see :meth:`snapshot`.
+
+    Attributes:
+
+        count
+            Number of points in the store.
+
+        capacity
+            Number of points the buffer can hold before it is reallocated.
+
+        points
+            List of the points by index.
+
+        kinds
+            Value kind by index, one of :const:`STORE_KIND_INT`,
+            :const:`STORE_KIND_FLOAT` or :const:`STORE_KIND_OBJECT`.
+
+    Raises:
+
+        SunSpecClientError: The typed views of the buffer are not available,
+        memoryview.cast requires Python 3.3 or later.
+    """
+
+    def __init__(self, capacity=64):
+
+        if not hasattr(memoryview, 'cast'):
+            raise SunSpecClientError('Point store requires Python 3.3 or later')
+
+        self.count = 0
+        self.capacity = 0
+        self.points = []
+        self.kinds = bytearray()
+        self.objects = []
+        self.buf = bytearray()
+        self.ints = self.floats = self.sfs = self.flags = None
+        self._allocate(capacity)
+
+    def _views(self, buf, capacity):
+
+        view = memoryview(buf)
+        values = view[:capacity * 8]
+        return (values.cast('q'), values.cast('d'), view[capacity * 8:capacity * 10].cast('h'),
+                view[capacity * 10:capacity * STORE_POINT_SIZE])
+
+    def _allocate(self, capacity):
+
+        buf = bytearray(capacity * STORE_POINT_SIZE)
+        ints, floats, sfs, flags = self._views(buf, capacity)
+        if self.count:
+            count = self.count
+            ints[:count] = self.ints[:count]
+            sfs[:count] = self.sfs[:count]
+            flags[:count] = self.flags[:count]
+        for view in (self.ints, self.floats, self.sfs, self.flags):
+            if view is not None:
+                view.release()
+        self.buf = buf
+        self.ints, self.floats, self.sfs, self.flags = ints, floats, sfs, flags
+        self.objects.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def add(self, point, point_type):
+        """Add a point to the store.
+
+        Parameters:
+
+            point :
+                Point object.
+
+            point_type :
+                Point type of the point, used to choose the value column.
+
+        Returns:
+
+            Index of the point in the store.
+        """
+
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+
+        code = decode_codes.get(point_type.data_to, (None, None))[0]
+        if code in ('f', 'd'):
+            kind = STORE_KIND_FLOAT
+        elif code in ('h', 'H', 'l', 'L', 'q'):
+            kind = STORE_KIND_INT
+        else:
+            kind = STORE_KIND_OBJECT
+
+        index = self.count
+        self.points.append(point)
+        self.kinds.append(kind)
+        self.count += 1
+        return index
+
+    def get(self, index):
+
+        flags = self.flags[index]
+        if not flags & STORE_FLAG_VALUE:
+            return None
+        if flags & STORE_FLAG_OBJECT:
+            return self.objects[index]
+        if self.kinds[index] == STORE_KIND_FLOAT:
+            return self.floats[index]
+        return self.ints[index]
+
+    def set(self, index, value):
+
+        flags = self.flags[index]
+        if flags & STORE_FLAG_OBJECT:
+            self.objects[index] = None
+        flags &= STORE_FLAG_SF
+        if value is not None:
+            kind = self.kinds[index]
+            if kind == STORE_KIND_INT and type(value) is int and STORE_INT_MIN <= value <= STORE_INT_MAX:
+                self.ints[index] = value
+                flags |= STORE_FLAG_VALUE
+            elif kind == STORE_KIND_FLOAT and type(value) is float:
+                self.floats[index] = value
+                flags |= STORE_FLAG_VALUE
+            else:
+                # values that do not fit the column of the point type
+                self.objects[index] = value
+                flags |= STORE_FLAG_VALUE | STORE_FLAG_OBJECT
+        self.flags[index] = flags
+
+    def get_sf(self, index):
+
+        if self.flags[index] & STORE_FLAG_SF:
+            return self.sfs[index]
+        return None
+
+    def set_sf(self, index, value):
+
+        if value is None:
+            self.flags[index] &= ~STORE_FLAG_SF
+        else:
+            self.sfs[index] = value
+            self.flags[index] |= STORE_FLAG_SF
+
+    def snapshot(self):
+        """Copy the contents of the store.
+
+        Returns:
+
+            :const:`StoreSnapshot` of the store.
+        """
+
+        return StoreSnapshot(self.capacity, self.count, bytes(self.buf), tuple(self.objects[:self.count]))
+
+    def values(self, snapshot=None):
+        """Return the point values of the store or of a snapshot of the
+        store.
+
+        Parameters:
+
+            snapshot :
+                :const:`StoreSnapshot` taken by :meth:`snapshot`. Defaults to
+                the current contents of the store.
+
+        Returns:
+
+            List of (value, scale factor value) tuples by point index.
+        """
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+        count = snapshot.count
+        ints, floats, sfs, flags = self._views(snapshot.buf, snapshot.capacity)
+        ints = ints[:count].tolist()
+        floats = floats[:count].tolist()
+        sfs = sfs[:count].tolist()
+        flags = flags[:count].tolist()
+        kinds = self.kinds
+        objects = snapshot.objects
+
+        values = []
+        for index in range(count):
+            f = flags[index]
+            if not f & STORE_FLAG_VALUE:
+                value = None
+            elif f & STORE_FLAG_OBJECT:
+                value = objects[index]
+            elif kinds[index] == STORE_KIND_FLOAT:
+                value = floats[index]
+            else:
+                value = ints[index]
+            values.append((value, sfs[index] if f & STORE_FLAG_SF else None))
+        return values
+
+    def changed(self, prev, snapshot=None):
+        """Return the indexes of the points whose value or scale factor value
+        differs between two snapshots.
+
+        Parameters:
+
+            prev :
+                Earlier :const:`StoreSnapshot` of the store.
+
+            snapshot :
+                Later :const:`StoreSnapshot` of the store. Defaults to the
+                current contents of the store.
+
+        Returns:
+
+            List of point indexes. Points added after *prev* are included.
+        """
+
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if prev.capacity == snapshot.capacity and prev.buf == snapshot.buf and prev.objects == snapshot.objects:
+            return []
+        prev_values = self.values(prev)
+        values = self.values(snapshot)
+        changed = [index for index in range(prev.count) if prev_values[index] != values[index]]
+        changed.extend(range(prev.count, snapshot.count))
+        return changed
+
+    def arrays(self, snapshot=None):
+        """Return numpy arrays viewing the columns of the store or of a
+        snapshot of the store.
+
+        Returns:
+
+            Tuple of the int64 and float64 value, int16 scale factor value
+            and uint8 flag arrays by point index. Strings and other values
+            that do not fit the value columns are only available with
+            :meth:`values`.
+
+        Raises:
+
+            SunSpecClientError: numpy is not installed.
+        """
+
+        if numpy is None:
+            raise SunSpecClientError('Store arrays require numpy')
+        if snapshot is None:
+            capacity, count, buf = self.capacity, self.count, self.buf
+        else:
+            capacity, count, buf = snapshot.capacity, snapshot.count, snapshot.buf
+        return (numpy.frombuffer(buf, dtype='=i8', count=count),
+                numpy.frombuffer(buf, dtype='=f8', count=count),
+                numpy.frombuffer(buf, dtype='=i2', count=count, offset=capacity * 8),
+                numpy.frombuffer(buf, dtype='u1', count=count, offset=capacity * 10))
+
 class SunSpecClientModelBase(object):
 
     """This class forms the base class of the dynamically generated model
@@ -581,15 +2321,17 @@ class SunSpecClientModelBase(object):
         # self.__dict__.set(name, item)
 
     def read(self):
-        """Read all points in the model from the physical device."""
+        """Read all points in the model from the physical device. Returns the
+        coroutine to await for the models of an asyncio device."""
 
-        self.model.read_points()
+        return self.model.read_points()
 
     def write(self):
         """Write all points that have been modified since the last write
-        operation to the physical device."""
+        operation to the physical device. Returns the coroutine to await for
+        the models of an asyncio device."""
 
-        self.model.write_points()
+        return self.model.write_points()
 
     def __str__(self):
         s = '\n{} ({}):\n'.format(self.name, self.model.id)
@@ -726,7 +2468,7 @@ class SunSpecClientDevice(object):
 
         device_type :
             Device type. Possible values: :const:`RTU`, :const:`TCP`,
-            :const:`MAPPED`.
+            :const:`RTU_TCP`, :const:`MAPPED`.
 
         slave_id :
             Modbus slave id
@@ -742,6 +2484,8 @@ class SunSpecClientDevice(object):
         baudrate :
             For :const:`RTU` devices, baud rate such as 9600 or 19200. Defaulted
             by modbus module to 9600.
+            For :const:`RTU_TCP` devices, baud rate of the bus behind the
+            converter, used for the inter-frame gap.
 
         parity :
             For :const:`RTU` devices, parity. Possible values:
@@ -750,11 +2494,12 @@ class SunSpecClientDevice(object):
             to :const:`PARITY_NONE`.
 
         ipaddr :
-            For :const:`TCP` devices, device IP address.
+            For :const:`TCP` devices, device IP address. For :const:`RTU_TCP`
+            devices, IP address of the serial converter.
 
         ipport :
-            For :const:`TCP` devices, device IP port. Defaulted by modbus module
-            to 502.
+            For :const:`TCP` and :const:`RTU_TCP` devices, device IP port.
+            Defaulted by modbus module to 502.
 
         tls :
             For :const:`TCP` devices, use TLS (Modbus/TCP Security). Defaults
@@ -784,6 +2529,33 @@ class SunSpecClientDevice(object):
         trace :
             Enable low level trace.
 
+        persistent :
+            For :const:`TCP` devices, keep the connection open between
+            requests instead of connecting for each request. Defaults to
+            `persistent=False`.
+
+        idle_timeout :
+            For persistent :const:`TCP` connections, idle time in seconds after
+            which the connection is re-established before the next request.
+
+        pipeline :
+            For :const:`TCP` devices, maximum number of read requests in flight
+            on the connection. Defaults to 1.
+
+        pool :
+            For :const:`TCP` devices, a
+            :const:`sunspec.core.modbus.client.ModbusTCPPool` shared with the
+            other devices behind the same gateway. See
+            :func:`sunspec.core.modbus.client.modbus_tcp_pool`.
+
+        scan_cache :
+            Path of a scan cache file used to skip the device scan when the
+            device has not changed. See :meth:`ClientDevice.scan`.
+
+        store :
+            If True, the point values are kept in a :class:`PointStore`. See
+            :const:`ClientDevice`.
+
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
@@ -806,44 +2578,49 @@ class SunSpecClientDevice(object):
     """
 
     def __init__(self, device_type, slave_id=None, name=None, pathlist = None, baudrate=None, parity=None, ipaddr=None, ipport=None,
-                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False, scan_progress=None, scan_delay=None):
+                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False, scan_progress=None, scan_delay=None,
+                 persistent=False, idle_timeout=None, scan_cache=None, pipeline=1, pool=None, store=False):
 
         # super(self.__class__, self).__init__(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport)
-        self.device = ClientDevice(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify, timeout, trace)
+        self.device = ClientDevice(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify, timeout, trace,
+                                   persistent=persistent, idle_timeout=idle_timeout, pipeline=pipeline, pool=pool,
+                                   store=store)
         self.models = []
 
         try:
             # scan device models
-            self.device.scan(progress=scan_progress, delay=scan_delay)
-
-            # create named attributes for each model
-            for model in self.device.models_list:
-                model_id = str(model.id)
-                c = model_class_get(model_id)
-                if model.model_type is not None:
-                    name = model.model_type.name
-                else:
-                    name = 'model_' + model_id
-                model_class = c(model, name)
-                existing = getattr(self, name, None)
-                # if model id already defined
-                if existing:
-                    # if model id definition is not a list, turn it into a list and add existing model
-                    if type(self[name]) is not list:
-                        # model instance index starts at 1 so first first list element is None
-                        setattr(self, name, [None])
-                        self[name].append(existing)
-                    # add new model to the list
-                    self[name].append(model_class)
-                # if first model id instance, set attribute as model
-                else:
-                    setattr(self, name, model_class)
-                    self.models.append(name)
+            self.device.scan(progress=scan_progress, delay=scan_delay, cache=scan_cache)
+            self._set_model_attributes()
         except Exception as e:
             if self.device is not None:
                 self.device.close()
             raise
 
+    def _set_model_attributes(self):
+        # create named attributes for each model
+        for model in self.device.models_list:
+            model_id = str(model.id)
+            c = model_class_get(model_id)
+            if model.model_type is not None:
+                name = model.model_type.name
+            else:
+                name = 'model_' + model_id
+            model_class = c(model, name)
+            existing = getattr(self, name, None)
+            # if model id already defined
+            if existing:
+                # if model id definition is not a list, turn it into a list and add existing model
+                if type(self[name]) is not list:
+                    # model instance index starts at 1 so first first list element is None
+                    setattr(self, name, [None])
+                    self[name].append(existing)
+                # add new model to the list
+                self[name].append(model_class)
+            # if first model id instance, set attribute as model
+            else:
+                setattr(self, name, model_class)
+                self.models.append(name)
+
     def close(self):
         """Release resources associated with the device. Should be called when
         the device object is no longer in use.
@@ -851,12 +2628,22 @@ class SunSpecClientDevice(object):
 
         self.device.close()
 
-    def read(self):
+    def read(self, scheduled=False):
         """Read the points for all models in the device from the physical
         device.
+
+        Parameters:
+
+            scheduled :
+                If True, only read the models that are due according to the
+                poll intervals of the device.
+
+        Returns:
+
+            :const:`DeviceSnapshot` of the point values just read.
         """
 
-        self.device.read_points()
+        return self.device.read_points(scheduled)
 
     def __getitem__(self, key):
         return self.__dict__.get(key, None)
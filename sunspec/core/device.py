@@ -24,6 +24,13 @@
 import contextlib
 import os
 import math
+import pickle
+
+# concurrent.futures is not available on python 2, model types are then preloaded serially
+try:
+    import concurrent.futures
+except ImportError:
+    concurrent = None
 
 try:
     import xml.etree.ElementTree as ET
@@ -38,6 +45,7 @@ from sunspec.core.util import SunSpecError
 
 
 fspath = getattr(os, 'fspath', str)
+replace = getattr(os, 'replace', os.rename)
 
 # file path list
 file_pathlist = None
@@ -315,6 +323,8 @@ class Block(object):
             Dictionary of scale factor points int the block indexed by point id.
     """
 
+    __slots__ = ('model', 'block_type', 'addr', 'len', 'type', 'index', 'points_list', 'points', 'points_sf')
+
     def __init__(self, model, addr, blen, block_type, index=1):
 
         self.model = model
@@ -465,6 +475,8 @@ class Point(object):
             Value of the point with the scale factor applied.
     """
 
+    __slots__ = ('block', 'point_type', 'addr', 'sf_point', 'impl', 'value_base', 'value_sf', 'dirty')
+
     def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
 
         self.block = block
@@ -608,6 +620,8 @@ class Point(object):
 
 class ScaleFactor(object):
 
+    __slots__ = ('value_base',)
+
     def __init__(self, value=None):
 
         self.value_base = value
@@ -674,6 +688,9 @@ class Model(object):
             instances.
     """
 
+    __slots__ = ('device', 'id', 'index', 'model_type', 'addr', 'len', 'points_list', 'points', 'points_sf', 'blocks',
+                 'load_error', 'read_blocks')
+
     def __init__(self, device=None, mid=None, addr=0, mlen=0, index=1):
 
         self.device = device
@@ -736,7 +753,7 @@ class Model(object):
                 for point_type in block_type.points_list:
                     if point_type.type != suns.SUNS_TYPE_PAD:
                         point_addr = int(block_addr) + int(point_type.offset)
-                        point = point_class(block=block, point_type=point_type, addr=str(point_addr))
+                        point = point_class(block=block, point_type=point_type, addr=point_addr)
                         if point_addr + point.point_type.len - last_read_addr > MAX_READ_COUNT:
                             last_read_addr = point_addr
                             self.read_blocks.append(last_read_addr)
@@ -887,12 +904,21 @@ class Model(object):
 model_type_path_default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'smdx')
 model_types = {}
 
+# precompiled model types of the default model directory, see model_types_compile()
+MODEL_TYPES_CACHE_VERSION = 2
+MODEL_TYPES_CACHE_FILE = 'model_types.pickle'
+MODEL_TYPES_MANIFEST_MD5 = 'manifest.xml.md5'
+
+# model types cache file, the cache is not used if None
+model_types_cache_file = os.path.join(model_type_path_default, MODEL_TYPES_CACHE_FILE)
+model_types_cached = None
+
 def model_type_get(model_id):
 
     global file_pathlist
     global model_types
 
-    model_type = model_types.get(str(model_id))
+    model_type = model_types.get(int(model_id))
     if model_type is None:
         smdx_data = ''
         # create model file name
@@ -907,6 +933,11 @@ def model_type_get(model_id):
 
         if not smdx_data:
             if not os.path.exists(filename):
+                # the model types of the default model directory are loaded from the cache if it is current
+                model_type = model_types_cache_get(model_id)
+                if model_type is not None:
+                    model_types[model_type.id] = model_type
+                    return model_type
                 filename = os.path.join(model_type_path_default, filename)
 
             if os.path.exists(filename):
@@ -918,12 +949,8 @@ def model_type_get(model_id):
                     raise SunSpecError('Error loading model {} at {}: {}'.format(model_id, filename, str(e)))
 
         if smdx_data:
-            root = ET.fromstring(smdx_data)
-
-            # load model type
             try:
-                model_type = ModelType()
-                model_type.from_smdx(root)
+                model_type = model_type_from_smdx(smdx_data)
                 model_types[model_type.id] = model_type
             except Exception as e:
                 raise SunSpecError('Error loading model {} at {}: {}'.format(model_id, filename, str(e)))
@@ -932,6 +959,201 @@ def model_type_get(model_id):
 
     return model_type
 
+def model_type_from_smdx(smdx_data):
+
+    root = ET.fromstring(smdx_data)
+
+    # load model type
+    model_type = ModelType()
+    model_type.from_smdx(root)
+    return model_type
+
+def model_types_manifest_md5(path=None):
+    """Return the digest of the model definitions of a model directory as
+    recorded in its manifest md5 file or None if the file is not present.
+    """
+
+    if path is None:
+        path = model_type_path_default
+
+    try:
+        with open(os.path.join(path, MODEL_TYPES_MANIFEST_MD5), 'r') as f:
+            return f.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+def model_types_compile(filename=None, path=None):
+    """Parse all the model definitions of a model directory and write the
+    resulting model types to a cache file keyed by the manifest md5 of the
+    directory. The cache is loaded by :func:`model_type_get` in place of the
+    SMDX files of the default model directory as long as the manifest md5 does
+    not change.
+
+    Parameters:
+
+        filename :
+            Cache file. Defaults to the cache file of the model directory.
+
+        path :
+            Model directory. Defaults to the default model directory.
+
+    Returns:
+
+        Number of model types written to the cache.
+
+    Raises:
+
+        SunSpecError: Raised if a model definition can not be loaded or the
+        model directory has no manifest md5.
+    """
+
+    if path is None:
+        path = model_type_path_default
+    if filename is None:
+        filename = os.path.join(path, MODEL_TYPES_CACHE_FILE)
+
+    md5 = model_types_manifest_md5(path)
+    if md5 is None:
+        raise SunSpecError('Model manifest %s not found in %s' % (MODEL_TYPES_MANIFEST_MD5, path))
+
+    compiled = {}
+    for name in sorted(os.listdir(path)):
+        model_id = smdx.model_filename_to_id(name)
+        if model_id is not None:
+            model_filename = os.path.join(path, name)
+            try:
+                with open(model_filename, 'r') as f:
+                    model_type = model_type_from_smdx(f.read())
+            except Exception as e:
+                raise SunSpecError('Error loading model {} at {}: {}'.format(model_id, model_filename, str(e)))
+            # each model type is pickled on its own so that only the models in use are unpickled
+            compiled[model_type.id] = pickle.dumps(model_type, pickle.HIGHEST_PROTOCOL)
+
+    cache = {
+        'version': MODEL_TYPES_CACHE_VERSION,
+        'md5': md5,
+        'model_types': compiled
+    }
+    # readers never see a partially written cache
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+    replace(tmp_filename, filename)
+
+    return len(compiled)
+
+def model_types_cache_load(filename, path=None):
+    """Load the model types of a cache file written by
+    :func:`model_types_compile`.
+
+    Returns:
+
+        Dictionary of pickled model types indexed by model id or None if the
+        cache can not be read or does not match the manifest md5 of the model
+        directory.
+    """
+
+    md5 = model_types_manifest_md5(path)
+    if md5 is None:
+        return None
+
+    try:
+        with open(filename, 'rb') as f:
+            cache = pickle.load(f)
+        if cache.get('version') != MODEL_TYPES_CACHE_VERSION or cache.get('md5') != md5:
+            return None
+        return cache['model_types']
+    except Exception:
+        # missing, truncated or written by an incompatible version, the model definitions are parsed instead
+        return None
+
+def model_types_cache_get(model_id):
+
+    global model_types_cached
+
+    if model_types_cache_file is None:
+        return None
+    if model_types_cached is None:
+        model_types_cached = model_types_cache_load(model_types_cache_file) or {}
+    data = model_types_cached.get(int(model_id))
+    if data is not None:
+        try:
+            return pickle.loads(data)
+        except Exception:
+            pass
+    return None
+
+def model_types_manifest_ids(path=None):
+    """Return the ids of the models listed in the manifest of a model
+    directory, or of the model definition files in the directory if it has
+    no manifest.
+    """
+
+    if path is None:
+        path = model_type_path_default
+
+    try:
+        names = [e.attrib.get('name', '') for e in ET.parse(os.path.join(path, 'manifest.xml')).getroot()]
+    except (IOError, OSError, ET.ParseError):
+        names = os.listdir(path)
+
+    model_ids = []
+    for name in sorted(names):
+        model_id = smdx.model_filename_to_id(name)
+        if model_id is not None:
+            model_ids.append(model_id)
+    return model_ids
+
+def model_types_preload(model_ids=None, workers=None):
+    """Load model types into the model type cache with a pool of worker
+    threads so that later scans do not wait for the model definitions to be
+    parsed.
+
+    Parameters:
+
+        model_ids :
+            List of model ids to load. Defaults to all the models in the
+            manifest of the default model directory.
+
+        workers :
+            Number of worker threads. Defaults to one per model, up to 8.
+            The models are loaded serially if concurrent.futures is not
+            available.
+
+    Returns:
+
+        Tuple of the list of loaded model ids and a dictionary of the load
+        error messages by model id.
+    """
+
+    if model_ids is None:
+        model_ids = model_types_manifest_ids()
+    model_ids = [int(model_id) for model_id in model_ids]
+    if not model_ids:
+        return [], {}
+    if workers is None:
+        workers = min(len(model_ids), 8)
+
+    def load(model_id):
+        try:
+            model_type_get(model_id)
+        except Exception as e:
+            return str(e)
+
+    loaded = []
+    errors = {}
+    if concurrent is None:
+        results = [load(model_id) for model_id in model_ids]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            results = list(executor.map(load, model_ids))
+    for model_id, error in zip(model_ids, results):
+        if error is None:
+            loaded.append(model_id)
+        else:
+            errors[model_id] = error
+    return loaded, errors
+
 def check_for_models(pathlist):
     # The common model (1) should be accessible.
     try:
@@ -976,6 +1198,8 @@ class ModelType(object):
             present.
     """
 
+    __slots__ = ('id', 'len', 'name', 'label', 'description', 'notes', 'fixed_block', 'repeating_block', 'symbols')
+
     def __init__(self, mid=None):
 
         self.id = mid
@@ -1139,6 +1363,8 @@ class BlockType(object):
             Dictionary containg the points in the block indexed by the point id.
     """
 
+    __slots__ = ('model_type', 'type', 'len', 'name', 'points_list', 'points')
+
     def __init__(self, btype=None, blen=0, name=None, model_type=None):
         self.model_type = model_type
         self.type = btype
@@ -1311,6 +1537,9 @@ class PointType(object):
             a point value of the type associated with the point.
     """
 
+    __slots__ = ('block_type', 'id', 'offset', 'type', 'len', 'mandatory', 'access', 'units', 'sf', 'label', 'description',
+                 'notes', 'value_default', 'is_impl', 'data_to', 'to_data', 'to_value', 'symbols')
+
     def __init__(self, pid=None, offset=None, ptype=None, plen=None, mandatory=None, access=None, sf=None,
                  block_type=None):
         self.block_type = block_type
@@ -1428,13 +1657,12 @@ class PointType(object):
 
         if point_type is None:
             return "PointType '%s' is None" % (str(self.id))
-        if len(self.__dict__) != len(point_type.__dict__):
-            return "PointType '%s' attribute count not equal': %s  %s" % (str(self.id))
-        for k, v in self.__dict__.items():
+        for k in self.__slots__:
             if k != 'block_type':
-                value = point_type.__dict__.get(k)
+                v = getattr(self, k)
+                value = getattr(point_type, k)
                 if v is not None and value is not None:
-                    if value is None or v != value:
+                    if v != value:
                         return "PointType '{}' attribute '{}' not equal: {}  {}".format(str(self.id), str(k), str(v), str(value))
 
         return False
@@ -1446,6 +1674,8 @@ class PointType(object):
 
 class Symbol(object):
 
+    __slots__ = ('id', 'value', 'label', 'description', 'notes')
+
     def __init__(self, sid=None):
         self.id = sid
         self.value = None
@@ -0,0 +1,441 @@
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# asyncio Modbus TCP transport. Requires Python 3.5 or later.
+
+import asyncio
+import ssl
+import struct
+import time
+
+from sunspec.core.modbus.client import ModbusClientError, ModbusClientTimeout, ModbusClientException
+from sunspec.core.modbus.client import REQ_COUNT_MAX, FUNC_READ_HOLDING, FUNC_WRITE_MULTIPLE, EXCEPT_ILLEGAL_VALUE
+from sunspec.core.modbus.client import req_count_lower
+from sunspec.core.modbus.client import TCP_HDR_LEN, TCP_HDR_O_LEN, TCP_RESP_MIN_LEN, TCP_READ_REQ_LEN
+from sunspec.core.modbus.client import TCP_WRITE_MULT_REQ_LEN, TCP_DEFAULT_PORT, TCP_DEFAULT_TIMEOUT
+
+class AsyncModbusClientDeviceTCP(object):
+    """Provides access to a Modbus TCP device from an asyncio event loop. The
+    interface matches :const:`sunspec.core.modbus.client.ModbusClientDeviceTCP`
+    with coroutines in place of the blocking calls. The connection is kept
+    open between requests and re-established once if a request fails on it.
+    Requests on a device are serialized, many devices can be accessed
+    concurrently from a single event loop.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            IP address string.
+
+        ipport :
+            IP port.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5.
+
+        ctx :
+            Context variable to be used by the object creator. Not used by the
+            modbus module.
+
+        trace_func :
+            Trace function to use for detailed logging. No detailed logging if
+            no trace function is supplied.
+
+        tls :
+            Use TLS (Modbus/TCP Security). Defaults to `tls=False`.
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only
+            used if `tls=True`.
+
+        insecure_skip_tls_verify :
+            Skip verification of server TLS certificate. Only used if
+            `tls=True`.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+        idle_timeout :
+            Time in seconds after which an unused connection is closed and
+            re-established before the next request. No idle timeout if None.
+
+        pipeline :
+            Maximum number of read requests in flight on the connection.
+
+    Raises:
+
+        ModbusClientError: Raised for any general modbus client error.
+
+        ModbusClientTimeoutError: Raised for a modbus client request timeout.
+
+        ModbusClientException: Raised for an exception response to a modbus
+            client request.
+    """
+
+    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None,
+                 certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX,
+                 idle_timeout=None, pipeline=1):
+        self.slave_id = slave_id
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.timeout = timeout
+        self.ctx = ctx
+        self.trace_func = trace_func
+        self.tls = tls
+        self.cafile = cafile
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.tls_verify = not insecure_skip_tls_verify
+        self.max_count = max_count
+        self.idle_timeout = idle_timeout
+        self.pipeline = pipeline or 1
+        self.persistent = True
+        self.reader = None
+        self.writer = None
+        self.last_activity = None
+        self.tid = 0
+        self.lock = None
+
+        if ipport is None:
+            self.ipport = TCP_DEFAULT_PORT
+        if timeout is None:
+            self.timeout = TCP_DEFAULT_TIMEOUT
+
+    async def connect(self, timeout=None):
+        """Connect to TCP destination.
+
+        Parameters:
+
+            timeout :
+                Connection timeout in seconds.
+        """
+
+        if self.writer is not None:
+            self.disconnect()
+
+        if timeout is None:
+            timeout = self.timeout
+
+        context = None
+        if self.tls:
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
+            context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
+            context.check_hostname = self.tls_verify
+
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ipaddr, self.ipport, ssl=context), timeout)
+        except Exception as e:
+            raise ModbusClientError('Connection error: %s' % str(e))
+        self.last_activity = time.time()
+
+    def disconnect(self):
+        """Disconnect from TCP destination.
+        """
+
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        except Exception:
+            pass
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+
+        self.disconnect()
+
+    async def _request(self, func, *args):
+        # serialize the requests on the connection and reconnect once if the request fails on it
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            if (self.writer is not None and self.idle_timeout is not None and self.last_activity is not None and
+                    time.time() - self.last_activity > self.idle_timeout):
+                self.disconnect()
+
+            reconnected = False
+            if self.writer is None:
+                await self.connect()
+                reconnected = True
+
+            try:
+                try:
+                    return await func(*args)
+                except ModbusClientException:
+                    raise
+                except (ModbusClientError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    self.disconnect()
+                    if reconnected:
+                        raise ModbusClientError('Request error: %s' % str(e))
+                # the device may have dropped the connection, reconnect and retry once
+                await self.connect()
+                try:
+                    return await func(*args)
+                except ModbusClientException:
+                    raise
+                except (ModbusClientError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    self.disconnect()
+                    raise ModbusClientError('Request error after reconnect: %s' % str(e))
+            finally:
+                self.last_activity = time.time()
+
+    def _next_tid(self):
+
+        if self.pipeline > 1:
+            self.tid = (self.tid + 1) & 0xffff
+        return self.tid
+
+    def _trace(self, direction, addr, frame):
+
+        if self.trace_func:
+            s = '{}:{}:{}[addr={}] {}'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr, direction)
+            for c in bytearray(frame):
+                s += '%02X' % (c)
+            self.trace_func(s)
+
+    async def _recv_frame(self):
+
+        resp = await asyncio.wait_for(self.reader.readexactly(TCP_HDR_LEN + TCP_RESP_MIN_LEN), self.timeout)
+        data_len = struct.unpack('>H', resp[TCP_HDR_O_LEN:TCP_HDR_O_LEN + 2])[0]
+        if data_len < TCP_RESP_MIN_LEN:
+            raise ModbusClientError('Invalid response length: %d' % (data_len))
+        if data_len > TCP_RESP_MIN_LEN:
+            resp += await asyncio.wait_for(self.reader.readexactly(data_len - TCP_RESP_MIN_LEN), self.timeout)
+        return resp
+
+    async def _read_chunks(self, requests, op, short=False):
+        # with short True a response may hold fewer registers than requested
+
+        results = [None] * len(requests)
+        pending = {}
+        next_index = 0
+
+        try:
+            while next_index < len(requests) or pending:
+                # keep up to pipeline requests in flight
+                while next_index < len(requests) and len(pending) < self.pipeline:
+                    addr, count = requests[next_index]
+                    tid = self._next_tid()
+                    req = struct.pack('>HHHBBHH', tid, 0, TCP_READ_REQ_LEN, int(self.slave_id), op, int(addr),
+                                      int(count))
+                    self._trace('->', addr, req)
+                    self.writer.write(req)
+                    pending[tid] = next_index
+                    next_index += 1
+                await self.writer.drain()
+
+                resp = await self._recv_frame()
+                tid = struct.unpack('>H', resp[:2])[0]
+                index = pending.pop(tid, None)
+                if index is None:
+                    raise ModbusClientError('Unexpected response transaction id: %d' % (tid))
+                self._trace('<--', requests[index][0], resp)
+
+                func, byte_count = struct.unpack('>BB', resp[TCP_HDR_LEN + 1:TCP_HDR_LEN + 3])
+                if func & 0x80:
+                    raise ModbusClientException('Modbus exception %d' % (byte_count), byte_count)
+                if ((byte_count > requests[index][1] * 2 if short else byte_count != requests[index][1] * 2) or
+                        len(resp) != TCP_HDR_LEN + 3 + byte_count):
+                    raise ModbusClientError('Invalid response byte count: %d' % (byte_count))
+                results[index] = resp[TCP_HDR_LEN + 3:]
+        except:
+            # responses to the requests still in flight would be taken for responses to later requests
+            if pending:
+                self.disconnect()
+            raise
+
+        return results
+
+    async def _read_multiple(self, requests, op):
+
+        # split the requests into chunks of at most max_count registers
+        chunks = []
+        owners = []
+        for index, (addr, count) in enumerate(requests):
+            offset = 0
+            while offset < count:
+                read_count = min(count - offset, self.max_count)
+                chunks.append((addr + offset, read_count))
+                owners.append(index)
+                offset += read_count
+
+        resp = [b''] * len(requests)
+        for index, data in zip(owners, await self._read_chunks(chunks, op)):
+            resp[index] += data
+
+        return resp
+
+    async def _read_all(self, addr, count, op):
+        # read the registers one request after the other, a device returning fewer registers than requested
+        # has its max count lowered, see sunspec.core.modbus.client.ModbusClientDeviceTCP._read_all
+
+        if self.pipeline > 1 and count > self.max_count:
+            return (await self._read_multiple([(addr, count)], op))[0]
+
+        resp = b''
+        short_count = None
+
+        while len(resp) < count * 2:
+            read_offset = len(resp) // 2
+            read_count = min(count - read_offset, self.max_count)
+            try:
+                data = (await self._read_chunks([(addr + read_offset, read_count)], op, True))[0]
+            except ModbusClientException:
+                if short_count is None:
+                    raise
+                # the short response ended at the end of the register map
+                return resp
+            if short_count is not None:
+                # the registers after a short response are readable, the device
+                # limits the register count of a response
+                self.max_count = short_count
+                short_count = None
+            if len(data) != read_count * 2:
+                if not data or len(data) % 2:
+                    return resp + data
+                # short response, read the remaining registers with another request
+                short_count = len(data) // 2
+            resp += data
+
+        return resp
+
+    async def read(self, addr, count, op=FUNC_READ_HOLDING):
+        """Read Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Read length in Modbus registers.
+
+            op :
+                Modbus function code for request.
+
+        Returns:
+
+            Byte string containing register contents.
+        """
+
+        return await self._read_adaptive(count, self._read_all, addr, count, op)
+
+    async def read_multiple(self, requests, op=FUNC_READ_HOLDING):
+        """Read several ranges of Modbus device registers. Up to *pipeline*
+        requests are sent without waiting for the previous responses.
+
+        Parameters:
+
+            requests :
+                List of (address, count) tuples.
+
+            op :
+                Modbus function code for request.
+
+        Returns:
+
+            List of byte strings containing the register contents of each
+            request.
+        """
+
+        if self.pipeline > 1:
+            count = max([count for addr, count in requests] or [0])
+            return await self._read_adaptive(count, self._read_multiple, requests, op)
+
+        resp = []
+        for addr, count in requests:
+            resp.append(await self.read(addr, count, op))
+        return resp
+
+    async def _read_adaptive(self, count, func, *args):
+        # lower the maximum register count while the device rejects the request size,
+        # see sunspec.core.modbus.client.read_adaptive
+
+        max_count = self.max_count
+        while True:
+            try:
+                return await self._request(func, *args)
+            except ModbusClientException as e:
+                lower = None
+                if e.except_code == EXCEPT_ILLEGAL_VALUE and count >= self.max_count:
+                    lower = req_count_lower(self.max_count)
+                if lower is None:
+                    self.max_count = max_count
+                    raise
+                self.max_count = lower
+
+    async def _write_all(self, addr, data):
+
+        write_offset = 0
+        count = len(data) // 2
+
+        while count > 0:
+            write_count = min(count, self.max_count)
+            start = write_offset * 2
+            chunk = data[start:start + write_count * 2]
+            write_len = len(chunk)
+            req = struct.pack('>HHHBBHHB', self._next_tid(), 0, TCP_WRITE_MULT_REQ_LEN + write_len,
+                              int(self.slave_id), FUNC_WRITE_MULTIPLE, int(addr + write_offset), write_count,
+                              write_len) + chunk
+            self._trace('->', addr + write_offset, req)
+            self.writer.write(req)
+            await self.writer.drain()
+
+            resp = await self._recv_frame()
+            self._trace('<--', addr + write_offset, resp)
+            if resp[TCP_HDR_LEN + 1] & 0x80:
+                raise ModbusClientException('Modbus exception: %d' % (resp[TCP_HDR_LEN + 2]), resp[TCP_HDR_LEN + 2])
+
+            count -= write_count
+            write_offset += write_count
+
+    async def write(self, addr, data):
+        """Write Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+        """
+
+        if type(data) is not bytes:
+            data = bytes(data, 'latin-1')
+
+        await self._request(self._write_all, addr, data)
@@ -22,11 +22,14 @@
 """
 
 import os
+import select
 import ssl
 import socket
 import struct
 import serial
 import sys
+import threading
+import time
 
 try:
     import xml.etree.ElementTree as ET
@@ -39,14 +42,35 @@ PARITY_NONE = 'N'
 PARITY_EVEN = 'E'
 
 REQ_COUNT_MAX = 125
+# register counts tried in turn when a device rejects the size of a read request
+REQ_COUNT_STEPS = (125, 120, 100, 64, 60, 50, 32, 16, 8)
 
 FUNC_READ_HOLDING = 3
 FUNC_READ_INPUT = 4
 FUNC_WRITE_MULTIPLE = 16
 
+EXCEPT_ILLEGAL_FUNCTION = 1
+EXCEPT_ILLEGAL_ADDRESS = 2
+EXCEPT_ILLEGAL_VALUE = 3
+
 TEST_NAME = 'test_name'
 
+# RTU frame sizes: slave id, function code, exception code or byte count and CRC
+RTU_RESP_MIN_LEN = 5
+# largest byte count of a legal read response, 125 registers
+RTU_READ_DATA_MAX = 250
+# the frame buffer holds a response with any byte count so an oversize frame is never truncated
+RTU_FRAME_MAX = 255 + RTU_RESP_MIN_LEN
+RTU_WRITE_RESP_LEN = 8
+
+# bits per character on the line and the fixed inter-frame gap above 19200 baud
+RTU_CHAR_BITS = 11
+RTU_FRAME_GAP_MIN = .00175
+
 modbus_rtu_clients = {}
+modbus_tcp_pools = {}
+# serializes the creation and removal of the shared clients and pools
+modbus_clients_lock = threading.Lock()
 
 class ModbusClientError(Exception):
     pass
@@ -55,26 +79,89 @@ class ModbusClientTimeout(ModbusClientError):
     pass
 
 class ModbusClientException(ModbusClientError):
-    pass
+    """Raised for an exception response to a modbus client request.
+
+    Attributes:
+
+        except_code
+            Modbus exception code of the response or None if not known.
+    """
+
+    def __init__(self, message, except_code=None):
+        ModbusClientError.__init__(self, message)
+        self.except_code = except_code
+
+def req_count_lower(count):
+    """Largest register count of :const:`REQ_COUNT_STEPS` below *count* or
+    None if there is none.
+    """
+
+    for step in REQ_COUNT_STEPS:
+        if step < count:
+            return step
+    return None
+
+def read_adaptive(device, count, func, *args):
+    """Call the read function *func* of a device lowering the maximum
+    register count of the device while it rejects the size of the requests
+    with an illegal data value exception. Only requests of the maximum count
+    are taken as rejected for their size, devices also return the exception
+    for the content of a request. If the read still fails at the lowest
+    count, the maximum count of the device is restored.
+
+    A lowered count splits the requests without regard to the points, callers
+    that need whole points read again with requests planned for the new
+    maximum count, see :meth:`sunspec.core.client.ClientDevice.read_models`.
+
+    Parameters:
+
+        device :
+            Modbus device object with a *max_count* attribute.
+
+        count :
+            Largest register count read by the function.
+
+        func :
+            Read function.
+
+    Returns:
+
+        Result of the read function.
+    """
+
+    max_count = device.max_count
+    while True:
+        try:
+            return func(*args)
+        except ModbusClientException as e:
+            lower = None
+            if e.except_code == EXCEPT_ILLEGAL_VALUE and count >= device.max_count:
+                lower = req_count_lower(device.max_count)
+            if lower is None:
+                # the exception is not caused by the request size
+                device.max_count = max_count
+                raise
+            device.max_count = lower
 
 def modbus_rtu_client(name=None, baudrate=None, parity=None):
 
     global modbus_rtu_clients
 
-    client = modbus_rtu_clients.get(name)
-    if client is not None:
-        if baudrate is not None and client.baudrate != baudrate:
-            raise ModbusClientError('Modbus client baudrate mismatch')
-        if parity is not None and client.parity != parity:
-            raise ModbusClientError('Modbus client parity mismatch')
-    else:
-        if baudrate is None:
-            baudrate = 9600
-        if parity is None:
-            parity = PARITY_NONE
-
-        client = ModbusClientRTU(name, baudrate, parity)
-        modbus_rtu_clients[name] = client
+    with modbus_clients_lock:
+        client = modbus_rtu_clients.get(name)
+        if client is not None:
+            if baudrate is not None and client.baudrate != baudrate:
+                raise ModbusClientError('Modbus client baudrate mismatch')
+            if parity is not None and client.parity != parity:
+                raise ModbusClientError('Modbus client parity mismatch')
+        else:
+            if baudrate is None:
+                baudrate = 9600
+            if parity is None:
+                parity = PARITY_NONE
+
+            client = ModbusClientRTU(name, baudrate, parity)
+            modbus_rtu_clients[name] = client
 
     return client
 
@@ -82,14 +169,143 @@ def modbus_rtu_client_remove(name=None):
 
     global modbus_rtu_clients
 
-    if modbus_rtu_clients.get(name):
-        del modbus_rtu_clients[name]
+    with modbus_clients_lock:
+        if modbus_rtu_clients.get(name):
+            del modbus_rtu_clients[name]
+
+def modbus_rtu_tcp_client(ipaddr, ipport=None, baudrate=None, test=False):
+
+    global modbus_rtu_clients
+
+    if ipport is None:
+        ipport = TCP_DEFAULT_PORT
+    name = 'tcp:%s:%d' % (ipaddr, ipport)
+
+    with modbus_clients_lock:
+        client = modbus_rtu_clients.get(name)
+        if client is None:
+            client = ModbusClientRTUTCP(ipaddr, ipport, baudrate, test=test)
+            modbus_rtu_clients[name] = client
+
+    return client
+
+class ModbusRTUScheduler(object):
+    """Schedules the request frames of all devices on a serial bus. Only
+    one request is on the bus at a time. When the bus becomes free, waiting
+    writes go first, then the requests with the highest priority. Requests
+    of equal priority are served round-robin by slave id, so a device
+    reading many registers does not hold back the other slaves on the bus.
+
+    Attributes:
+
+        queue
+            Tickets of the requests waiting for the bus.
+
+        queue_max
+            Largest number of requests that waited for the bus at once.
+
+        requests
+            Number of requests completed on the bus.
+
+        busy_time
+            Total time in seconds the bus was in use.
+
+        start_time
+            Time the scheduler was created.
+
+        slaves
+            Dictionary by slave id of [requests, wait time, request time]
+            totals, the times in seconds.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.busy = False
+        self.queue = []
+        self.seq = 0
+        self.last_slave_id = 0
+        self.queue_max = 0
+        self.requests = 0
+        self.busy_time = 0.0
+        self.start_time = time.time()
+        self.slaves = {}
+
+    def _next(self):
+
+        # writes first, then priority, then the next slave id after the last one served, then arrival
+        last = self.last_slave_id
+        return min(self.queue, key=lambda t: (not t[0], -t[1], (t[2] - last - 1) % 256, t[3]))
+
+    def run(self, slave_id, func, args, write=False, priority=0):
+        """Run a request function once the bus is free and the request is
+        the next one to be served.
+
+        Parameters:
+
+            slave_id :
+                Modbus slave id of the request.
+
+            func :
+                Function performing the request on the bus.
+
+            args :
+                Arguments of the function.
+
+            write :
+                True for a write request.
+
+            priority :
+                Priority of the request, higher priorities are served first.
+
+        Returns:
+
+            Result of the request function.
+        """
+
+        slave_id = int(slave_id)
+        with self.cond:
+            self.seq += 1
+            ticket = (write, priority, slave_id, self.seq)
+            self.queue.append(ticket)
+            self.queue_max = max(self.queue_max, len(self.queue))
+            queued = time.time()
+            while self.busy or self._next() is not ticket:
+                self.cond.wait()
+            self.queue.remove(ticket)
+            self.busy = True
+
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            end = time.time()
+            with self.cond:
+                self.busy = False
+                self.last_slave_id = slave_id
+                self.requests += 1
+                self.busy_time += end - start
+                stats = self.slaves.get(slave_id)
+                if stats is None:
+                    stats = self.slaves[slave_id] = [0, 0.0, 0.0]
+                stats[0] += 1
+                stats[1] += start - queued
+                stats[2] += end - start
+                self.cond.notify_all()
+
+    def utilisation(self):
+        """Fraction of the time since the scheduler was created the bus was
+        in use.
+        """
+
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return min(self.busy_time / elapsed, 1.0)
 
 class ModbusClientRTU(object):
     """A Modbus RTU client that multiple devices can use to access devices over
-    the same serial interface. Currently, the implementation does not support
-    concurent device requests so the support of multiple devices must be single
-    threaded.
+    the same serial interface. Requests of devices used from different threads
+    are serialized by the :const:`ModbusRTUScheduler` of the client.
 
     Parameters:
 
@@ -136,9 +352,17 @@ class ModbusClientRTU(object):
         write_timeout
             Write timeout in seconds. Fractional values are permitted.
 
+        frame_gap
+            Minimum idle time in seconds on the bus between the end of a
+            response and the next request, 3.5 character times at the baud
+            rate.
+
         devices
             List of :const:`sunspec.core.modbus.client.ModbusClientDeviceRTU`
             devices currently using the client.
+
+        scheduler
+            :const:`ModbusRTUScheduler` of the requests on the bus.
     """
 
     def __init__(self, name='/dev/ttyUSB0', baudrate=9600, parity=None):
@@ -149,6 +373,14 @@ class ModbusClientRTU(object):
         self.timeout = .5
         self.write_timeout = .5
         self.devices = {}
+        # response frames are received into a reusable buffer
+        self.frame = bytearray(RTU_FRAME_MAX)
+        self.frame_view = memoryview(self.frame)
+        self.frame_gap = RTU_FRAME_GAP_MIN
+        if baudrate and baudrate <= 19200:
+            self.frame_gap = 3.5 * RTU_CHAR_BITS / baudrate
+        self.last_frame = None
+        self.scheduler = ModbusRTUScheduler()
 
         self.open()
 
@@ -221,64 +453,87 @@ class ModbusClientRTU(object):
             self.close()
             modbus_rtu_client_remove(self.name)
 
-    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None):
-        resp = ''
-        len_remaining = 5
-        len_found = False
-        except_code = None
+    def _trace(self, slave_id, addr, direction, frame, trace_func):
+
+        s = '{}:{}[addr={}] {}'.format(self.name, str(slave_id), addr, direction)
+        for c in bytearray(frame):
+            s += '%02X' % (c)
+        trace_func(s)
+
+    def _send(self, slave_id, addr, req, trace_func=None):
 
-        req = struct.pack('>BBHH', int(slave_id), op, int(addr), int(count))
         req += struct.pack('>H', computeCRC(req))
 
         if trace_func:
-            s = '{}:{}[addr={}] ->'.format(self.name, str(slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+            self._trace(slave_id, addr, '->', req, trace_func)
+
+        # the bus must be idle for the inter-frame gap after the end of the last frame
+        if self.last_frame is not None:
+            delay = self.last_frame + self.frame_gap - time.time()
+            if delay > 0:
+                time.sleep(delay)
 
+        # discard the bytes of late or partial frames so they do not corrupt the response
         self.serial.flushInput()
         try:
             self.serial.write(req)
         except Exception as e:
             raise ModbusClientError('Serial write error: %s' % str(e))
 
-        while len_remaining > 0:
-            c = self.serial.read(len_remaining)
-            if type(c) == bytes and sys.version_info > (3,):
-                temp = ""
-                for i in c:
-                    temp += chr(i)
-                c = temp
+    def _recv(self, slave_id, addr, func, trace_func=None):
 
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= 5:
-                    if not (ord(resp[1]) & 0x80):
-                        len_remaining = (ord(resp[2]) + 5) - len(resp)
-                        len_found = True
+        # receive a response frame into the frame buffer, the frame length follows from the
+        # function code and byte count in the first bytes of the frame
+        frame = self.frame
+        view = self.frame_view
+        length = RTU_RESP_MIN_LEN
+        len_found = False
+        received = 0
+
+        try:
+            while received < length:
+                len_read = self.serial.readinto(view[received:length])
+                if not len_read:
+                    raise ModbusClientTimeout('Response timeout')
+                received += len_read
+                if not len_found and received >= RTU_RESP_MIN_LEN:
+                    if frame[1] & 0x80:
+                        length = RTU_RESP_MIN_LEN
+                    elif func == FUNC_WRITE_MULTIPLE:
+                        length = RTU_WRITE_RESP_LEN
                     else:
-                        except_code = ord(resp[2])
-            else:
-                raise ModbusClientTimeout('Response timeout')
+                        if frame[2] > RTU_READ_DATA_MAX:
+                            self.serial.flushInput()
+                            raise ModbusClientError('Invalid response byte count: %d' % (frame[2]))
+                        length = frame[2] + RTU_RESP_MIN_LEN
+                    len_found = True
+        finally:
+            self.last_frame = time.time()
 
         if trace_func:
-            s = '{}:{}[addr={}] <--'.format(self.name, str(slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+            self._trace(slave_id, addr, '<--', view[:received], trace_func)
 
-        crc = (ord(resp[-2]) << 8) | ord(resp[-1])
-        if not checkCRC(resp[:-2], crc):
+        if not checkFrameCRC(view[:length]):
+            self.serial.flushInput()
             raise ModbusClientError('CRC error')
 
-        if except_code:
-            raise ModbusClientException('Modbus exception %d' % (except_code))
+        if frame[0] != int(slave_id) or (frame[1] & 0x7f) != func:
+            raise ModbusClientError('Modbus response format error')
+
+        if frame[1] & 0x80:
+            raise ModbusClientException('Modbus exception %d' % (frame[2]), frame[2])
 
-        return resp[3:-2]
+        return length
 
-    def read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX):
+    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None):
+
+        req = struct.pack('>BBHH', int(slave_id), op, int(addr), int(count))
+        self._send(slave_id, addr, req, trace_func)
+        length = self._recv(slave_id, addr, op, trace_func)
+
+        return bytes(self.frame[3:length - 2])
+
+    def read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX, priority=0):
         """
         Parameters:
 
@@ -302,12 +557,15 @@ class ModbusClientRTU(object):
             max_count :
                 Maximum register count for a single Modbus request.
 
+            priority :
+                Scheduling priority of the requests on the bus.
+
         Returns:
 
             Byte string containing register contents.
         """
 
-        resp = ''
+        resp = b''
         read_count = 0
         read_offset = 0
 
@@ -317,7 +575,9 @@ class ModbusClientRTU(object):
                     read_count = max_count
                 else:
                     read_count = count
-                data = self._read(slave_id, addr + read_offset, read_count, op=op, trace_func=trace_func)
+                data = self.scheduler.run(slave_id, self._read,
+                                          (slave_id, addr + read_offset, read_count, op, trace_func),
+                                          priority=priority)
                 if data:
                     resp += data
                     count -= read_count
@@ -327,87 +587,26 @@ class ModbusClientRTU(object):
         else:
             raise ModbusClientError('Client serial port not open: %s' % self.name)
 
-        if sys.version_info > (3,):
-            resp = bytes(resp, 'latin-1')
-
         return resp
 
     def _write(self, slave_id, addr, data, trace_func=None):
-        resp = ''
-        len_remaining = 5
-        len_found = False
-        except_code = None
+
         func = FUNC_WRITE_MULTIPLE
         len_data = len(data)
         count = int(len_data/2)
 
-        req = struct.pack('>BBHHB', int(slave_id), func, int(addr), count, len_data)
         if sys.version_info > (3,):
             if type(data) is not bytes:
                 data = bytes(data, "latin-1")
-        req += data
-        req += struct.pack('>H', computeCRC(req))
-        if sys.version_info > (3,):
-            temp = ""
-            for i in req:
-                temp += chr(i)
-            req = temp
-
-        if trace_func:
-            s = '{}:{}[addr={}] ->'.format(self.name, str(slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+        req = struct.pack('>BBHHB', int(slave_id), func, int(addr), count, len_data) + data
+        self._send(slave_id, addr, req, trace_func)
+        self._recv(slave_id, addr, func, trace_func)
 
-        self.serial.flushInput()
-        try:
-            if sys.version_info > (3,):
-                req = bytes(req, "latin-1")
-            self.serial.write(req)
-        except Exception as e:
-            raise ModbusClientError('Serial write error: %s' % str(e))
-
-        while len_remaining > 0:
-            c = self.serial.read(len_remaining)
-            if type(c) == bytes and sys.version_info > (3,):
-                temp = ""
-                for i in c:
-                    temp += chr(i)
-                c = temp
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= 5:
-                    if not (ord(resp[1]) & 0x80):
-                        len_remaining = 8 - len(resp)
-                        len_found = True
-                    else:
-                        except_code = ord(resp[2])
-            else:
-                raise ModbusClientTimeout('Response timeout')
+        resp_addr, resp_count = struct.unpack_from('>HH', self.frame, 2)
+        if resp_addr != addr or resp_count != count:
+            raise ModbusClientError('Mobus response format error')
 
-        if trace_func:
-            s = '{}:{}[addr={}] <--'.format(self.name, str(slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            trace_func(s)
-
-
-        crc = (ord(resp[-2]) << 8) | ord(resp[-1])
-        if not checkCRC(resp[:-2], crc):
-            raise ModbusClientError('CRC error')
-
-        if except_code:
-            raise ModbusClientException('Modbus exception: %d' % (except_code))
-        else:
-            if sys.version_info > (3,):
-                resp = bytes(resp, 'latin-1')
-            resp_slave_id, resp_func, resp_addr, resp_count, resp_crc = struct.unpack('>BBHHH', resp)
-            if resp_slave_id != slave_id or resp_func != func or resp_addr != addr or resp_count != count:
-                raise ModbusClientError('Mobus response format error')
-
-    def write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX):
+    def write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX, priority=0):
         """
         Parameters:
 
@@ -426,6 +625,9 @@ class ModbusClientRTU(object):
 
             max_count :
                 Maximum register count for a single Modbus request.
+
+            priority :
+                Scheduling priority of the requests on the bus.
         """
 
         write_count = 0
@@ -440,8 +642,8 @@ class ModbusClientRTU(object):
                     write_count = count
                 start = int(write_offset * 2)
                 end = int((write_offset + write_count) * 2)
-                self._write(slave_id, addr + write_offset, data[start:end],
-                            trace_func=trace_func)
+                self.scheduler.run(slave_id, self._write, (slave_id, addr + write_offset, data[start:end], trace_func),
+                                   write=True, priority=priority)
                 count -= write_count
                 write_offset += write_count
         else:
@@ -482,6 +684,10 @@ class ModbusClientDeviceRTU(object):
         max_count :
             Maximum register count for a single Modbus request.
 
+        priority :
+            Scheduling priority of the requests of the device on the bus.
+            Higher priorities are served first.
+
     Raises:
 
         ModbusClientError: Raised for any general modbus client error.
@@ -492,13 +698,15 @@ class ModbusClientDeviceRTU(object):
             client request.
     """
 
-    def __init__(self, slave_id, name, baudrate=None, parity=None, timeout=None, ctx=None, trace_func=None, max_count=REQ_COUNT_MAX):
+    def __init__(self, slave_id, name, baudrate=None, parity=None, timeout=None, ctx=None, trace_func=None, max_count=REQ_COUNT_MAX,
+                 priority=0):
         self.slave_id = slave_id
         self.name = name
         self.client = None
         self.ctx = ctx
         self.trace_func = trace_func
         self.max_count = max_count
+        self.priority = priority
 
         self.client = modbus_rtu_client(name, baudrate, parity)
         if self.client is None:
@@ -535,7 +743,12 @@ class ModbusClientDeviceRTU(object):
             Byte string containing register contents.
         """
 
-        return self.client.read(self.slave_id, addr, count, op=op, trace_func=self.trace_func, max_count=self.max_count)
+        return read_adaptive(self, count, self._read, addr, count, op)
+
+    def _read(self, addr, count, op):
+
+        return self.client.read(self.slave_id, addr, count, op=op, trace_func=self.trace_func, max_count=self.max_count,
+                                priority=self.priority)
 
     def write(self, addr, data):
         """Write Modbus device registers.
@@ -549,7 +762,8 @@ class ModbusClientDeviceRTU(object):
                 Byte string containing register contents.
         """
 
-        return self.client.write(self.slave_id, addr, data, trace_func=self.trace_func, max_count=self.max_count)
+        return self.client.write(self.slave_id, addr, data, trace_func=self.trace_func, max_count=self.max_count,
+                                 priority=self.priority)
 
 TCP_HDR_LEN = 6
 TCP_RESP_MIN_LEN = 3
@@ -560,6 +774,374 @@ TCP_WRITE_MULT_REQ_LEN = 7
 TCP_DEFAULT_PORT = 502
 TCP_DEFAULT_TIMEOUT = 2
 
+# keepalive settings used for persistent connections
+TCP_KEEPALIVE_IDLE = 30
+TCP_KEEPALIVE_INTERVAL = 10
+TCP_KEEPALIVE_COUNT = 3
+
+class ModbusRTUSocket(object):
+    """Serial port like access to the TCP connection of a transparent
+    serial converter. The connection is opened on the first write and
+    re-opened on the next write after it is closed.
+
+    Parameters:
+
+        ipaddr :
+            IP address string.
+
+        ipport :
+            IP port.
+
+        timeout :
+            Response timeout in seconds.
+
+        test :
+            Use a fake socket.
+    """
+
+    def __init__(self, ipaddr, ipport, timeout, test=False):
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.timeout = timeout
+        self.writeTimeout = timeout
+        self.test = test
+        self.socket = None
+
+    def connect(self):
+
+        self.close()
+        try:
+            if self.test:
+                import sunspec.core.test.fake.socket as fake
+                self.socket = fake.socket(socket.AF_INET, socket.SOCK_STREAM)
+            else:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.settimeout(self.timeout)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.socket.connect((self.ipaddr, self.ipport))
+        except Exception as e:
+            self.close()
+            raise ModbusClientError('Connection error: %s' % str(e))
+
+    def close(self):
+
+        try:
+            if self.socket is not None:
+                self.socket.close()
+        except Exception:
+            pass
+        self.socket = None
+
+    def write(self, data):
+
+        if self.socket is None:
+            self.connect()
+        try:
+            self.socket.settimeout(self.timeout)
+            self.socket.sendall(data)
+        except socket.error:
+            # the converter closed the connection while it was idle
+            self.connect()
+            self.socket.sendall(data)
+
+    def readinto(self, buffer):
+
+        if self.socket is None:
+            raise ModbusClientError('Connection closed')
+        try:
+            len_read = self.socket.recv_into(buffer, len(buffer))
+        except socket.timeout:
+            return 0
+        except socket.error as e:
+            self.close()
+            raise ModbusClientError('Socket read error: %s' % str(e))
+        if not len_read:
+            self.close()
+            raise ModbusClientError('Connection closed')
+        return len_read
+
+    def flushInput(self):
+
+        # discard the bytes of late responses without waiting for more
+        if self.socket is None or self.test:
+            return
+        try:
+            while select.select([self.socket], [], [], 0)[0]:
+                if not self.socket.recv(RTU_FRAME_MAX):
+                    self.close()
+                    break
+        except (socket.error, ValueError):
+            self.close()
+
+class ModbusClientRTUTCP(ModbusClientRTU):
+    """A Modbus RTU client for slaves behind a transparent serial converter.
+    RTU frames with their CRC are exchanged over a persistent TCP connection
+    to the converter, which forwards them unchanged to the serial bus. The
+    framing, CRC checks and request scheduling are those of
+    :const:`ModbusClientRTU`. As RTU frames carry no transaction id, a
+    response arriving after its timeout is discarded before the next request.
+
+    Parameters:
+
+        ipaddr :
+            IP address string of the converter.
+
+        ipport :
+            IP port of the converter.
+
+        baudrate :
+            Baud rate of the serial bus behind the converter, used for the
+            inter-frame gap. The gap for baud rates above 19200 is used if not
+            specified.
+
+        test :
+            Use a fake socket.
+    """
+
+    def __init__(self, ipaddr, ipport=TCP_DEFAULT_PORT, baudrate=None, test=False):
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.test = test
+        ModbusClientRTU.__init__(self, 'tcp:%s:%d' % (ipaddr, ipport), baudrate, PARITY_NONE)
+
+    def open(self):
+        """Create the connection object, the connection itself is opened by
+        the first request.
+        """
+
+        self.serial = ModbusRTUSocket(self.ipaddr, self.ipport, self.timeout, self.test)
+
+    def _retry(self, func, *args):
+
+        try:
+            return func(self, *args)
+        except ModbusClientError:
+            # the request is sent again on a new connection if the converter closed the connection
+            if self.serial.socket is not None:
+                raise
+        return func(self, *args)
+
+    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None):
+
+        return self._retry(ModbusClientRTU._read, slave_id, addr, count, op, trace_func)
+
+    def _write(self, slave_id, addr, data, trace_func=None):
+
+        return self._retry(ModbusClientRTU._write, slave_id, addr, data, trace_func)
+
+class ModbusClientDeviceRTUTCP(ModbusClientDeviceRTU):
+    """Provides access to a Modbus RTU device behind a transparent serial
+    converter. The devices behind the same converter share its
+    :const:`ModbusClientRTUTCP` client.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            IP address string of the converter.
+
+        ipport :
+            IP port of the converter.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5.
+
+        ctx :
+            Context variable to be used by the object creator. Not used by the
+            modbus module.
+
+        trace_func :
+            Trace function to use for detailed logging. No detailed logging is
+            perform is a trace function is not supplied.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+        priority :
+            Scheduling priority of the requests of the device on the bus.
+
+        baudrate :
+            Baud rate of the serial bus behind the converter.
+
+        test :
+            Use a fake socket.
+    """
+
+    def __init__(self, slave_id, ipaddr, ipport=None, timeout=None, ctx=None, trace_func=None, max_count=REQ_COUNT_MAX,
+                 priority=0, baudrate=None, test=False):
+        self.slave_id = slave_id
+        self.client = modbus_rtu_tcp_client(ipaddr, ipport, baudrate, test=test)
+        self.name = self.client.name
+        self.ctx = ctx
+        self.trace_func = trace_func
+        self.max_count = max_count
+        self.priority = priority
+        self.client.add_device(self.slave_id, self)
+
+        if timeout is not None:
+            self.client.serial.timeout = timeout
+            self.client.serial.writeTimeout = timeout
+
+# default number of connections a pool keeps to a gateway
+TCP_POOL_SIZE_DEFAULT = 2
+
+def modbus_tcp_pool_key(ipaddr, ipport=None, tls=False, cafile=None, certfile=None, keyfile=None,
+                        insecure_skip_tls_verify=False):
+
+    if ipport is None:
+        ipport = TCP_DEFAULT_PORT
+    return (ipaddr, ipport, tls, cafile, certfile, keyfile, not insecure_skip_tls_verify)
+
+def modbus_tcp_pool(ipaddr, ipport=None, tls=False, cafile=None, certfile=None, keyfile=None,
+                    insecure_skip_tls_verify=False, size=None):
+
+    global modbus_tcp_pools
+
+    key = modbus_tcp_pool_key(ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify)
+    with modbus_clients_lock:
+        pool = modbus_tcp_pools.get(key)
+        if pool is not None:
+            if size is not None and pool.size != size:
+                raise ModbusClientError('Modbus TCP pool size mismatch')
+        else:
+            if size is None:
+                size = TCP_POOL_SIZE_DEFAULT
+
+            pool = ModbusTCPPool(key, size)
+            modbus_tcp_pools[key] = pool
+
+    return pool
+
+def modbus_tcp_pool_remove(ipaddr, ipport=None, tls=False, cafile=None, certfile=None, keyfile=None,
+                           insecure_skip_tls_verify=False):
+
+    global modbus_tcp_pools
+
+    key = modbus_tcp_pool_key(ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify)
+    with modbus_clients_lock:
+        pool = modbus_tcp_pools.pop(key, None)
+    if pool is not None:
+        pool.close()
+
+class ModbusTCPPool(object):
+    """A pool of Modbus TCP connections to a gateway that multiple devices
+    with different slave ids share. A device takes a connection from the pool
+    for the duration of a request and returns it afterwards, so the number of
+    concurrent connections to the gateway never exceeds the pool size.
+    Devices wait for a connection to be returned when all are in use.
+
+    Parameters:
+
+        key :
+            Pool key as returned by :func:`modbus_tcp_pool_key`.
+
+        size :
+            Maximum number of connections to the gateway.
+
+    Attributes:
+
+        key
+            Pool key (IP address, IP port, TLS settings).
+
+        size
+            Maximum number of connections to the gateway.
+
+        in_use
+            Number of connections currently taken by devices.
+
+        acquires
+            Number of connections taken from the pool.
+
+        reuses
+            Number of connections taken from the pool that were already open.
+
+        waits
+            Number of times a device had to wait for a connection.
+
+        wait_time
+            Total time in seconds devices waited for a connection.
+    """
+
+    def __init__(self, key, size=TCP_POOL_SIZE_DEFAULT):
+        self.key = key
+        self.size = size
+        self.idle = []
+        self.in_use = 0
+        self.acquires = 0
+        self.reuses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.cond = threading.Condition()
+
+    def connections(self):
+        """Number of open connections in the pool including the connections
+        currently in use.
+        """
+
+        with self.cond:
+            return len(self.idle) + self.in_use
+
+    def acquire(self):
+        """Take a connection from the pool, waiting for one to be released if
+        all connections are in use.
+
+        Returns:
+
+            Tuple of the socket and the time of its last activity. The socket
+            is None if the caller must open a new connection.
+        """
+
+        with self.cond:
+            start = None
+            while self.in_use >= self.size:
+                if start is None:
+                    start = time.time()
+                    self.waits += 1
+                self.cond.wait()
+            if start is not None:
+                self.wait_time += time.time() - start
+            self.in_use += 1
+            self.acquires += 1
+            if self.idle:
+                self.reuses += 1
+                # most recently used first, it is the least likely to have been closed by the gateway
+                return self.idle.pop()
+            return None, None
+
+    def release(self, sock, last_activity=None):
+        """Return a connection to the pool.
+
+        Parameters:
+
+            sock :
+                Socket of the connection or None if the connection was closed.
+
+            last_activity :
+                Time of the last request on the connection.
+        """
+
+        with self.cond:
+            self.in_use -= 1
+            if sock is not None:
+                self.idle.append((sock, last_activity))
+            self.cond.notify()
+
+    def close(self):
+        """Close the connections that are not in use.
+        """
+
+        with self.cond:
+            for sock, last_activity in self.idle:
+                try:
+                    sock.close()
+                except Exception:
+                    pass
+            self.idle = []
+
 class ModbusClientDeviceTCP(object):
     """Provides access to a Modbus TCP device.
 
@@ -612,6 +1194,21 @@ class ModbusClientDeviceTCP(object):
             Use test socket. If True use the fake socket module for network
             communications.
 
+        persistent :
+            Keep the connection open between requests. The connection is
+            created on the first request, has TCP keepalive enabled and is
+            transparently re-established if a request fails on it.
+
+        idle_timeout :
+            For persistent connections, time in seconds after which an unused
+            connection is closed and re-established before the next request.
+            No idle timeout if None.
+
+        pipeline :
+            Maximum number of read requests in flight on the connection. If
+            greater than 1, requests carry increasing transaction ids and
+            responses are matched to requests by transaction id. Defaults to
+            1 (one request at a time with transaction id 0).
 
     Raises:
 
@@ -669,9 +1266,24 @@ class ModbusClientDeviceTCP(object):
 
         max_count
             Maximum register count for a single Modbus request.
+
+        persistent
+            Keep the connection open between requests.
+
+        idle_timeout
+            Idle time in seconds after which a persistent connection is
+            re-established.
+
+        pipeline
+            Maximum number of read requests in flight on the connection.
+
+        pool
+            :const:`ModbusTCPPool` the connections are taken from or None if
+            the device uses its own connection.
     """
 
-    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX, test=False):
+    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX, test=False,
+                 persistent=False, idle_timeout=None, pipeline=1, pool=None):
         self.slave_id = slave_id
         self.ipaddr = ipaddr
         self.ipport = ipport
@@ -685,13 +1297,26 @@ class ModbusClientDeviceTCP(object):
         self.keyfile = keyfile
         self.tls_verify = not insecure_skip_tls_verify
         self.max_count = max_count
+        self.test = test
+        self.persistent = persistent
+        self.idle_timeout = idle_timeout
+        self.last_activity = None
+        self.pipeline = pipeline or 1
+        self.pool = pool
+        self.tid = 0
+        # receive buffer for response headers, register data is received directly into the result
+        self.hdr = bytearray(TCP_HDR_LEN + TCP_RESP_MIN_LEN)
+        self.hdr_view = memoryview(self.hdr)
 
         if ipport is None:
             self.ipport = TCP_DEFAULT_PORT
         if timeout is None:
             self.timeout = TCP_DEFAULT_TIMEOUT
 
-        if test:
+        if pool is not None:
+            # pooled connections are kept open between requests
+            self.persistent = True
+        elif test:
             import sunspec.core.test.fake.socket as fake
             self.socket = fake.socket()
 
@@ -715,8 +1340,21 @@ class ModbusClientDeviceTCP(object):
             timeout = self.timeout
 
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if self.test:
+                import sunspec.core.test.fake.socket as fake
+                self.socket = fake.socket(socket.AF_INET, socket.SOCK_STREAM)
+            else:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(timeout)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.persistent:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                # fine grained keepalive settings are not available on all platforms
+                for opt, value in (('TCP_KEEPIDLE', TCP_KEEPALIVE_IDLE),
+                                   ('TCP_KEEPINTVL', TCP_KEEPALIVE_INTERVAL),
+                                   ('TCP_KEEPCNT', TCP_KEEPALIVE_COUNT)):
+                    if hasattr(socket, opt):
+                        self.socket.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), value)
 
             if self.tls:
                 context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
@@ -726,6 +1364,7 @@ class ModbusClientDeviceTCP(object):
                 self.socket = context.wrap_socket(self.socket, server_side=False, server_hostname=self.ipaddr)
 
             self.socket.connect((self.ipaddr, self.ipport))
+            self.last_activity = time.time()
         except Exception as e:
             raise ModbusClientError('Connection error: %s' % str(e))
 
@@ -740,65 +1379,129 @@ class ModbusClientDeviceTCP(object):
         except Exception:
             pass
 
-    def _read(self, addr, count, op=FUNC_READ_HOLDING):
+    def _request(self, func, *args):
+        """Run a request function on the connection. Without a persistent
+        connection, a connection is created if none exists and disconnected at
+        the end of the request. With a persistent connection, the connection
+        is kept open and is re-established once if the request fails on it.
+        With a pool, the connection is taken from the pool for the duration
+        of the request.
+        """
 
-        resp = b''
-        len_remaining = TCP_HDR_LEN + TCP_RESP_MIN_LEN
-        len_found = False
-        except_code = None
+        if self.pool is None:
+            return self._request_connection(func, *args)
+
+        self.socket, self.last_activity = self.pool.acquire()
+        try:
+            return self._request_connection(func, *args)
+        finally:
+            sock = self.socket
+            self.socket = None
+            self.pool.release(sock, self.last_activity)
+
+    def _request_connection(self, func, *args):
+
+        local_connect = False
+
+        if (self.persistent and self.socket is not None and self.idle_timeout is not None and
+                self.last_activity is not None and time.time() - self.last_activity > self.idle_timeout):
+            self.disconnect()
+
+        if self.socket is None:
+            local_connect = not self.persistent
+            self.connect(self.timeout)
+
+        try:
+            try:
+                return func(*args)
+            except ModbusClientException:
+                raise
+            except (ModbusClientError, socket.error):
+                if not self.persistent:
+                    raise
+            # the device may have dropped the connection, reconnect and retry once
+            self.connect(self.timeout)
+            try:
+                return func(*args)
+            except ModbusClientException:
+                raise
+            except (ModbusClientError, socket.error) as e:
+                self.disconnect()
+                raise ModbusClientError('Request error after reconnect: %s' % str(e))
+        finally:
+            if local_connect:
+                self.disconnect()
+            else:
+                self.last_activity = time.time()
+
+    def _recv_into(self, view):
+
+        # fill the buffer view completely from the socket
+        while len(view) > 0:
+            len_read = self.socket.recv_into(view, len(view))
+            if not len_read:
+                raise ModbusClientTimeout('Response timeout')
+            view = view[len_read:]
+
+    def _recv_header(self):
+
+        # receive the MBAP header, function code and byte count (or exception code) of a response
+        self._recv_into(self.hdr_view)
+        tid, data_len, func, byte_count = struct.unpack_from('>H2xHxBB', self.hdr)
+        if func & 0x80:
+            if self.trace_func:
+                self._trace('<--', None, self.hdr)
+            raise ModbusClientException('Modbus exception %d' % (byte_count), byte_count)
+        if data_len != byte_count + TCP_RESP_MIN_LEN:
+            raise ModbusClientError('Invalid response length: %d' % (data_len))
+        return tid, byte_count
 
-        req = struct.pack('>HHHBBHH', 0, 0, TCP_READ_REQ_LEN, int(self.slave_id), op, int(addr), int(count))
+    def _trace(self, direction, addr, frame):
+
+        s = '{}:{}:{}[addr={}] {}'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr, direction)
+        for c in bytearray(frame):
+            s += '%02X' % (c)
+        self.trace_func(s)
+
+    def _send_read(self, tid, addr, count, op):
+
+        req = struct.pack('>HHHBBHH', tid, 0, TCP_READ_REQ_LEN, int(self.slave_id), op, int(addr), int(count))
 
         if self.trace_func:
-            s = '{}:{}:{}[addr={}] ->'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
+            self._trace('->', addr, req)
 
         try:
             self.socket.sendall(req)
         except Exception as e:
             raise ModbusClientError('Socket write error: %s' % str(e))
 
-        while len_remaining > 0:
-            c = self.socket.recv(len_remaining)
-            # print('c = {0}'.format(c))
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= TCP_HDR_LEN + TCP_RESP_MIN_LEN:
-                    data_len = struct.unpack('>H', resp[TCP_HDR_O_LEN:TCP_HDR_O_LEN + 2])
-                    len_remaining = data_len[0] - (len(resp) - TCP_HDR_LEN)
-            else:
-                raise ModbusClientError('Response timeout')
+    def _read_into(self, view, addr, count, op=FUNC_READ_HOLDING):
 
-        if sys.version_info > (3,):
-            temp = ""
-            for i in resp:
-                temp += chr(i)
-            resp = temp
+        # read registers directly into the buffer view, returns the number of bytes received
+        self._send_read(0, addr, count, op)
 
-        if not (ord(resp[TCP_HDR_LEN + 1]) & 0x80):
-            len_remaining = (ord(resp[TCP_HDR_LEN + 2]) + TCP_HDR_LEN) - len(resp)
-            len_found = True
-        else:
-            except_code = ord(resp[TCP_HDR_LEN + 2])
+        tid, byte_count = self._recv_header()
+        if byte_count > len(view):
+            raise ModbusClientError('Invalid response byte count: %d' % (byte_count))
+        self._recv_into(view[:byte_count])
 
         if self.trace_func:
-            s = '{}:{}:{}[addr={}] <--'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
+            self._trace('<--', addr, bytes(self.hdr) + view[:byte_count].tobytes())
 
-        if except_code:
-            raise ModbusClientException('Modbus exception %d' % (except_code))
+        return byte_count
+
+    def _read(self, addr, count, op=FUNC_READ_HOLDING):
 
-        return resp[(TCP_HDR_LEN + 3):]
+        resp = bytearray(count * 2)
+        byte_count = self._read_into(memoryview(resp), addr, count, op)
+        if byte_count != len(resp):
+            resp = resp[:byte_count]
+        return resp
 
     def read(self, addr, count, op=FUNC_READ_HOLDING):
         """ Read Modbus device registers. If no connection exists to the
-        destination, one is created and disconnected at the end of the request.
+        destination, one is created and disconnected at the end of the request
+        unless the device uses a persistent connection.
 
         Parameters:
 
@@ -813,38 +1516,127 @@ class ModbusClientDeviceTCP(object):
 
         Returns:
 
-            Byte string containing register contents.
+            Bytearray containing register contents. Each read returns a new
+            buffer owned by the caller, the responses are received directly
+            into it.
         """
 
-        resp = ''
-        read_count = 0
-        read_offset = 0
-        local_connect = False
+        return read_adaptive(self, count, self._request, self._read_all, addr, count, op)
 
-        if self.socket is None:
-            local_connect = True
-            self.connect(self.timeout)
+    def read_multiple(self, requests, op=FUNC_READ_HOLDING):
+        """ Read several ranges of Modbus device registers. With a pipeline
+        greater than 1, the requests are sent without waiting for the
+        responses of the previous requests.
 
-        try:
-            while (count > 0):
-                if count > self.max_count:
-                    read_count = self.max_count
-                else:
-                    read_count = count
-                data = self._read(addr + read_offset, read_count, op=op)
+        Parameters:
 
-                if data:
-                    resp += data
-                    count -= read_count
-                    read_offset += read_count
-                else:
-                    break
-        finally:
-            if local_connect:
+            requests :
+                List of (address, count) tuples.
+
+            op :
+                Modbus function code for request.
+
+        Returns:
+
+            List of byte strings containing the register contents of each
+            request.
+        """
+
+        if self.pipeline > 1:
+            count = max([count for addr, count in requests] or [0])
+            return read_adaptive(self, count, self._request, self._read_multiple, requests, op)
+
+        return [self.read(addr, count, op) for addr, count in requests]
+
+    def _read_multiple(self, requests, op):
+
+        # split the requests into chunks of at most max_count registers, each chunk is received
+        # directly into its part of the result buffer of the request
+        chunks = []
+        resp = []
+        for addr, count in requests:
+            data = bytearray(count * 2)
+            view = memoryview(data)
+            offset = 0
+            while offset < count:
+                read_count = min(count - offset, self.max_count)
+                chunks.append((addr + offset, view[offset * 2:(offset + read_count) * 2]))
+                offset += read_count
+            resp.append(data)
+
+        self._read_pipelined(chunks, op)
+        return resp
+
+    def _next_tid(self):
+
+        self.tid = (self.tid + 1) & 0xffff
+        return self.tid
+
+    def _read_pipelined(self, chunks, op):
+
+        pending = {}
+        next_index = 0
+
+        try:
+            while next_index < len(chunks) or pending:
+                # keep up to pipeline requests in flight
+                while next_index < len(chunks) and len(pending) < self.pipeline:
+                    addr, view = chunks[next_index]
+                    tid = self._next_tid()
+                    self._send_read(tid, addr, len(view) // 2, op)
+                    pending[tid] = next_index
+                    next_index += 1
+
+                tid, byte_count = self._recv_header()
+                index = pending.pop(tid, None)
+                if index is None:
+                    raise ModbusClientError('Unexpected response transaction id: %d' % (tid))
+                addr, view = chunks[index]
+                if byte_count != len(view):
+                    raise ModbusClientError('Invalid response byte count: %d' % (byte_count))
+                self._recv_into(view)
+
+                if self.trace_func:
+                    self._trace('<--', addr, bytes(self.hdr) + view.tobytes())
+        except:
+            # responses to the requests still in flight would be taken for responses to later requests
+            if pending:
                 self.disconnect()
+            raise
 
-        if sys.version_info > (3,):
-            resp = bytes(resp, 'latin-1')
+    def _read_all(self, addr, count, op):
+
+        if self.pipeline > 1 and count > self.max_count:
+            return self._read_multiple([(addr, count)], op)[0]
+
+        # a new result buffer per read rather than views into a buffer of the connection, callers keep the
+        # results of several reads (read plans, scan headers) and would see them overwritten by the next read
+        resp = bytearray(count * 2)
+        view = memoryview(resp)
+        read_offset = 0
+        short_count = None
+
+        while read_offset < count:
+            read_count = min(count - read_offset, self.max_count)
+            try:
+                byte_count = self._read_into(view[read_offset * 2:(read_offset + read_count) * 2],
+                                             addr + read_offset, read_count, op=op)
+            except ModbusClientException:
+                if short_count is None:
+                    raise
+                # the short response ended at the end of the register map
+                return resp[:read_offset * 2]
+            if short_count is not None:
+                # the registers after a short response are readable, the device
+                # limits the register count of a response
+                self.max_count = short_count
+                short_count = None
+            if byte_count != read_count * 2:
+                if byte_count == 0 or byte_count % 2:
+                    return resp[:read_offset * 2 + byte_count]
+                # short response, read the remaining registers with another request
+                short_count = byte_count // 2
+            read_offset += byte_count // 2
 
         return resp
 
@@ -913,11 +1705,12 @@ class ModbusClientDeviceTCP(object):
             self.trace_func(s)
 
         if except_code:
-            raise ModbusClientException('Modbus exception: %d' % (except_code))
+            raise ModbusClientException('Modbus exception: %d' % (except_code), except_code)
 
     def write(self, addr, data):
         """ Write Modbus device registers. If no connection exists to the
-        destination, one is created and disconnected at the end of the request.
+        destination, one is created and disconnected at the end of the request
+        unless the device uses a persistent connection.
 
         Parameters:
 
@@ -928,29 +1721,24 @@ class ModbusClientDeviceTCP(object):
                 Byte string containing register contents.
         """
 
+        return self._request(self._write_all, addr, data)
+
+    def _write_all(self, addr, data):
+
         write_count = 0
         write_offset = 0
-        local_connect = False
         count = len(data)/2
 
-        if self.socket is None:
-            local_connect = True
-            self.connect(self.timeout)
-
-        try:
-            while (count > 0):
-                if count > self.max_count:
-                    write_count = self.max_count
-                else:
-                    write_count = count
-                    start = (write_offset * 2)
-                    end = int((write_offset + write_count) * 2)
-                self._write(addr + write_offset, data[start:end])
-                count -= write_count
-                write_offset += write_count
-        finally:
-            if local_connect:
-                self.disconnect()
+        while (count > 0):
+            if count > self.max_count:
+                write_count = self.max_count
+            else:
+                write_count = count
+                start = (write_offset * 2)
+                end = int((write_offset + write_count) * 2)
+            self._write(addr + write_offset, data[start:end])
+            count -= write_count
+            write_offset += write_count
 
 class ModbusClientDeviceMapped(object):
     """Provides access to a Modbus device implemented as a modbus map (mbmap)
@@ -1037,7 +1825,11 @@ class ModbusClientDeviceMapped(object):
         """
 
         if self.modbus_map is not None:
-            return self.modbus_map.read(addr, count, op)
+            try:
+                return self.modbus_map.read(addr, count, op)
+            except mbmap.ModbusMapError as e:
+                # a physical device responds to registers outside of its map with an exception
+                raise ModbusClientException(str(e), EXCEPT_ILLEGAL_ADDRESS)
         else:
             raise ModbusClientError('No modbus map set for device')
 
@@ -1076,28 +1868,50 @@ def __generate_crc16_table():
     return result
 
 __crc16_table = __generate_crc16_table()
+__crc16_word_table = None
+
+def __generate_crc16_word_table():
+    ''' Generates a crc16 lookup table for two bytes at a time. The crc
+    after two bytes only depends on the current crc xor the two bytes
+    as a little endian word.
+
+    .. note:: This is generated on first use
+    '''
+    table = __crc16_table
+    result = []
+    for word in range(65536):
+        crc = table[word & 0xff]
+        result.append((crc >> 8) ^ table[(crc ^ (word >> 8)) & 0xff])
+    return result
+
+def __crc16(data, crc=0xffff):
+    # crc16 of bytes like data, two bytes per lookup
+    global __crc16_word_table
+    if __crc16_word_table is None:
+        __crc16_word_table = __generate_crc16_word_table()
+    table = __crc16_word_table
+    words = len(data) // 2
+    for word in struct.unpack_from('<%dH' % words, data):
+        crc = table[crc ^ word]
+    if len(data) & 1:
+        crc = (crc >> 8) ^ __crc16_table[(crc ^ bytearray(data[-1:])[0]) & 0xff]
+    return crc
 
 def computeCRC(data):
-    ''' Computes a crc16 on the passed in string. For modbus,
+    ''' Computes a crc16 on the passed in data. For modbus,
     this is only used on the binary serial protocols (in this
     case RTU).
 
     The difference between modbus's crc16 and a normal crc16
     is that modbus starts the crc value out at 0xffff.
 
-    :param data: The data to create a crc16 of
+    :param data: The bytes, bytearray, memoryview or string to create a crc16 of
     :returns: The calculated CRC
     '''
-    crc = 0xffff
-    if type(data) == bytes and sys.version_info > (3,):
-        temp = ""
-        for i in data:
-            temp += chr(i)
-        data = temp
-    for a in data:
-        idx = __crc16_table[(crc ^ ord(a)) & 0xff];
-        crc = ((crc >> 8) & 0xff) ^ idx
-    swapped = ((crc << 8) & 0xff00) | ((crc >> 8) & 0x00ff)
+    if sys.version_info > (3,) and isinstance(data, str):
+        data = data.encode('latin-1')
+    crc = __crc16(data)
+    swapped = ((crc << 8) & 0xff00) | (crc >> 8)
     return swapped
 
 def checkCRC(data, check):
@@ -1109,3 +1923,26 @@ def checkCRC(data, check):
     '''
     return computeCRC(data) == check
 
+def checkFrameCRC(frame):
+    ''' Checks the CRC of a complete RTU frame in place. The crc16 of
+    a frame including its trailing CRC is zero if the CRC matches.
+
+    :param frame: The bytes like frame, ending with its CRC
+    :returns: True if matched, False otherwise
+    '''
+    return len(frame) > 2 and __crc16(frame) == 0
+
+def checkFrameCRCs(frames):
+    ''' Checks the CRCs of a sequence of complete RTU frames, such as
+    frames captured from a bus for replay or analysis.
+
+    :param frames: The frames to check, each ending with its CRC
+    :returns: A list with True for each frame whose CRC matches
+    '''
+    crc16 = __crc16
+    result = []
+    for frame in frames:
+        if sys.version_info > (3,) and isinstance(frame, str):
+            frame = frame.encode('latin-1')
+        result.append(len(frame) > 2 and crc16(frame) == 0)
+    return result
@@ -0,0 +1,416 @@
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# asyncio Modbus TCP simulator serving the register images of modbus maps.
+# Requires Python 3.5 or later.
+#
+# Run with: python -m sunspec.core.modbus.simulator map.xml [options]
+
+import argparse
+import asyncio
+import bisect
+import random
+import struct
+import sys
+import time
+
+import sunspec.core.modbus.mbmap as mbmap
+from sunspec.core.modbus.client import REQ_COUNT_MAX, FUNC_READ_HOLDING, FUNC_READ_INPUT, FUNC_WRITE_MULTIPLE
+from sunspec.core.modbus.client import EXCEPT_ILLEGAL_FUNCTION, EXCEPT_ILLEGAL_ADDRESS, EXCEPT_ILLEGAL_VALUE
+from sunspec.core.modbus.client import TCP_HDR_LEN
+
+EXCEPT_DEVICE_FAILURE = 4
+EXCEPT_GATEWAY_NO_RESPONSE = 11
+
+class SimulatedDevice(object):
+    """The register image of a modbus map served by the simulator. Reads and
+    writes operate on a copy of the map contents, so several devices can be
+    created from the same map.
+
+    Parameters:
+
+        modbus_map :
+            :const:`sunspec.core.modbus.mbmap.ModbusMap` with the register
+            contents.
+
+        mutate :
+            List of register addresses that are changed by :meth:`mutate`.
+
+    Attributes:
+
+        func
+            Modbus read function of the map.
+
+        base_addr
+            Address of the first register of the image.
+
+        image
+            Bytearray with the contents of the registers.
+
+        ranges
+            List of (start, end) register offsets present in the map.
+
+        mutate_addrs
+            List of register addresses changed by :meth:`mutate`.
+    """
+
+    def __init__(self, modbus_map, mutate=None):
+        self.func = modbus_map.func
+        self.base_addr = int(modbus_map.base_addr)
+        self.ranges = []
+        size = 0
+        for regs in modbus_map.regs:
+            self.ranges.append((regs.offset, regs.offset + regs.count))
+            size = max(size, regs.offset + regs.count)
+        self.starts = [start for start, end in self.ranges]
+        self.image = bytearray(size * 2)
+        for regs in modbus_map.regs:
+            self.image[regs.offset * 2:(regs.offset + regs.count) * 2] = regs.data
+        self.mutate_addrs = list(mutate or [])
+
+    def _offset(self, addr, count):
+
+        # registers must be within a single range of the map
+        offset = addr - self.base_addr
+        index = bisect.bisect_right(self.starts, offset) - 1
+        if index < 0 or offset + count > self.ranges[index][1]:
+            return None
+        return offset
+
+    def read(self, addr, count):
+        """Read registers of the image.
+
+        Returns:
+
+            Byte string containing register contents or None if the registers
+            are not in the map.
+        """
+
+        offset = self._offset(addr, count)
+        if offset is None:
+            return None
+        return bytes(self.image[offset * 2:(offset + count) * 2])
+
+    def write(self, addr, data):
+        """Write registers of the image.
+
+        Returns:
+
+            True if the registers were written, False if they are not in the
+            map.
+        """
+
+        offset = self._offset(addr, len(data) // 2)
+        if offset is None:
+            return False
+        self.image[offset * 2:offset * 2 + len(data)] = data
+        return True
+
+    def mutate(self, rand=random, step=10):
+        """Change each register of *mutate_addrs* by a random amount of up to
+        *step* in either direction.
+        """
+
+        for addr in self.mutate_addrs:
+            offset = self._offset(addr, 1)
+            if offset is not None:
+                value = struct.unpack_from('>H', self.image, offset * 2)[0]
+                value = (value + rand.randint(-step, step)) & 0xffff
+                struct.pack_into('>H', self.image, offset * 2, value)
+
+class ModbusTCPSimulator(object):
+    """Serves simulated devices over Modbus TCP from an asyncio event loop.
+    Each server listens on its own port and serves one or more devices by
+    unit id. Requests on a connection are answered in order, like most
+    gateways do.
+
+    Parameters:
+
+        latency :
+            Delay in seconds before each response.
+
+        jitter :
+            Maximum random variation in seconds of the latency in either
+            direction.
+
+        error_rate :
+            Fraction of the requests answered with a server device failure
+            exception.
+
+        drop_rate :
+            Fraction of the requests for which the connection is closed
+            without a response.
+
+        mutate_interval :
+            Interval in seconds at which the mutated registers of all devices
+            are changed. No mutation if None.
+
+        max_count :
+            Largest register count accepted in a read request. Larger reads
+            are answered with an illegal data value exception.
+
+        seed :
+            Seed of the random numbers used for the jitter, the errors and
+            the mutations.
+
+    Attributes:
+
+        servers
+            Dictionary by port of the dictionary by unit id of the devices
+            served on the port.
+
+        requests
+            Number of requests received.
+
+        errors
+            Number of requests answered with an injected error or dropped.
+    """
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, drop_rate=0, mutate_interval=None, max_count=REQ_COUNT_MAX,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.mutate_interval = mutate_interval
+        self.max_count = max_count
+        self.random = random.Random(seed)
+        self.servers = {}
+        self.listeners = []
+        # connection handler tasks, cancelled on close
+        self.handlers = set()
+        self.mutate_task = None
+        self.requests = 0
+        self.errors = 0
+
+    async def add_server(self, devices, host='127.0.0.1', port=0):
+        """Start serving devices on a port.
+
+        Parameters:
+
+            devices :
+                Dictionary by unit id of :const:`SimulatedDevice` objects.
+
+            host :
+                Address to listen on.
+
+            port :
+                Port to listen on, a free port is chosen if 0.
+
+        Returns:
+
+            Port the devices are served on.
+        """
+
+        def connected(reader, writer):
+            handler = asyncio.ensure_future(self._handle(devices, reader, writer))
+            self.handlers.add(handler)
+            handler.add_done_callback(self.handlers.discard)
+
+        server = await asyncio.start_server(connected, host, port)
+        port = server.sockets[0].getsockname()[1]
+        self.listeners.append(server)
+        self.servers[port] = devices
+
+        if self.mutate_interval and self.mutate_task is None:
+            self.mutate_task = asyncio.ensure_future(self._mutate())
+
+        return port
+
+    async def close(self):
+        """Stop all servers and close their connections.
+        """
+
+        if self.mutate_task is not None:
+            self.mutate_task.cancel()
+            self.mutate_task = None
+        for server in self.listeners:
+            server.close()
+            await server.wait_closed()
+        self.listeners = []
+        self.servers = {}
+
+        # the connections are closed by their handlers
+        handlers = list(self.handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def _mutate(self):
+
+        while True:
+            await asyncio.sleep(self.mutate_interval)
+            for devices in self.servers.values():
+                for device in devices.values():
+                    device.mutate(self.random)
+
+    def response(self, devices, unit_id, pdu):
+        """Process a request PDU.
+
+        Returns:
+
+            Response PDU.
+        """
+
+        func = pdu[0]
+        device = devices.get(unit_id)
+        if device is None:
+            return struct.pack('>BB', func | 0x80, EXCEPT_GATEWAY_NO_RESPONSE)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return struct.pack('>BB', func | 0x80, EXCEPT_DEVICE_FAILURE)
+
+        if func in (FUNC_READ_HOLDING, FUNC_READ_INPUT) and len(pdu) >= 5:
+            addr, count = struct.unpack_from('>HH', pdu, 1)
+            if func != device.func:
+                return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_FUNCTION)
+            if count < 1 or count > self.max_count:
+                return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_VALUE)
+            data = device.read(addr, count)
+            if data is None:
+                return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_ADDRESS)
+            return struct.pack('>BB', func, len(data)) + data
+
+        if func == FUNC_WRITE_MULTIPLE and len(pdu) >= 6:
+            addr, count, byte_count = struct.unpack_from('>HHB', pdu, 1)
+            data = pdu[6:6 + byte_count]
+            if count < 1 or byte_count != count * 2 or len(data) != byte_count:
+                return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_VALUE)
+            if not device.write(addr, data):
+                return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_ADDRESS)
+            return struct.pack('>BHH', func, addr, count)
+
+        return struct.pack('>BB', func | 0x80, EXCEPT_ILLEGAL_FUNCTION)
+
+    async def _handle(self, devices, reader, writer):
+
+        try:
+            while True:
+                hdr = await reader.readexactly(TCP_HDR_LEN + 1)
+                tid, pid, length, unit_id = struct.unpack('>HHHB', hdr)
+                if length < 2:
+                    break
+                pdu = await reader.readexactly(length - 1)
+                self.requests += 1
+
+                if self.drop_rate and self.random.random() < self.drop_rate:
+                    self.errors += 1
+                    break
+
+                delay = self.latency
+                if self.jitter:
+                    delay += self.random.uniform(-self.jitter, self.jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                resp = self.response(devices, unit_id, pdu)
+                writer.write(struct.pack('>HHHB', tid, pid, len(resp) + 1, unit_id) + resp)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def load_map(filename, pathlist=None):
+    """Load a modbus map file.
+
+    Returns:
+
+        :const:`sunspec.core.modbus.mbmap.ModbusMap` object.
+    """
+
+    modbus_map = mbmap.ModbusMap()
+    modbus_map.from_xml(filename, pathlist)
+    return modbus_map
+
+async def run(args):
+
+    modbus_map = load_map(args.map)
+    mutate = [int(addr) for addr in args.mutate.split(',') if addr] if args.mutate else []
+
+    simulator = ModbusTCPSimulator(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                   drop_rate=args.drop_rate, mutate_interval=args.mutate_interval if mutate else None,
+                                   max_count=args.max_count, seed=args.seed)
+
+    targets = []
+    for index in range(0, args.count, args.units):
+        devices = {}
+        for unit_id in range(1, min(args.units, args.count - index) + 1):
+            devices[unit_id] = SimulatedDevice(modbus_map, mutate)
+        port = args.port + len(simulator.servers) if args.port else 0
+        port = await simulator.add_server(devices, args.host, port)
+        targets.extend(['%s:%d:%d' % (args.host, port, unit_id) for unit_id in devices])
+
+    print('TARGETS=%s' % (','.join(targets)))
+    sys.stdout.flush()
+
+    start = time.time()
+    try:
+        while True:
+            await asyncio.sleep(args.report or 3600)
+            if args.report:
+                elapsed = time.time() - start
+                print('%d requests %.1f/s %d errors' % (simulator.requests, simulator.requests / elapsed,
+                                                        simulator.errors))
+                sys.stdout.flush()
+    finally:
+        await simulator.close()
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Modbus TCP simulator serving modbus map register images.')
+    parser.add_argument('map', help='modbus map file')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=0, help='first port, consecutive ports are used (default: any)')
+    parser.add_argument('--count', type=int, default=1, help='number of simulated devices')
+    parser.add_argument('--units', type=int, default=1, help='devices served on each port by unit id')
+    parser.add_argument('--latency', type=float, default=0, help='response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0, help='random variation of the response delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of requests answered with an exception')
+    parser.add_argument('--drop-rate', type=float, default=0, help='fraction of requests dropping the connection')
+    parser.add_argument('--mutate', help='comma separated register addresses changed over time')
+    parser.add_argument('--mutate-interval', type=float, default=1, help='register mutation interval in seconds')
+    parser.add_argument('--max-count', type=int, default=REQ_COUNT_MAX, help='largest register count of a read')
+    parser.add_argument('--seed', type=int, help='random seed')
+    parser.add_argument('--report', type=float, default=0, help='request rate report interval in seconds')
+    args = parser.parse_args(argv)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = asyncio.ensure_future(run(args))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        # stop the servers before the loop is closed
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,199 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# asyncio client tests, run through test_aioclient on Python 3.5 and later
+
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import sunspec.core.aioclient as aioclient
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.util as util
+import sunspec.core.modbus.mbmap as mbmap
+
+
+class TestAsyncClientDevice(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+        self.modbus_map = mbmap.ModbusMap(1)
+        self.modbus_map.from_xml('mbmap_test_device_1.xml', self.pathlist)
+        self.requests = []
+        self.handlers = []
+        # registers returned per read response, None for all requested registers
+        self.short = None
+
+    def connected(self, reader, writer):
+        self.handlers.append(asyncio.ensure_future(self.handle(reader, writer)))
+
+    async def handle(self, reader, writer):
+        # minimal Modbus TCP server on top of the modbus map
+        try:
+            while True:
+                hdr = await reader.readexactly(7)
+                tid, pid, length, unit_id = struct.unpack('>HHHB', hdr)
+                pdu = await reader.readexactly(length - 1)
+                func, addr, count = struct.unpack('>BHH', pdu[:5])
+                self.requests.append((func, addr, count))
+                try:
+                    if func == 3:
+                        data = self.modbus_map.read(addr, count)
+                        if self.short is not None:
+                            data = data[:self.short * 2]
+                        pdu = struct.pack('>BB', func, len(data)) + data
+                    else:
+                        self.modbus_map.write(addr, pdu[6:])
+                        pdu = struct.pack('>BHH', func, addr, count)
+                except mbmap.ModbusMapError:
+                    pdu = struct.pack('>BB', func | 0x80, 2)
+                writer.write(struct.pack('>HHHB', tid, 0, len(pdu) + 1, unit_id) + pdu)
+        except (asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def run_client(self, func):
+        async def run():
+            server = await asyncio.start_server(self.connected, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                await func(port)
+            finally:
+                server.close()
+                await server.wait_closed()
+                for handler in self.handlers:
+                    handler.cancel()
+                await asyncio.gather(*self.handlers, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_async_client_device(self):
+        async def run(port):
+            d = aioclient.AsyncClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist, pipeline=2)
+            await d.scan()
+            snapshot = await d.read_points()
+
+            # same point values as the blocking client reading the same map
+            m = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            m.scan()
+            expected = m.read_points()
+            if [p[:6] for p in snapshot.points] != [p[:6] for p in expected.points]:
+                raise Exception('Snapshot mismatch: %s %s' % (snapshot.points, expected.points))
+
+            # write and read back
+            point = d.models[63001][0].points['int16_4']
+            point.value = 330
+            await d.write_points()
+            if ('int16_4' not in [p.point_type.id for p in d.models[63001][0].points_list] or
+                    not [r for r in self.requests if r[0] == 16]):
+                raise Exception('Write request not sent')
+            point.value = 0
+            await d.read_points()
+            if point.value != 330:
+                raise Exception("'model_63001.int16_4' write failure: {}".format(point.value))
+
+            d.close()
+
+        self.run_client(run)
+
+    def test_async_sunspec_client_device(self):
+        async def run(port):
+            d = aioclient.AsyncSunSpecClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist)
+            await d.scan()
+            await d.read()
+            if d.common.SN != 'sn-123456789':
+                raise Exception("'common.SN' point mismatch: {}".format(d.common.SN))
+            d.close()
+
+        self.run_client(run)
+
+    def test_async_short_response(self):
+        async def run(port):
+            d = aioclient.AsyncClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist)
+            self.short = 50
+            await d.scan()
+            if d.modbus_device.max_count != 50:
+                raise Exception('Max count not lowered: %s' % (d.modbus_device.max_count))
+            del self.requests[:]
+            snapshot = await d.read_points()
+
+            m = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            m.scan()
+            expected = m.read_points()
+            if [p[:6] for p in snapshot.points] != [p[:6] for p in expected.points]:
+                raise Exception('Snapshot mismatch: %s %s' % (snapshot.points, expected.points))
+            if [r for r in self.requests if r[2] > 50]:
+                raise Exception('Requests not limited to the lowered max count: %s' % (self.requests))
+            d.close()
+
+        self.run_client(run)
+
+    def test_async_scan_cache(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmp, 'scan.json')
+
+            async def run(port):
+                d = aioclient.AsyncClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist)
+                await d.scan(cache=filename)
+                expected = [(m.id, m.addr, m.len) for m in d.models_list]
+                d.close()
+                if not os.path.exists(filename):
+                    raise Exception('Scan cache not written')
+
+                del self.requests[:]
+                d = aioclient.AsyncClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist)
+                await d.scan(cache=filename)
+                if [(m.id, m.addr, m.len) for m in d.models_list] != expected:
+                    raise Exception('Cached models mismatch: %s %s' %
+                                    ([(m.id, m.addr, m.len) for m in d.models_list], expected))
+                if len(self.requests) != 1:
+                    raise Exception('Scan not loaded from the cache: %s' % (self.requests))
+                if not isinstance(d.models_list[0], aioclient.AsyncClientModel):
+                    raise Exception('Cached model class mismatch: %s' % (type(d.models_list[0])))
+                await d.read_points()
+                if d.models[1][0].points['SN'].value != 'sn-123456789':
+                    raise Exception("'common.SN' point mismatch")
+                d.close()
+
+            self.run_client(run)
+        finally:
+            shutil.rmtree(tmp)
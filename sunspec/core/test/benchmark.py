@@ -0,0 +1,244 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# Micro benchmarks for the client decode and transport paths.
+#
+# Run with: python -m sunspec.core.test.benchmark [name ...]
+
+import random
+import struct
+import sys
+import timeit
+import tracemalloc
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.modbus.client as modbus
+
+# model ids and repeating block counts used for the decode benchmark
+DECODE_MODELS = [(1, 0), (103, 0), (120, 0), (160, 4), (403, 24), (63001, 0)]
+
+def _model(model_id, repeat_count, dev=None):
+    model_type = device.model_type_get(model_id)
+    mlen = int(model_type.fixed_block.len)
+    if model_type.repeating_block is not None:
+        mlen += repeat_count * int(model_type.repeating_block.len)
+    model = client.ClientModel(dev, model_id, 40000, mlen)
+    model.load()
+    return model
+
+def _random_data(count, seed=1):
+    r = random.Random(seed)
+    if sys.version_info > (3,):
+        return bytes(bytearray([r.randrange(256) for i in range(count)]))
+    return ''.join([chr(r.randrange(256)) for i in range(count)])
+
+def _time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+def bench_decode(number=2000):
+    """Decode time per model for the point by point decoder and the
+    precompiled decode plan."""
+
+    print('%-8s %6s %12s %12s %8s' % ('model', 'regs', 'generic us', 'plan us', 'speedup'))
+    for model_id, repeat_count in DECODE_MODELS:
+        model = _model(model_id, repeat_count)
+        data = _random_data(model.len * 2)
+        generic = _time(lambda: model._decode_points_generic(data), number)
+        plan = _time(lambda: model.decode_points(data), number)
+        print('%-8s %6d %12.1f %12.1f %7.1fx' % (model_id, model.len, generic * 1e6, plan * 1e6, generic / plan))
+
+def bench_vectorize(number=500):
+    """Decode time per model for the precompiled decode plan and the numpy
+    vectorized decode of the repeating blocks."""
+
+    if client.numpy is None:
+        print('numpy not installed')
+        return
+
+    print('%-8s %6s %6s %12s %12s %12s' % ('model', 'blocks', 'regs', 'plan us', 'numpy us', 'columns us'))
+    for model_id, repeat_count in [(160, 4), (160, 40), (403, 24), (403, 200)]:
+        model = _model(model_id, repeat_count)
+        data = _random_data(model.len * 2)
+        plan = _time(lambda: model.decode_points(data), number)
+        model.vectorize()
+        vector = _time(lambda: model.decode_points(data), number)
+        model.vectorize(points=False)
+        columns = _time(lambda: model.decode_points(data), number)
+        print('%-8s %6d %6d %12.1f %12.1f %12.1f' % (model_id, repeat_count, model.len, plan * 1e6, vector * 1e6,
+                                                     columns * 1e6))
+
+def bench_memory(number=200):
+    """Memory per loaded device of the decode benchmark models, with the
+    points decoded, with the values kept in the points and in a point store."""
+
+    for model_id, repeat_count in DECODE_MODELS:
+        device.model_type_get(model_id)
+
+    def load(store):
+        dev = client.ClientDevice(None, store=store) if store else None
+        models = [_model(model_id, repeat_count, dev) for model_id, repeat_count in DECODE_MODELS]
+        for model in models:
+            model.decode_points(_random_data(model.len * 2))
+        return models
+
+    points = sum(len(block.points_list) + len(block.points_sf) for model in load(False) for block in model.blocks)
+    print('%8s %12s %12s %12s' % ('store', 'points', 'device bytes', 'point bytes'))
+    for store in [False, True]:
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        devices = [load(store) for i in range(number)]
+        size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        print('%8s %12d %12d %12.1f' % (store, points, size / len(devices), size / len(devices) / points))
+
+def bench_store(number=2000):
+    """Decode time per device of the decode benchmark models with the values
+    kept in the points and in a point store, and the time to snapshot the
+    device."""
+
+    print('%8s %12s %12s' % ('store', 'decode us', 'snapshot us'))
+    for store in [False, True]:
+        dev = client.ClientDevice(None, store=True) if store else None
+        models = [_model(model_id, repeat_count, dev) for model_id, repeat_count in DECODE_MODELS]
+        data = [_random_data(model.len * 2, seed) for seed, model in enumerate(models)]
+        def decode():
+            for model, model_data in zip(models, data):
+                model.raw = None
+                model.decode_points(model_data)
+        elapsed = _time(decode, number // 10)
+        if store:
+            snapshot = _time(dev.store.snapshot, number)
+        else:
+            snapshot = _time(lambda: [(point.value_base, point.value_sf) for model in models
+                                      for block in model.blocks for point in block.points_list], number)
+        print('%8s %12.1f %12.1f' % (store, elapsed * 1e6, snapshot * 1e6))
+
+def _tcp_device(count):
+    # TCP device on the fake socket with the responses for a read of count registers queued
+    d = modbus.ModbusClientDeviceTCP(1, ipaddr='127.0.0.1', test=True)
+    resp = b''
+    while count > 0:
+        read_count = min(count, d.max_count)
+        data = _random_data(read_count * 2)
+        resp += struct.pack('>HHHBBB', 0, 0, len(data) + 3, 1, 3, len(data)) + data
+        count -= read_count
+    return d, resp
+
+def bench_tcp_read(number=2000):
+    """Time and allocations per Modbus TCP read on the fake socket."""
+
+    print('%6s %12s %12s' % ('regs', 'read us', 'peak bytes'))
+    for count in [2, 125, 500, 2000]:
+        d, resp = _tcp_device(count)
+        def read():
+            d.socket.in_buf = resp
+            d.socket.out_buf = b''
+            d.read(40000, count)
+        elapsed = _time(read, max(number // (count // 125 + 1), 10))
+
+        # peak memory allocated by a single read, the fake socket keeps its input buffer
+        read()
+        d.socket.in_buf = resp
+        d.socket.out_buf = b''
+        tracemalloc.start()
+        d.read(40000, count)
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('%6d %12.1f %12d' % (count, elapsed * 1e6, peak))
+
+def _rtu_device(count):
+    d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, trace_func=None)
+    resp = b''
+    while count > 0:
+        read_count = min(count, d.max_count)
+        frame = struct.pack('>BBB', 1, 3, read_count * 2) + _random_data(read_count * 2)
+        resp += frame + struct.pack('>H', modbus.computeCRC(frame))
+        count -= read_count
+    return d, resp
+
+def bench_rtu_read(number=2000):
+    """Time per Modbus RTU read on the fake serial port, without the
+    inter-frame gap."""
+
+    print('%6s %12s' % ('regs', 'read us'))
+    for count in [2, 125, 500]:
+        d, resp = _rtu_device(count)
+        d.client.frame_gap = 0
+        def read():
+            d.client.serial.in_buf = resp
+            d.client.serial.out_buf = b''
+            d.read(40000, count)
+        elapsed = _time(read, max(number // (count // 125 + 1), 10))
+        print('%6d %12.1f' % (count, elapsed * 1e6))
+    modbus.modbus_rtu_client_remove(modbus.TEST_NAME)
+
+_crc16_table = getattr(modbus, '__crc16_table')
+
+def _legacy_crc(data):
+    # str based implementation replaced by the bytes native computeCRC
+    table = _crc16_table
+    crc = 0xffff
+    if type(data) == bytes and sys.version_info > (3,):
+        temp = ""
+        for i in data:
+            temp += chr(i)
+        data = temp
+    for a in data:
+        idx = table[(crc ^ ord(a)) & 0xff];
+        crc = ((crc >> 8) & 0xff) ^ idx
+    swapped = ((crc << 8) & 0xff00) | ((crc >> 8) & 0x00ff)
+    return swapped
+
+def bench_crc(number=200):
+    """CRC throughput in MB/s of the previous str based implementation, the
+    bytes native computeCRC and the batch frame check."""
+
+    print('%6s %12s %12s %12s' % ('bytes', 'legacy MB/s', 'crc MB/s', 'batch MB/s'))
+    for size in [8, 64, 256]:
+        frames = []
+        for seed in range(100):
+            data = _random_data(size - 2, seed)
+            frames.append(data + struct.pack('>H', modbus.computeCRC(data)))
+        total = size * len(frames)
+        legacy = _time(lambda: [_legacy_crc(frame[:-2]) for frame in frames], number)
+        crc = _time(lambda: [modbus.computeCRC(frame[:-2]) for frame in frames], number)
+        batch = _time(lambda: modbus.checkFrameCRCs(frames), number)
+        print('%6d %12.1f %12.1f %12.1f' % (size, total / legacy / 1e6, total / crc / 1e6, total / batch / 1e6))
+
+benchmarks = {
+    'crc': bench_crc,
+    'decode': bench_decode,
+    'memory': bench_memory,
+    'rtu_read': bench_rtu_read,
+    'store': bench_store,
+    'tcp_read': bench_tcp_read,
+    'vectorize': bench_vectorize
+}
+
+if __name__ == "__main__":
+
+    names = sys.argv[1:] or sorted(benchmarks)
+    for name in names:
+        print('\n%s:' % name)
+        benchmarks[name]()
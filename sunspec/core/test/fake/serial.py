@@ -68,6 +68,12 @@ class Serial(object):
                 self.in_buf = self.in_buf[read_len:]
         return data
 
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        if data:
+            buffer[:len(data)] = data
+        return len(data)
+
     def write(self, data):
         self.out_buf += data
 
@@ -33,6 +33,7 @@ class socket(object):
         self.timeout = 0
         self.in_buf = b''
         self.out_buf = b''
+        self.options = {}
 
     def connect(self, addr_port):
     	self.connected = True
@@ -40,6 +41,9 @@ class socket(object):
     def settimeout(self, timeout):
     	self.timeout = timeout
 
+    def setsockopt(self, level, option, value):
+        self.options[(level, option)] = value
+
     def close(self):
     	self.connected = False
 
@@ -56,6 +60,14 @@ class socket(object):
                 self.in_buf = self.in_buf[read_len:]
         return data
 
+    def recv_into(self, buffer, nbytes=0):
+        if not nbytes:
+            nbytes = len(buffer)
+        data = self.recv(nbytes)
+        if data:
+            buffer[:len(data)] = data
+        return len(data)
+
     def send(self, data):
         self.out_buf += data
 
@@ -0,0 +1,168 @@
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+# Modbus TCP simulator tests, run through test_simulator on Python 3.5 and later
+
+import asyncio
+import os
+import random
+import unittest
+
+import sunspec.core.aioclient as aioclient
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.util as util
+import sunspec.core.modbus.aioclient as aiomodbus
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.simulator as simulator
+
+
+class TestModbusTCPSimulator(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+        self.modbus_map = simulator.load_map('mbmap_test_inverter_1.xml', self.pathlist)
+
+    def run_simulator(self, func, units=1, **kwargs):
+        async def run():
+            sim = simulator.ModbusTCPSimulator(seed=1, **kwargs)
+            devices = {}
+            for unit_id in range(1, units + 1):
+                devices[unit_id] = simulator.SimulatedDevice(self.modbus_map)
+            port = await sim.add_server(devices)
+            try:
+                await func(sim, port)
+            finally:
+                await sim.close()
+            if sim.handlers:
+                raise Exception('Connection handlers left running: {}'.format(len(sim.handlers)))
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_simulator_devices(self):
+        async def run(sim, port):
+            # several devices by unit id on the same port, read by the blocking and the asyncio clients
+            d = aioclient.AsyncSunSpecClientDevice(2, '127.0.0.1', port, pathlist=self.pathlist, pipeline=4)
+            await d.scan()
+            snapshot = await d.read()
+
+            def read_blocking():
+                c = client.ClientDevice(client.TCP, 1, ipaddr='127.0.0.1', ipport=port, pathlist=self.pathlist,
+                                        persistent=True)
+                c.scan()
+                points = c.read_points().points
+                c.close()
+                return points
+
+            points = await asyncio.get_event_loop().run_in_executor(None, read_blocking)
+
+            m = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_1.xml',
+                                    pathlist=self.pathlist)
+            m.scan()
+            expected = [p[:6] for p in m.read_points().points]
+            if [p[:6] for p in snapshot.points] != expected or [p[:6] for p in points] != expected:
+                raise Exception('Simulated device points mismatch')
+            if d.common.SN != 'sn-123456789':
+                raise Exception("'common.SN' point mismatch: {}".format(d.common.SN))
+            d.close()
+
+            # unknown unit id
+            d = aiomodbus.AsyncModbusClientDeviceTCP(5, '127.0.0.1', port)
+            try:
+                await d.read(40000, 2)
+                raise Exception('Unknown unit id not rejected')
+            except modbus.ModbusClientException as e:
+                if e.except_code != simulator.EXCEPT_GATEWAY_NO_RESPONSE:
+                    raise Exception('Exception code mismatch: {}'.format(e.except_code))
+            d.close()
+
+        self.run_simulator(run, units=2)
+
+    def test_simulator_model_read_write(self):
+        async def run(sim, port):
+            # model and point device access of the asyncio client are coroutines
+            d = aioclient.AsyncSunSpecClientDevice(1, '127.0.0.1', port, pathlist=self.pathlist)
+            await d.scan()
+            await d.common.read()
+            if d.common.SN != 'sn-123456789':
+                raise Exception("'common.SN' point mismatch: {}".format(d.common.SN))
+
+            d.common.DA = 7
+            await d.common.write()
+            point = d.device.models_list[0].points['DA']
+            point.value = 9
+            await point.write()
+            await d.device.models_list[0].read_points()
+            if d.common.DA != 9 or sim.servers[port][1].read(int(point.addr), 1) != b'\x00\x09':
+                raise Exception("'common.DA' point write mismatch: {}".format(d.common.DA))
+            d.close()
+
+        self.run_simulator(run)
+
+    def test_simulator_errors(self):
+        async def run(sim, port):
+            d = aiomodbus.AsyncModbusClientDeviceTCP(1, '127.0.0.1', port)
+            try:
+                await d.read(40000, 2)
+                raise Exception('Injected error not returned')
+            except modbus.ModbusClientException as e:
+                if e.except_code != simulator.EXCEPT_DEVICE_FAILURE:
+                    raise Exception('Exception code mismatch: {}'.format(e.except_code))
+            if sim.requests != 1 or sim.errors != 1:
+                raise Exception('Request counters mismatch: {} {}'.format(sim.requests, sim.errors))
+            d.close()
+
+        self.run_simulator(run, error_rate=1)
+
+    def test_simulator_max_count(self):
+        async def run(sim, port):
+            # reads above the simulated limit are rejected and the client lowers its maximum count
+            d = aiomodbus.AsyncModbusClientDeviceTCP(1, '127.0.0.1', port, max_count=120)
+            data = await d.read(40000, 120)
+            if data != bytes(sim.servers[port][1].image[:240]):
+                raise Exception('Read data mismatch')
+            if d.max_count != 50:
+                raise Exception('Max count mismatch: {}'.format(d.max_count))
+            d.close()
+
+        self.run_simulator(run, max_count=50)
+
+    def test_simulated_device_mutate(self):
+        d = simulator.SimulatedDevice(self.modbus_map, mutate=[40072])
+        before = d.read(40072, 1)
+        for i in range(5):
+            d.mutate(random.Random(i))
+        if d.read(40072, 1) == before or d.read(40073, 1) != b'\x00\x29':
+            raise Exception('Register mutation mismatch')
+        if d.read(39999, 1) is not None or d.write(40000, b'\x00\x00' * 1000):
+            raise Exception('Registers outside of the map accepted')
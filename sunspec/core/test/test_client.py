@@ -23,11 +23,16 @@
 
 import sys
 import os
+import json
+import shutil
+import struct
+import tempfile
 import unittest
 
 import sunspec.core.client as client
 import sunspec.core.device as device
 import sunspec.core.util as util
+import sunspec.core.modbus.client as modbus
 
 
 class TestClientDevice(unittest.TestCase):
@@ -53,6 +58,451 @@ class TestClientDevice(unittest.TestCase):
         if not_equal:
             raise Exception(not_equal)
 
+    def test_client_device_snapshot(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                name='mbmap_test_inverter_1.xml',
+                                pathlist=self.pathlist)
+        d.scan()
+        snapshot = d.read_points()
+
+        if snapshot is not d.snapshot:
+            raise Exception('Device snapshot not kept on device')
+        points = dict(((p.model_id, p.point_id), p) for p in snapshot.points)
+        if points[(1, 'SN')].value != 'sn-123456789':
+            raise Exception("'common.SN' snapshot mismatch: {}".format(points[(1, 'SN')].value))
+        if points[(103, 'A')].value != d.models[103][0].points['A'].value:
+            raise Exception("'inverter.A' snapshot mismatch: {}".format(points[(103, 'A')].value))
+        if points[(103, 'A')].units != 'A' or points[(103, 'A')].model_name != 'inverter':
+            raise Exception("'inverter.A' snapshot metadata mismatch: {}".format(points[(103, 'A')]))
+
+        # later reads must not change an existing snapshot
+        d.models[103][0].points['A'].value_base = 0
+        if points[(103, 'A')].value == d.models[103][0].points['A'].value:
+            raise Exception('Snapshot changed by device update')
+
+        d.close()
+
+    def test_client_model_changed_points(self):
+        # model 160 with 2 repeating blocks, DCA in the repeating blocks is scaled by DCA_SF in the fixed block
+        mlen = 8 + 2 * 20
+        model = client.ClientModel(None, 160, 40000, mlen)
+        model.load()
+        data = bytearray(b'\x00\x01' * mlen)
+
+        model.decode_points(data)
+        if len(model.changed_points) != len(model.points_list) + 2 * len(model.blocks[1].points_list):
+            raise Exception('First decode did not change all points: %s' % model.changed_points)
+
+        model.decode_points(data)
+        if model.changed_points:
+            raise Exception('Unchanged registers changed points: %s' % model.changed_points)
+
+        # DCV of the second repeating block
+        offset = (int(model.blocks[2].points['DCV'].addr) - 40000) * 2
+        data[offset:offset + 2] = b'\x00\x05'
+        model.decode_points(data)
+        if model.changed_points != [model.blocks[2].points['DCV']]:
+            raise Exception('Changed points mismatch: %s' % model.changed_points)
+        if model.blocks[2].points['DCV'].value_base != 5:
+            raise Exception('Changed point not decoded: %s' % model.blocks[2].points['DCV'].value_base)
+
+        # DCA_SF changes the value of DCA in all repeating blocks
+        data[0:2] = b'\xff\xfe'
+        model.decode_points(data)
+        expected = [model.blocks[1].points['DCA'], model.blocks[2].points['DCA']]
+        if model.changed_points != expected:
+            raise Exception('Scale factor changed points mismatch: %s' % model.changed_points)
+
+        values = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+        model._decode_points_generic(bytes(data))
+        expected = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+        if values != expected:
+            raise Exception('Changed point decode mismatch: %s %s' % (values, expected))
+
+    def test_client_device_snapshot_changed(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                name='mbmap_test_inverter_1.xml',
+                                pathlist=self.pathlist)
+        d.scan()
+        snapshot = d.read_points()
+        if snapshot.changed != snapshot.points:
+            raise Exception('First snapshot does not list all points as changed')
+
+        # nothing changed, the points of the previous snapshot are reused
+        next_snapshot = d.read_points()
+        if next_snapshot.points is not snapshot.points or next_snapshot.changed or d.changed_points:
+            raise Exception('Unchanged read created new snapshot points')
+
+        # a point set locally is restored by the next read
+        d.models[103][0].points['A'].value = 1
+        next_snapshot = d.read_points()
+        points = dict(((p.model_id, p.point_id), p) for p in next_snapshot.points)
+        if points[(103, 'A')].value != d.models[103][0].points['A'].value or \
+                d.models[103][0].points['A'].value != [p.value for p in snapshot.points if p.point_id == 'A'][0]:
+            raise Exception("'inverter.A' not restored: {}".format(points[(103, 'A')].value))
+
+        d.close()
+
+    def test_client_device_scheduled_read(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                name='mbmap_test_inverter_1.xml',
+                                pathlist=self.pathlist)
+        d.scan()
+
+        requests = []
+        read = d.modbus_device.read
+        def record_read(addr, count, **kwargs):
+            requests.append((addr, count))
+            return read(addr, count, **kwargs)
+        d.modbus_device.read = record_read
+
+        # first scheduled read reads all models
+        d.read_points(scheduled=True)
+        common = d.models[1][0]
+        inverter = d.models[103][0]
+        if not [r for r in requests if r[0] <= common.addr < r[0] + r[1]]:
+            raise Exception('Common model not read on first scheduled read: %s' % requests)
+
+        # common model is not due yet, inverter model is read on every scheduled read
+        del requests[:]
+        if d.models_due() != [inverter]:
+            raise Exception('Models due mismatch: %s' % d.models_due())
+        d.read_points(scheduled=True)
+        if [r for r in requests if r[0] <= common.addr < r[0] + r[1]]:
+            raise Exception('Common model read before due: %s' % requests)
+        if not [r for r in requests if r[0] <= inverter.addr < r[0] + r[1]]:
+            raise Exception('Inverter model not read: %s' % requests)
+        points = dict(((p.model_id, p.point_id), p) for p in d.snapshot.points)
+        if points[(1, 'SN')].value != 'sn-123456789':
+            raise Exception("'common.SN' snapshot mismatch: {}".format(points[(1, 'SN')].value))
+
+        # no model due
+        common.next_poll = 0
+        d.poll_intervals[103] = 3600
+        d.read_points(scheduled=True)
+        if d.models_due():
+            raise Exception('Models due after read: %s' % d.models_due())
+
+        # unscheduled reads read all models
+        del requests[:]
+        d.read_points()
+        if not [r for r in requests if r[0] <= common.addr < r[0] + r[1]]:
+            raise Exception('Common model not read on unscheduled read: %s' % requests)
+
+        d.close()
+
+    def test_client_device_scan_fast(self):
+        def scan(fast, reject=None):
+            d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                    name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            requests = []
+            read = d.modbus_device.read
+            def record_read(addr, count, **kwargs):
+                requests.append((addr, count))
+                if reject is not None and reject(addr, count):
+                    raise modbus.ModbusClientException('Illegal data address')
+                return read(addr, count, **kwargs)
+            d.modbus_device.read = record_read
+            d.scan(fast=fast)
+            return [(m.id, m.addr, m.len) for m in d.models_list], requests
+
+        models, requests = scan(False)
+        fast_models, fast_requests = scan(True)
+        if fast_models != models:
+            raise Exception('Fast scan models mismatch: %s %s' % (fast_models, models))
+        if len(fast_requests) >= len(requests):
+            raise Exception('Fast scan request count: %s %s' % (len(fast_requests), len(requests)))
+
+        # device rejecting large reads falls back to reading one register at a time
+        fast_models, fast_requests = scan(True, lambda addr, count: count > 3)
+        if fast_models != models:
+            raise Exception('Fast scan fallback models mismatch: %s %s' % (fast_models, models))
+
+    def test_client_device_scan_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cache = os.path.join(tmpdir, 'scan.json')
+
+            # full scan writes the cache
+            d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                    name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            d.scan(cache=cache)
+            models = [(m.id, m.addr, m.len) for m in d.models_list]
+            if not os.path.exists(cache):
+                raise Exception('Scan cache not written')
+
+            # cached scan uses a single fingerprint read
+            d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                    name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            requests = []
+            read = d.modbus_device.read
+            def record_read(addr, count, **kwargs):
+                requests.append((addr, count))
+                return read(addr, count, **kwargs)
+            d.modbus_device.read = record_read
+            d.scan(cache=cache)
+            if len(requests) != 1:
+                raise Exception('Cached scan read count mismatch: %s' % requests)
+            if [(m.id, m.addr, m.len) for m in d.models_list] != models:
+                raise Exception('Cached scan models mismatch: %s %s' % (d.models_list, models))
+            d.read_points()
+
+            dp = device.Device()
+            dp.from_pics(filename='pics_test_device_1.xml', pathlist=self.pathlist)
+            not_equal = dp.not_equal(d)
+            if not_equal:
+                raise Exception(not_equal)
+
+            # fingerprint mismatch falls back to a full scan
+            with open(cache) as f:
+                data = json.load(f)
+            data['fingerprint'] = '0'
+            data['models'] = []
+            data['max_count'] = 8
+            with open(cache, 'w') as f:
+                json.dump(data, f)
+            d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                    name='mbmap_test_device_1.xml',
+                                    pathlist=self.pathlist)
+            d.modbus_device.max_count = 125
+            d.scan(cache=cache)
+            if [(m.id, m.addr, m.len) for m in d.models_list] != models:
+                raise Exception('Rescan models mismatch: %s %s' % (d.models_list, models))
+            if d.modbus_device.max_count != 125:
+                raise Exception('Max count of a mismatched cache applied: %s' % d.modbus_device.max_count)
+            with open(cache) as f:
+                if json.load(f)['fingerprint'] == '0':
+                    raise Exception('Scan cache not updated after rescan')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_client_device_read_plan(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1,
+                                name='mbmap_test_device_1.xml',
+                                pathlist=self.pathlist)
+        d.scan()
+
+        requests = []
+        read = d.modbus_device.read
+        def counting_read(addr, count, op=None):
+            requests.append((addr, count))
+            return read(addr, count, op)
+        d.modbus_device.read = counting_read
+
+        # common (66) and 63001 (188) models need three 125 register requests
+        d.read_points()
+        expected = [(40004, 124), (40128, 124), (40252, 7)]
+        if requests != expected:
+            raise Exception('Read plan mismatch: {} {}'.format(requests, expected))
+
+        dp = device.Device()
+        dp.from_pics(filename='pics_test_device_1.xml',
+                        pathlist=self.pathlist)
+        not_equal = dp.not_equal(d)
+        if not_equal:
+            raise Exception(not_equal)
+
+        # transient exceptions do not disable coalesced reads
+        def busy_read(addr, count, op=None):
+            raise modbus.ModbusClientException('Modbus exception 6', 6)
+        d.modbus_device.read = busy_read
+        try:
+            d.read_points()
+            raise Exception('Modbus exception not raised')
+        except client.SunSpecClientError:
+            pass
+        if d.read_gap_max is None:
+            raise Exception('Coalesced reads disabled by transient exception')
+
+        # device rejecting coalesced requests falls back to per model reads
+        def rejecting_read(addr, count, op=None):
+            if addr < 40072 and addr + count > 40070:
+                raise modbus.ModbusClientException('Modbus exception 2', modbus.EXCEPT_ILLEGAL_ADDRESS)
+            return read(addr, count, op)
+        d.modbus_device.read = rejecting_read
+        d.read_plans = {}
+        d.read_points()
+        if d.read_gap_max is not None:
+            raise Exception('Coalesced reads not disabled')
+        not_equal = dp.not_equal(d)
+        if not_equal:
+            raise Exception(not_equal)
+
+        # max count lowered during a read, the models are read again with requests that do not split a point
+        def lowering_read(addr, count, op=None):
+            requests.append((addr, count))
+            if count > 64:
+                d.modbus_device.max_count = 64
+            return read(addr, count, op)
+        d.modbus_device.read = lowering_read
+        d.read_gap_max = client.READ_GAP_MAX
+        d.read_plans = {}
+        d.modbus_device.max_count = 125
+        del requests[:]
+        d.read_points()
+        plan = d.read_plan([m for m in d.models_list if m.model_type is not None])
+        if requests[-len(plan):] != plan or max([count for addr, count in plan]) > 64:
+            raise Exception('Read plan after lowered max count mismatch: {} {}'.format(requests, plan))
+        not_equal = dp.not_equal(d)
+        if not_equal:
+            raise Exception(not_equal)
+
+        # models longer than the max count are read on their own with the same requests
+        d.read_gap_max = None
+        del requests[:]
+        d.read_points()
+        if max([count for addr, count in requests]) > 64:
+            raise Exception('Model read exceeds max count: {}'.format(requests))
+        not_equal = dp.not_equal(d)
+        if not_equal:
+            raise Exception(not_equal)
+
+        d.close()
+
+    def test_client_model_decode_plan(self):
+        # decode plan and point by point decode must produce the same values
+        for model_id, mlen in [(1, 66), (103, 50), (160, 88), (63001, 152)]:
+            model = client.ClientModel(None, model_id, 40000, mlen)
+            model.load()
+            if model.decode_plan is None:
+                raise Exception('No decode plan for model %s' % model_id)
+            for fill in [b'\x00', b'\xff', b'\x80', b'\x41']:
+                data = fill * (mlen * 2)
+                model.decode_points(data)
+                plan_values = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+                model._decode_points_generic(data)
+                values = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+                if plan_values != values:
+                    raise Exception('Decode plan mismatch for model %s: %s %s' % (model_id, plan_values, values))
+
+    def test_client_model_slots(self):
+        # model, block and point objects have no instance dictionary and points have integer addresses
+        model = client.ClientModel(None, 160, 40000, 8 + 2 * 20)
+        model.load()
+        objects = [model, model.model_type, model.model_type.fixed_block] + model.blocks
+        for block in model.blocks:
+            objects.extend(block.points_list)
+            objects.extend(block.points_sf.values())
+        for obj in objects:
+            if hasattr(obj, '__dict__'):
+                raise Exception('%s has an instance dictionary' % type(obj).__name__)
+        if model.blocks[2].points['DCV'].addr != 40000 + 8 + 20 + 10:
+            raise Exception('Point address mismatch: %r' % model.blocks[2].points['DCV'].addr)
+
+    @unittest.skipIf(not hasattr(memoryview, 'cast'), 'memoryview.cast not available')
+    def test_client_device_store(self):
+        def values(d):
+            return [(m.id, p.point_type.id, p.value_base, p.value_sf) for m in d.models_list for b in m.blocks
+                    for p in b.points_list + list(b.points_sf.values())]
+
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml', pathlist=self.pathlist)
+        d.scan()
+        d.read_points()
+        ds = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml', pathlist=self.pathlist,
+                                 store=True)
+        ds.scan()
+        ds.read_points()
+        if values(ds) != values(d):
+            raise Exception('Store values mismatch: %s %s' % (values(ds), values(d)))
+        points = sorted([p for m in ds.models_list for b in m.blocks for p in b.points_list + list(b.points_sf.values())],
+                        key=lambda p: p.store_index)
+        if ds.store.points != points or [(p.value_base, p.value_sf) for p in points] != ds.store.values():
+            raise Exception('Store contents mismatch: %s' % ds.store.values())
+
+        dp = device.Device()
+        dp.from_pics(filename='pics_test_device_1.xml', pathlist=self.pathlist)
+        not_equal = dp.not_equal(ds)
+        if not_equal:
+            raise Exception(not_equal)
+
+        # a snapshot is unaffected by later changes, which are found by comparing snapshots
+        snapshot = ds.store.snapshot()
+        point = ds.models[63001][0].points['int16_1']
+        before = (point.value_base, point.value_sf)
+        # values that do not fit the column of the point are kept as objects
+        point.value_sf = None
+        point.value_base = 'text'
+        if point.value != 'text' or ds.store.changed(snapshot) != [point.store_index]:
+            raise Exception('Store change mismatch: %s' % ds.store.changed(snapshot))
+        if ds.store.values(snapshot)[point.store_index] != before:
+            raise Exception('Snapshot value changed: %s' % str(ds.store.values(snapshot)[point.store_index]))
+        point.value_base = None
+        point.value_sf = None
+        if point.value is not None or point.value_sf is not None:
+            raise Exception('Store value not cleared')
+        if ds.store.changed(ds.store.snapshot(), ds.store.snapshot()):
+            raise Exception('Identical snapshots changed')
+
+        if client.numpy is not None:
+            ints, floats, sfs, flags = ds.store.arrays(snapshot)
+            if len(ints) != ds.store.count or ints[0] != 0:
+                raise Exception('Store arrays mismatch')
+
+    @unittest.skipIf(client.numpy is None, 'numpy not installed')
+    def test_client_model_vectorize(self):
+        # vectorized repeating block decode must match the point by point decode
+        model_id = 160
+        mlen = 8 + 4 * 20
+        model = client.ClientModel(None, model_id, 40000, mlen)
+        model.load()
+        model.vectorize()
+        if model.columns_plan is None:
+            raise Exception('No columns plan for model %s' % model_id)
+        for fill in [b'\x00', b'\xff', b'\x80', b'\x01\x02', b'\x00\x01\x00\xfe\xff\xff']:
+            data = (fill * (mlen * 2))[:mlen * 2]
+            model.decode_points(data)
+            columns = model.columns
+            vector_values = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+            model._decode_points_generic(data)
+            values = [(p.value_base, p.value_sf) for b in model.blocks for p in b.points_list + list(b.points_sf.values())]
+            if vector_values != values:
+                raise Exception('Vectorized decode mismatch for model %s: %s %s' % (model_id, vector_values, values))
+            for point_id in ['ID', 'DCA', 'DCW', 'Tms']:
+                expected = [b.points[point_id].value for b in model.blocks[1:]]
+                expected = [float('nan') if v is None else float(v) for v in expected]
+                column = columns[point_id].tolist()
+                if str(column) != str(expected):
+                    raise Exception('Column %s mismatch: %s %s' % (point_id, column, expected))
+
+        model.vectorize(False)
+        if model.columns_plan is not None or model.columns is not None:
+            raise Exception('Vectorized decode not disabled')
+
+    @unittest.skipIf(client.numpy is None, 'numpy not installed')
+    def test_client_model_vectorize_changed(self):
+        # changed registers of the repeating blocks are decoded by the columns only
+        mlen = 8 + 2 * 20
+        model = client.ClientModel(None, 160, 40000, mlen)
+        model.load()
+        model.vectorize(points=False)
+        data = bytearray(b'\x00\x01' * mlen)
+        offset = (int(model.blocks[2].points['DCV'].addr) - 40000) * 2
+
+        for value in [1, 5]:
+            data[offset:offset + 2] = struct.pack('>H', value)
+            model.decode_points(data)
+            if model.changed_points and model.changed_points != model.points_list:
+                raise Exception('Changed points mismatch: %s' % model.changed_points)
+            if model.columns['DCV'].tolist() != [10.0, value * 10.0]:
+                raise Exception('DCV column mismatch: %s' % model.columns['DCV'].tolist())
+            if [p.value_base for b in model.blocks[1:] for p in b.points_list if p.value_base is not None]:
+                raise Exception('Repeating block points decoded')
+
+        # with the points kept in sync the changed repeating block points are listed
+        model.vectorize()
+        model.decode_points(data)
+        data[offset:offset + 2] = b'\x00\x07'
+        data[0:2] = b'\xff\xfe'
+        model.decode_points(data)
+        expected = [model.blocks[1].points['DCA'], model.blocks[2].points['DCA'], model.blocks[2].points['DCV']]
+        if model.changed_points != expected:
+            raise Exception('Vectorized changed points mismatch: %s' % model.changed_points)
+        if model.blocks[2].points['DCV'].value_base != 7:
+            raise Exception('Changed point not decoded: %s' % model.blocks[2].points['DCV'].value_base)
+
 
     def test_sunspec_client_device_1(self):
         d = client.SunSpecClientDevice(client.MAPPED, slave_id=1,
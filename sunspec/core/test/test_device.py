@@ -23,6 +23,9 @@
 
 import sys
 import os
+import pickle
+import shutil
+import tempfile
 import unittest
 
 try:
@@ -497,6 +500,68 @@ class TestDevice(unittest.TestCase):
             except Exception as e:
                 raise Exception('Error scanning model {}: {}'.format(str(model_id), e))
 
+    def test_device_model_types_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for name in ['smdx_00001.xml', 'smdx_00103.xml', device.MODEL_TYPES_MANIFEST_MD5]:
+                shutil.copy(os.path.join(device.model_type_path_default, name), tmpdir)
+            cache = os.path.join(tmpdir, device.MODEL_TYPES_CACHE_FILE)
+
+            if device.model_types_compile(path=tmpdir) != 2:
+                raise Exception('Compiled model type count mismatch')
+            compiled = device.model_types_cache_load(cache, path=tmpdir)
+            if sorted(compiled) != [1, 103]:
+                raise Exception('Cached model ids mismatch: %s' % sorted(compiled))
+
+            for model_id in compiled:
+                mt = device.ModelType()
+                mt.from_smdx(ET.parse(os.path.join(tmpdir, smdx.model_id_to_filename(model_id))).getroot())
+                cached = pickle.loads(compiled[model_id])
+                # symbols are compared by identity
+                not_equal = mt.not_equal(cached)
+                if not_equal and 'symbols' not in not_equal:
+                    raise Exception(not_equal)
+                for block in [cached.fixed_block, cached.repeating_block]:
+                    if block is not None and block.model_type is not cached:
+                        raise Exception('Cached block type model type mismatch')
+
+            # a changed manifest invalidates the cache
+            with open(os.path.join(tmpdir, device.MODEL_TYPES_MANIFEST_MD5), 'w') as f:
+                f.write('0' * 32)
+            if device.model_types_cache_load(cache, path=tmpdir) is not None:
+                raise Exception('Stale model types cache loaded')
+
+            # a corrupt cache is ignored
+            with open(cache, 'wb') as f:
+                f.write(b'corrupt')
+            if device.model_types_cache_load(cache, path=tmpdir) is not None:
+                raise Exception('Corrupt model types cache loaded')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_device_model_types_preload(self):
+        model_ids = device.model_types_manifest_ids()
+        if 1 not in model_ids or 103 not in model_ids:
+            raise Exception('Manifest model ids mismatch: %s' % model_ids)
+
+        device.model_types.pop(103, None)
+        loaded, errors = device.model_types_preload([1, 103, 65432], workers=2)
+        if loaded != [1, 103] or list(errors) != [65432]:
+            raise Exception('Preload result mismatch: %s %s' % (loaded, errors))
+        if device.model_types.get(103) is None:
+            raise Exception('Preloaded model type not cached')
+
+        # serial load without concurrent.futures
+        device.model_types.pop(103, None)
+        concurrent = device.concurrent
+        device.concurrent = None
+        try:
+            loaded, errors = device.model_types_preload([103, 65432])
+        finally:
+            device.concurrent = concurrent
+        if loaded != [103] or list(errors) != [65432] or device.model_types.get(103) is None:
+            raise Exception('Serial preload result mismatch: %s %s' % (loaded, errors))
+
     def test_device_constant_sf(self):
         d = device.Device()
         d.from_pics(filename='pics_test_device_1.xml', pathlist=self.pathlist)
@@ -23,6 +23,10 @@
 
 import sys
 import os
+import socket
+import struct
+import threading
+import time
 import unittest
 
 import sunspec.core.device as device
@@ -111,6 +115,348 @@ class TestModbusClient(unittest.TestCase):
 
         d.close()
 
+    def test_modbus_client_device_tcp_pipeline(self):
+        """
+        -> 00 01 00 00 00 06 01 03 9C 40 00 02
+        -> 00 02 00 00 00 06 01 03 9C 42 00 02
+        <- 00 02 00 00 00 07 01 03 04 43 44 45 46
+        -> 00 03 00 00 00 06 01 03 9C 44 00 01
+        <- 00 01 00 00 00 07 01 03 04 53 75 6E 53
+        <- 00 03 00 00 00 05 01 03 02 47 48
+        """
+
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, max_count=2, pipeline=2)
+
+        # responses arrive out of order and are reassembled by transaction id
+        d.socket.in_buf = (b'\x00\x02\x00\x00\x00\x07\x01\x03\x04\x43\x44\x45\x46' +
+                           b'\x00\x01\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53' +
+                           b'\x00\x03\x00\x00\x00\x05\x01\x03\x02\x47\x48')
+        sock = d.socket
+        sock.out_buf = b''
+        data = d.read(40000, 5)
+
+        if sock.out_buf != (b'\x00\x01\x00\x00\x00\x06\x01\x03\x9C\x40\x00\x02' +
+                            b'\x00\x02\x00\x00\x00\x06\x01\x03\x9C\x42\x00\x02' +
+                            b'\x00\x03\x00\x00\x00\x06\x01\x03\x9C\x44\x00\x01'):
+            raise Exception("Modbus request mismatch: %s" % (sock.out_buf))
+
+        if data != b'SunSCDEFGH':
+            raise Exception("Read data mismatch - expected: 'SunSCDEFGH' received: %s" % (data))
+
+        # multiple reads
+        d.socket = sock
+        sock.in_buf = (b'\x00\x05\x00\x00\x00\x05\x01\x03\x02\x43\x44' +
+                       b'\x00\x04\x00\x00\x00\x05\x01\x03\x02\x53\x75')
+        data = d.read_multiple([(40000, 1), (40010, 1)])
+        if data != [b'Su', b'CD']:
+            raise Exception("Read multiple data mismatch: %s" % (data))
+
+        # exception response with requests in flight closes the connection
+        d.socket = sock
+        sock.connected = True
+        sock.in_buf = (b'\x00\x06\x00\x00\x00\x03\x01\x83\x02')
+        try:
+            d.read_multiple([(40000, 1), (40010, 1)])
+            raise Exception("Modbus exception not raised")
+        except modbus.ModbusClientException:
+            pass
+        if sock.connected:
+            raise Exception("Connection not closed with requests in flight")
+
+    def test_modbus_client_device_tcp_persistent(self):
+        """
+        -> 00 00 00 00 00 06 01 03 9C 40 00 02
+        <- 00 00 00 00 00 07 01 03 04 53 75 6E 53
+        """
+
+        resp = b'\x00\x00\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, persistent=True, idle_timeout=60)
+        d.connect()
+        sock = d.socket
+        if sock.options.get((socket.IPPROTO_TCP, socket.TCP_NODELAY)) != 1:
+            raise Exception("TCP_NODELAY not set")
+        if sock.options.get((socket.SOL_SOCKET, socket.SO_KEEPALIVE)) != 1:
+            raise Exception("SO_KEEPALIVE not set")
+
+        # connection is kept open across requests
+        for i in range(2):
+            d.socket.in_buf = resp
+            data = d.read(40000, 2)
+            if data != b'SunS':
+                raise Exception("Read data mismatch - expected: 'SunS' received: %s" % (data))
+            if d.socket is not sock or not sock.connected:
+                raise Exception("Persistent connection not kept open")
+
+        # idle connection is closed before the next request
+        d.last_activity -= 61
+        d.socket.in_buf = resp
+        try:
+            d.read(40000, 2)
+        except modbus.ModbusClientError:
+            pass
+        if sock.connected:
+            raise Exception("Idle connection not closed")
+
+        # failed request is retried once on a new connection
+        d.connect()
+        sock = d.socket
+        try:
+            d.read(40000, 2)
+            raise Exception("Read without response succeeded")
+        except modbus.ModbusClientError:
+            pass
+        if sock.connected or d.socket is not None:
+            raise Exception("Failed connection not closed")
+
+        d.close()
+
+
+    def test_modbus_client_device_tcp_pool(self):
+        """
+        -> 00 00 00 00 00 06 01 03 9C 40 00 02
+        <- 00 00 00 00 00 07 01 03 04 53 75 6E 53
+        -> 00 00 00 00 00 06 02 03 9C 40 00 02
+        <- 00 00 00 00 00 07 02 03 04 53 75 6E 53
+        """
+
+        modbus.modbus_tcp_pool_remove("127.0.0.1")
+        pool = modbus.modbus_tcp_pool("127.0.0.1", size=1)
+        if modbus.modbus_tcp_pool("127.0.0.1", 502) is not pool:
+            raise Exception("Pool not shared by gateway")
+        try:
+            modbus.modbus_tcp_pool("127.0.0.1", size=2)
+            raise Exception("Pool size mismatch not detected")
+        except modbus.ModbusClientError:
+            pass
+
+        d1 = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, pool=pool)
+        d2 = modbus.ModbusClientDeviceTCP(2, ipaddr="127.0.0.1", trace_func=None, test=True, pool=pool)
+
+        # fake connection placed in the pool, the devices take it from there
+        pool.acquire()
+        d1.connect()
+        sock = d1.socket
+        d1.socket = None
+        pool.release(sock)
+        sock.in_buf = b'\x00\x00\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+        sock.out_buf = b''
+        if d1.read(40000, 2) != b'SunS':
+            raise Exception("Read data mismatch on pooled connection")
+        if d1.socket is not None or pool.connections() != 1:
+            raise Exception("Connection not returned to the pool")
+
+        # second device reuses the connection with its own slave id
+        sock.in_buf = b'\x00\x00\x00\x00\x00\x07\x02\x03\x04\x53\x75\x6E\x53'
+        sock.out_buf = b''
+        if d2.read(40000, 2) != b'SunS':
+            raise Exception("Read data mismatch on shared connection")
+        if sock.out_buf != b'\x00\x00\x00\x00\x00\x06\x02\x03\x9C\x40\x00\x02':
+            raise Exception("Modbus request mismatch: %s" % (sock.out_buf))
+        if pool.reuses != 2 or pool.in_use != 0 or not sock.connected:
+            raise Exception("Pooled connection not reused")
+
+        # failed connection is not returned to the pool
+        sock.in_buf = b''
+        try:
+            d2.read(40000, 2)
+            raise Exception("Read error not raised")
+        except modbus.ModbusClientError:
+            pass
+        if pool.connections() != 0 or sock.connected:
+            raise Exception("Failed connection returned to the pool")
+
+        modbus.modbus_tcp_pool_remove("127.0.0.1")
+        if modbus.modbus_tcp_pools:
+            raise Exception("Pool not removed")
+
+    def test_modbus_client_device_tcp_max_count(self):
+        """
+        -> 00 00 00 00 00 06 01 03 9C 40 00 64
+        <- 00 00 00 00 00 03 01 83 03
+        -> 00 00 00 00 00 06 01 03 9C 40 00 40
+        <- 00 00 00 00 00 83 01 03 80 ...
+        -> 00 00 00 00 00 06 01 03 9C 80 00 24
+        <- 00 00 00 00 00 4B 01 03 48 ...
+        """
+
+        def resp(count):
+            return struct.pack('>HHHBBB', 0, 0, count * 2 + 3, 1, 3, count * 2) + b'\x55' * (count * 2)
+
+        # request size rejected with an illegal data value exception
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, max_count=100)
+        d.socket.in_buf = b'\x00\x00\x00\x00\x00\x03\x01\x83\x03' + resp(64) + resp(36)
+        data = d.read(40000, 100)
+        if data != b'\x55' * 200:
+            raise Exception("Read data mismatch after request size fallback")
+        if d.max_count != 64:
+            raise Exception("Max count not lowered: %s" % (d.max_count))
+
+        # other exceptions leave the max count unchanged
+        d.socket.in_buf = b'\x00\x00\x00\x00\x00\x03\x01\x83\x02'
+        try:
+            d.read(40000, 10)
+            raise Exception("Modbus exception not raised")
+        except modbus.ModbusClientException as e:
+            if e.except_code != 2:
+                raise Exception("Exception code mismatch: %s" % (e.except_code))
+        if d.max_count != 64:
+            raise Exception("Max count changed by unrelated exception: %s" % (d.max_count))
+
+        # illegal data value exceptions for requests below the max count are not caused by their size
+        d.socket.in_buf = b'\x00\x00\x00\x00\x00\x03\x01\x83\x03'
+        try:
+            d.read(40000, 10)
+            raise Exception("Modbus exception not raised")
+        except modbus.ModbusClientException as e:
+            if e.except_code != 3:
+                raise Exception("Exception code mismatch: %s" % (e.except_code))
+        if d.max_count != 64:
+            raise Exception("Max count changed by content exception: %s" % (d.max_count))
+
+        # short responses
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True)
+        d.socket.in_buf = resp(60) + resp(40)
+        data = d.read(40000, 100)
+        if data != b'\x55' * 200:
+            raise Exception("Read data mismatch after short response")
+        if d.max_count != 60:
+            raise Exception("Max count not lowered after short response: %s" % (d.max_count))
+
+    def test_modbus_client_crc(self):
+
+        frame = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF0'
+        for data in [frame[:-2], bytearray(frame[:-2]), memoryview(frame)[:-2], '\x01\x03\x04\x53\x75\x6E\x53']:
+            if modbus.computeCRC(data) != 0x96F0:
+                raise Exception("CRC mismatch for %s" % (type(data)))
+
+        result = modbus.checkFrameCRCs([frame, b'\x01\x03\x9C\x40\x00\x02\xEB\x8F', frame[:-1] + b'\x00', b'\xff'])
+        if result != [True, True, False, False]:
+            raise Exception("Frame CRC check mismatch: %s" % (result))
+
+    def test_modbus_client_rtu_frame(self):
+        """
+        -> 01 03 9C 40 00 02 EB 8F
+        <- 01 83 02 C0 F1
+        -> 01 03 9C 40 00 02 EB 8F
+        <- 02 03 04 53 75 6E 53 ...
+        """
+
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, baudrate=9600, trace_func=None)
+        if abs(d.client.frame_gap - 3.5 * 11 / 9600) > 1e-9:
+            raise Exception("Inter-frame gap mismatch: %s" % (d.client.frame_gap))
+
+        # exception response is shorter than the read response
+        d.client.serial.in_buf = b'\x01\x83\x02\xC0\xF1'
+        try:
+            d.read(40000, 2)
+            raise Exception("Modbus exception not raised")
+        except modbus.ModbusClientException as e:
+            if e.except_code != 2:
+                raise Exception("Exception code mismatch: %s" % (e.except_code))
+
+        # frame of another slave is not taken for the response
+        frame = b'\x02\x03\x04\x53\x75\x6E\x53'
+        d.client.serial.in_buf = frame + struct.pack('>H', modbus.computeCRC(frame))
+        try:
+            d.read(40000, 2)
+            raise Exception("Response of another slave accepted")
+        except modbus.ModbusClientException:
+            raise
+        except modbus.ModbusClientError:
+            pass
+
+        # corrupted frame
+        d.client.serial.in_buf = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF1'
+        try:
+            d.read(40000, 2)
+            raise Exception("CRC error not detected")
+        except modbus.ModbusClientError:
+            pass
+
+        # byte count above the largest legal read response
+        d.client.serial.in_buf = b'\x01\x03\xFF' + b'\x00' * 257
+        try:
+            d.read(40000, 2)
+            raise Exception("Oversize frame accepted")
+        except modbus.ModbusClientTimeout:
+            raise
+        except modbus.ModbusClientError as e:
+            if 'byte count' not in str(e):
+                raise Exception("Oversize frame error mismatch: %s" % (e))
+
+        d.close()
+
+    def test_modbus_client_rtu_scheduler(self):
+
+        scheduler = modbus.ModbusRTUScheduler()
+        order = []
+        release = threading.Event()
+
+        # slave 1 holds the bus while the other requests queue up
+        holder = threading.Thread(target=scheduler.run, args=(1, release.wait, ()))
+        holder.start()
+        while not scheduler.busy:
+            time.sleep(.001)
+
+        threads = []
+        for slave_id, write, priority in [(3, False, 0), (2, False, 0), (5, True, 0), (7, False, 1), (2, False, 0)]:
+            t = threading.Thread(target=scheduler.run, args=(slave_id, order.append, (slave_id,)),
+                                 kwargs={'write': write, 'priority': priority})
+            t.start()
+            threads.append(t)
+            while len(scheduler.queue) < len(threads):
+                time.sleep(.001)
+
+        release.set()
+        holder.join()
+        for t in threads:
+            t.join()
+
+        # write, priority, then round-robin by slave id after the last slave served
+        if order != [5, 7, 2, 3, 2]:
+            raise Exception("Request order mismatch: %s" % (order))
+        if scheduler.requests != 6 or scheduler.queue_max != 5 or scheduler.queue:
+            raise Exception("Scheduler counters mismatch")
+        if scheduler.slaves[2][0] != 2 or scheduler.slaves[1][2] <= 0:
+            raise Exception("Slave statistics mismatch: %s" % (scheduler.slaves))
+
+    def test_modbus_client_device_rtu_tcp(self):
+        """
+        -> 01 03 9C 40 00 02 EB 8F
+        <- 01 03 04 53 75 6E 53 96 F0
+        """
+
+        d = modbus.ModbusClientDeviceRTUTCP(1, "127.0.0.1", 4001, test=True)
+        d.client.frame_gap = 0
+        if modbus.modbus_rtu_clients.get('tcp:127.0.0.1:4001') is not d.client:
+            raise Exception("RTU over TCP client not registered")
+
+        # connection is kept open between requests
+        stream = d.client.serial
+        stream.connect()
+        sock = stream.socket
+        sock.in_buf = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF0'
+        data = d.read(40000, 2)
+        if sock.out_buf != b'\x01\x03\x9C\x40\x00\x02\xEB\x8F':
+            raise Exception("Modbus request mismatch: %s" % (sock.out_buf))
+        if data != b'SunS':
+            raise Exception("Read data mismatch - expected: 'SunS' received: %s" % (data))
+        if stream.socket is not sock:
+            raise Exception("Connection not kept open")
+
+        # connection closed by the converter is replaced and the request sent again
+        sock.in_buf = b''
+        try:
+            d.read(40000, 2)
+        except modbus.ModbusClientError:
+            pass
+        if sock.connected or stream.socket is sock:
+            raise Exception("Closed connection not replaced")
+
+        d.close()
+        if modbus.modbus_rtu_clients.get('tcp:127.0.0.1:4001') is not None:
+            raise Exception("RTU over TCP client not removed")
 
 if __name__ == "__main__":
 
@@ -23,8 +23,11 @@
 
 import sys
 import os
+import shutil
+import tempfile
 import time
 import unittest
+import zipfile
 
 import sunspec.core.util as util
 
@@ -123,6 +126,75 @@ class TestUtil(unittest.TestCase):
         self.assertEqual(util.eui48_to_data('12:34:56:78:9A:BC'), b'\x00\x00\x12\x34\x56\x78\x9A\xBC')
 
 
+    def test_pathlist(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            zip_path = os.path.join(tmpdir, 'models.zip')
+            with zipfile.ZipFile(zip_path, 'w') as z:
+                z.writestr('models/a.xml', b'zip a')
+                z.writestr('models/sub/c.xml', b'zip c')
+            os.mkdir(os.path.join(tmpdir, 'dir'))
+            for name, data in [('a.xml', b'dir a'), ('b.xml', b'dir b')]:
+                with open(os.path.join(tmpdir, 'dir', name), 'wb') as f:
+                    f.write(data)
+
+            pathlist = util.PathList([os.path.join(zip_path, 'models'), os.path.join(tmpdir, 'missing.zip'),
+                                      os.path.join(tmpdir, 'dir')])
+            self.assertEqual(pathlist.read('a.xml'), b'zip a')
+            self.assertEqual(pathlist.read('b.xml'), b'dir b')
+            self.assertEqual(pathlist.read('sub/c.xml'), b'zip c')
+            self.assertRaises(NameError, pathlist.read, 'c.xml')
+
+            # the zip file stays open and the index is reused without checking the stamps
+            index = pathlist.index()
+            zip_file = util.zip_files[zip_path][1]
+            stamps = []
+            path_stamp = util.path_stamp
+            util.path_stamp = lambda path: stamps.append(path) or path_stamp(path)
+            try:
+                self.assertEqual(pathlist.read('a.xml'), b'zip a')
+                self.assertTrue(pathlist.index() is index)
+                self.assertEqual(stamps, [])
+                # a miss checks the stamps
+                self.assertRaises(NameError, pathlist.read, 'c.xml')
+                self.assertEqual(len(stamps), 3)
+            finally:
+                util.path_stamp = path_stamp
+            self.assertTrue(util.zip_files[zip_path][1] is zip_file)
+
+            # a new file in a directory is found by the check of a miss
+            mtime = time.time() + 10
+            with open(os.path.join(tmpdir, 'dir', 'd.xml'), 'wb') as f:
+                f.write(b'dir d')
+            os.utime(os.path.join(tmpdir, 'dir'), (mtime, mtime))
+            self.assertEqual(pathlist.read('d.xml'), b'dir d')
+
+            # a changed zip file is reopened once the stamps are checked again
+            with zipfile.ZipFile(zip_path, 'w') as z:
+                z.writestr('models/b.xml', b'zip b')
+            os.utime(zip_path, (mtime, mtime))
+            pathlist._stamp_time -= util.PATH_STAMP_INTERVAL
+            self.assertEqual(pathlist.read('a.xml'), b'dir a')
+            self.assertEqual(pathlist.read('b.xml'), b'zip b')
+            self.assertEqual(pathlist.read('d.xml'), b'dir d')
+
+            # the least recently used zip files are closed
+            for i in range(util.ZIP_FILES_MAX + 1):
+                path = os.path.join(tmpdir, 'lru_%d.zip' % i)
+                with zipfile.ZipFile(path, 'w') as z:
+                    z.writestr('e_%d.xml' % i, b'e')
+                self.assertEqual(util.PathList([path]).read('e_%d.xml' % i), b'e')
+            self.assertTrue(len(util.zip_files) <= util.ZIP_FILES_MAX)
+            self.assertTrue(zip_path not in util.zip_files)
+            self.assertEqual(pathlist.read('b.xml'), b'zip b')
+        finally:
+            with util.zip_files_lock:
+                for path in list(util.zip_files):
+                    if path.startswith(tmpdir):
+                        util.zip_files.pop(path)[1].close()
+            shutil.rmtree(tmpdir)
+
+
 if __name__ == "__main__":
 
     unittest.main()
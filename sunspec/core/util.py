@@ -24,9 +24,12 @@
 import os
 import struct
 import sys
+import threading
+import time
 import zipfile
 import array
 import base64
+import collections
 
 class SunSpecError(Exception):
     pass
@@ -175,6 +178,55 @@ def indent(elem, level=0):
 """ File path list
 
 """
+# open zip files shared by all path lists, least recently used first
+ZIP_FILES_MAX = 8
+zip_files = collections.OrderedDict()
+zip_files_lock = threading.Lock()
+
+# seconds a path list reuses the stamps of its elements before a lookup checks them again
+PATH_STAMP_INTERVAL = 1.0
+
+def path_stamp(path):
+    """ Modification stamp of a file or directory, None if it does not exist
+    """
+    try:
+        st = os.stat(path)
+        return (st.st_mtime, st.st_size)
+    except OSError:
+        return None
+
+def path_location(path):
+    """ Split a path list element into the zip file path and the directory
+    within the zip file, or None and the directory path if the element does
+    not contain a zip file.
+    """
+    elements = path.split(os.sep)
+    for i, e in enumerate(elements):
+        if e.endswith('.zip'):
+            prefix = '/'.join([d for d in elements[i + 1:] if d])
+            if prefix:
+                prefix += '/'
+            return os.sep.join(elements[:i + 1]), prefix
+    return None, path
+
+def zip_file_get(path, stamp):
+    """ Return the open zip file and the set of its member names for a zip
+    file path. Must be called with zip_files_lock held. The zip file is
+    reopened if its stamp changed and the least recently used zip file is
+    closed when more than ZIP_FILES_MAX are open.
+    """
+    entry = zip_files.pop(path, None)
+    if entry is not None and entry[0] != stamp:
+        entry[1].close()
+        entry = None
+    if entry is None:
+        zip_file = zipfile.ZipFile(path)
+        entry = (stamp, zip_file, frozenset(zip_file.namelist()))
+    zip_files[path] = entry
+    while len(zip_files) > ZIP_FILES_MAX:
+        zip_files.popitem(last=False)[1][1].close()
+    return entry[1], entry[2]
+
 class PathList(object):
 
     def __init__(self, path_list=None):
@@ -183,6 +235,10 @@ class PathList(object):
         if path_list is not None:
             self.path = path_list
 
+        # (paths, locations, stamps, filename index) of the last lookup and the time its stamps were checked
+        self._index = None
+        self._stamp_time = None
+
     """ Add path to path list
 
     Provides a list of file system paths to search for non-python files similar to sys.path for python 
@@ -196,56 +252,115 @@ class PathList(object):
 
         self.path.append(path)
 
-    """ Read first instance of specified file found in path list
+    """ Return the filename index of the path list
 
-    Traverses the path list and returns the contents of the first instance of the specified file.
-    Supports zip files in path.
+    The index maps the name of each file directly contained in a path list element to the first element
+    containing it. It is rebuilt when the path list or the modification time of one of its directories or
+    zip files changes. The modification times are checked at most once per PATH_STAMP_INTERVAL seconds
+    unless check is True.
 
     """
-    def read(self, filename):
+    def index(self, check=False):
+
+        paths = tuple(self.path)
+        index = self._index
+        now = time.time()
+        if index is not None and index[0] == paths:
+            if not check and 0 <= now - self._stamp_time < PATH_STAMP_INTERVAL:
+                return index
+            locations = index[1]
+        else:
+            locations = [path_location(p) for p in paths]
+
+        stamps = [path_stamp(zip_path or path or os.curdir) for zip_path, path in locations]
+        self._stamp_time = now
+        if index is not None and index[0] == paths and index[2] == stamps:
+            return index
+
+        files = {}
+        for i, (zip_path, path) in enumerate(locations):
+            if stamps[i] is None:
+                continue
+            try:
+                if zip_path:
+                    with zip_files_lock:
+                        names = zip_file_get(zip_path, stamps[i])[1]
+                    for name in names:
+                        if name.startswith(path):
+                            filename = name[len(path):]
+                            if filename and '/' not in filename:
+                                files.setdefault(filename, (i, name))
+                else:
+                    for filename in os.listdir(path or os.curdir):
+                        files.setdefault(filename, (i, os.path.join(path, filename)))
+            except (IOError, OSError, zipfile.BadZipfile):
+                # unreadable elements are skipped as files not found
+                continue
 
-        file_path = ''
-        zip_file_path = ''
+        index = (paths, locations, stamps, files)
+        self._index = index
+        return index
 
-        # traverse path list until first instance of file found
-        for p in self.path:
-            file_path = ''
-            element_list = p.split(os.sep)
-            sep = os.sep
-
-            for e in element_list:
-                if e == '':
-                    file_path += sep
-                elif file_path and file_path != sep:
-                    file_path += sep
-                file_path += e
-                if e.endswith('.zip'):
-                    zip_file_path = file_path
-                    if os.path.exists(zip_file_path):
-                        file_path = ''
-                        # zip file separator is always '/'
-                        sep = '/'
-                    else:
-                        # continue with next path list element if zip file does not exist
-                        zip_file_path = ''
-                        break
-
-            if file_path and file_path != os.sep:
-                file_path += sep
-            file_path  += filename
-            if zip_file_path:
-                zip_file = zipfile.ZipFile(zip_file_path)
-                try:
-                    zip_file.getinfo(file_path)
-                except Exception as e:
+    def _find(self, index, filename):
+
+        paths, locations, stamps, files = index
+
+        location = files.get(filename)
+        if location is not None:
+            return location
+
+        if os.sep in filename or '/' in filename:
+            for i, (zip_path, path) in enumerate(locations):
+                if stamps[i] is None:
                     continue
-                return zip_file.read(file_path)
-            else:
-                if os.path.exists(file_path):
-                    with open(file_path, 'rb') as f:
-                        return f.read()
+                if zip_path:
+                    name = path + filename.replace(os.sep, '/')
+                    try:
+                        with zip_files_lock:
+                            found = name in zip_file_get(zip_path, stamps[i])[1]
+                    except (IOError, OSError, zipfile.BadZipfile):
+                        continue
                 else:
-                    continue
+                    name = os.path.join(path, filename)
+                    found = os.path.isfile(name)
+                if found:
+                    return i, name
+
+        return None
+
+    def _read(self, locations, stamps, i, name):
+
+        zip_path = locations[i][0]
+        if zip_path:
+            with zip_files_lock:
+                return zip_file_get(zip_path, stamps[i])[0].read(name)
+        with open(name, 'rb') as f:
+            return f.read()
+
+    """ Read first instance of specified file found in path list
+
+    Traverses the path list and returns the contents of the first instance of the specified file.
+    Supports zip files in path. Files directly contained in the path list elements are found with the
+    filename index, other relative paths are looked up in each element.
+
+    """
+    def read(self, filename):
+
+        index = self.index()
+        location = self._find(index, filename)
+        if location is not None:
+            try:
+                return self._read(index[1], index[2], location[0], location[1])
+            except (IOError, OSError, KeyError, zipfile.BadZipfile):
+                # the element may have changed since its stamp was checked
+                pass
+
+        # a miss checks the stamps as a file may have been added since the index was built
+        checked = self.index(True)
+        if checked is not index or location is not None:
+            location = self._find(checked, filename)
+            if location is not None:
+                return self._read(checked[1], checked[2], location[0], location[1])
 
         # file not found
         raise NameError(filename)
@@ -1,15 +1,28 @@
 import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.modbus.client as modbus
 import prometheus_client as prom
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import time
 import signal
 import os
+import re
 
 # Create a metric to track time spent and requests made.
-req_summary = prom.Summary('python_my_req_example', 'Time spent processing a request')
-SunSpecDevice = client.SunSpecClientDevice
+req_summary = prom.Summary('python_my_req_example', 'Time spent processing a request', ['target'])
+# Startup model definition preload
+preload_seconds = prom.Gauge('sunspec_model_preload_seconds', 'Time spent preloading the model definitions')
+preload_models = prom.Gauge('sunspec_model_preload_models', 'Model definitions preloaded at startup')
 
-metrics = {}
+DEFAULT_TARGET_PORT = 502
+DEFAULT_SLAVE_ID = 1
+RECONNECT_DELAY = 1
+IDLE_TIMEOUT_DEFAULT = 60
+MAX_WORKERS_DEFAULT = 32
+# Labels of every point sample, a metric family only takes samples with its own label names
+POINT_LABELS = ['target', 'model', 'unit', 'value']
 
 class GracefulKiller:
   kill_now = False
@@ -21,32 +34,297 @@ class GracefulKiller:
     self.kill_now = True
 
 
-# Decorate function with metric.
-@req_summary.time()
-def process_request():
-    # Read device status
-    SunSpecDevice.read()
-    
-    # Update Gauges
-    for model in SunSpecDevice.models:
-        for param in SunSpecDevice[model].model.points:
-            if param in metrics:
-                point = SunSpecDevice[model].model.points[param]
-                value = SunSpecDevice[model][param]
-                unit = point.point_type.units
-                isNumeric = type(SunSpecDevice[model][param]) in [float, int]
-                hasUnit = type(unit) is str
-                try:
-                    if isNumeric:
-                        if hasUnit:
-                            metrics[param].labels(model, unit).set(value)
-                        else:
-                            metrics[param].labels(model).set(value)
-                    else:
-                        metrics[param].labels(model, value).set(1)
-                except Exception as e:
-                    print(date_time, "Model:", model, "- Param:", param, "- Unit:", unit, "- Value:", value, "- Exception:", str(e))
-            
+def timestamp():
+    return datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
+
+
+class Target:
+    """A single SunSpec device polled by the exporter.
+
+    Each target owns its own client.SunSpecClientDevice. Polls run on the
+    worker pool and a target is never scheduled again while a previous poll is
+    still in progress, so a slow or dead inverter only delays itself.
+    """
+
+    idle_timeout = IDLE_TIMEOUT_DEFAULT
+    # Read interval overrides in seconds by model id
+    poll_intervals = {}
+    # Directory of the scan cache files, no cache if None
+    scan_cache_dir = None
+    # Read requests kept in flight on the connection
+    pipeline = 1
+    # Connections per gateway shared by the targets behind it
+    pool_size = modbus.TCP_POOL_SIZE_DEFAULT
+
+    def __init__(self, addr, port=DEFAULT_TARGET_PORT, slave_id=DEFAULT_SLAVE_ID, device_type=client.TCP,
+                 baudrate=None):
+        self.addr = addr
+        self.port = port
+        self.slave_id = slave_id
+        self.device_type = device_type
+        self.baudrate = baudrate
+        if device_type == client.RTU:
+            # addr is the serial port, the targets on a port share its bus scheduler
+            self.name = 'rtu:%s:%d' % (addr, slave_id)
+        elif device_type == client.RTU_TCP:
+            self.name = 'rtutcp:%s:%d:%d' % (addr, port, slave_id)
+        else:
+            self.name = '%s:%d:%d' % (addr, port, slave_id)
+        self.device = None
+        self.snapshot = None
+        self.samples = {}
+        self.metrics = ()
+        self.busy = False
+        self.retry_time = 0
+
+    def connect(self):
+        scan_cache = None
+        if self.scan_cache_dir:
+            # Skip the model scan on reconnect if the device did not change
+            scan_cache = os.path.join(self.scan_cache_dir,
+                                      re.sub('[^A-Za-z0-9.-]', '_', self.name.replace(':', '_')) + '.json')
+        if self.device_type == client.RTU:
+            print(timestamp(), self.name, "Connecting to SunSpec target on serial port", self.addr)
+            self.device = client.SunSpecClientDevice(client.RTU, self.slave_id, name=self.addr,
+                                                     baudrate=self.baudrate, scan_cache=scan_cache)
+        elif self.device_type == client.RTU_TCP:
+            print(timestamp(), self.name, "Connecting to SunSpec target behind serial converter", self.addr, "port",
+                  self.port)
+            # RTU frames are sent as is to a transparent converter, the targets
+            # behind it share its connection and bus scheduler
+            self.device = client.SunSpecClientDevice(client.RTU_TCP, self.slave_id, ipaddr=self.addr,
+                                                     ipport=self.port, baudrate=self.baudrate,
+                                                     scan_cache=scan_cache)
+        else:
+            print(timestamp(), self.name, "Connecting to SunSpec target on", self.addr, "port", self.port)
+            # Targets behind the same gateway share its pooled connections, which
+            # are kept open across poll cycles
+            pool = modbus.modbus_tcp_pool(self.addr, self.port, size=self.pool_size)
+            self.device = client.SunSpecClientDevice(client.TCP, self.slave_id, ipaddr=self.addr, ipport=self.port,
+                                                     persistent=True, idle_timeout=self.idle_timeout,
+                                                     scan_cache=scan_cache, pipeline=self.pipeline, pool=pool)
+        self.device.device.poll_intervals.update(self.poll_intervals)
+        print(timestamp(), self.name, "Connected to SunSpec target")
+        print(timestamp(), self.name, "Available models in device:", self.device.models)
+
+    def update(self, snapshot):
+        # Only the samples of the points that changed since the previous
+        # snapshot are rebuilt, the collector reads the published tuple.
+        if self.snapshot is None or snapshot.changed is snapshot.points:
+            self.samples = {}
+            changed = snapshot.points
+        else:
+            changed = snapshot.changed
+        if changed or not self.metrics:
+            for point in changed:
+                key = (point.model_id, point.model_index, point.block_index, point.point_id)
+                self.samples[key] = point_sample(self, point)
+            self.metrics = tuple(sample for sample in self.samples.values() if sample is not None)
+        self.snapshot = snapshot
+
+    def close(self):
+        self.snapshot = None
+        self.metrics = ()
+        if self.device is not None:
+            try:
+                self.device.close()
+                print(timestamp(), self.name, "Closed connection to SunSpec server")
+            except Exception:
+                pass
+            self.device = None
+
+    def poll(self):
+        try:
+            if self.device is None:
+                self.connect()
+            process_request(self)
+        except Exception as e:
+            print(timestamp(), self.name, str(e))
+            self.close()
+            self.retry_time = time.time() + RECONNECT_DELAY
+        finally:
+            self.busy = False
+
+
+def parse_targets(value):
+    """Parse a TARGETS string of the form 'ip[:port[:slave_id]],...'.
+    Serial targets are given as 'rtu:port[:slave_id[:baudrate]]' and targets
+    behind a transparent serial converter as
+    'rtutcp:ip[:port[:slave_id[:baudrate]]]'."""
+
+    targets = []
+    for entry in value.replace(' ', ',').split(','):
+        if not entry:
+            continue
+        fields = entry.split(':')
+        if fields[0] == 'rtu':
+            slave_id = DEFAULT_SLAVE_ID
+            baudrate = None
+            if len(fields) > 2 and fields[2]:
+                slave_id = int(fields[2])
+            if len(fields) > 3 and fields[3]:
+                baudrate = int(fields[3])
+            targets.append(Target(fields[1], None, slave_id, client.RTU, baudrate))
+            continue
+        if fields[0] == 'rtutcp':
+            port = DEFAULT_TARGET_PORT
+            slave_id = DEFAULT_SLAVE_ID
+            baudrate = None
+            if len(fields) > 2 and fields[2]:
+                port = int(fields[2])
+            if len(fields) > 3 and fields[3]:
+                slave_id = int(fields[3])
+            if len(fields) > 4 and fields[4]:
+                baudrate = int(fields[4])
+            targets.append(Target(fields[1], port, slave_id, client.RTU_TCP, baudrate))
+            continue
+        addr = fields[0]
+        port = DEFAULT_TARGET_PORT
+        slave_id = DEFAULT_SLAVE_ID
+        if len(fields) > 1 and fields[1]:
+            port = int(fields[1])
+        if len(fields) > 2 and fields[2]:
+            slave_id = int(fields[2])
+        targets.append(Target(addr, port, slave_id))
+    return targets
+
+
+def point_sample(target, point):
+    """Metric sample (name, description, labels, label values, value) for a
+    snapshot point or None if the point is not exported."""
+
+    # Only fixed block points of the first instance of each model are exported
+    if point.block_index != 0 or point.model_index != 1 or point.value is None:
+        return None
+    isNumeric = type(point.value) in [float, int]
+    hasUnit = type(point.units) is str
+    # labels not used by the point are left empty
+    values = [target.name, point.model_name, '', '']
+    if isNumeric:
+        if hasUnit:
+            values[2] = point.units
+    else:
+        values[3] = str(point.value)
+    return (point.point_id, point.description or '', POINT_LABELS, values, point.value if isNumeric else 1)
+
+
+def parse_intervals(value):
+    """Parse a MODEL_INTERVALS string of the form 'model_id:seconds,...'."""
+
+    intervals = {}
+    for entry in value.replace(' ', ',').split(','):
+        if not entry:
+            continue
+        model_id, interval = entry.split(':')
+        intervals[int(model_id)] = float(interval)
+    return intervals
+
+
+class SunSpecCollector(object):
+    """Custom collector rendering the latest samples of every target.
+
+    Polling only swaps the sample tuple held by each target, so the cost
+    of a poll does not depend on the exposition path and a scrape never
+    contends with the pollers.
+    """
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        families = {}
+        for target in self.targets:
+            for name, description, labels, values, value in target.metrics:
+                family = families.get(name)
+                if family is None:
+                    try:
+                        family = (GaugeMetricFamily(name, description, labels=labels), labels)
+                    except Exception as e:
+                        print(timestamp(), target.name, "Model:", values[1], "- Param:", name, "- Exception:", str(e))
+                        continue
+                    families[name] = family
+                family[0].add_metric(values, value)
+
+        for family, labels in families.values():
+            yield family
+
+        for family in pool_metrics():
+            yield family
+
+        for family in bus_metrics():
+            yield family
+
+
+def pool_metrics():
+    """Metric families of the Modbus TCP connection pools by gateway."""
+
+    labels = ['gateway']
+    size = GaugeMetricFamily('sunspec_pool_size', 'Maximum connections to the gateway', labels=labels)
+    connections = GaugeMetricFamily('sunspec_pool_connections', 'Open connections to the gateway', labels=labels)
+    in_use = GaugeMetricFamily('sunspec_pool_in_use', 'Connections in use by a request', labels=labels)
+    acquires = CounterMetricFamily('sunspec_pool_acquires', 'Connections taken from the pool', labels=labels)
+    reuses = CounterMetricFamily('sunspec_pool_reuses', 'Open connections reused from the pool', labels=labels)
+    waits = CounterMetricFamily('sunspec_pool_waits', 'Requests that waited for a connection', labels=labels)
+    wait_time = CounterMetricFamily('sunspec_pool_wait_seconds', 'Time spent waiting for a connection',
+                                    labels=labels)
+
+    for pool in list(modbus.modbus_tcp_pools.values()):
+        values = ['%s:%d' % (pool.key[0], pool.key[1])]
+        size.add_metric(values, pool.size)
+        connections.add_metric(values, pool.connections())
+        in_use.add_metric(values, pool.in_use)
+        acquires.add_metric(values, pool.acquires)
+        reuses.add_metric(values, pool.reuses)
+        waits.add_metric(values, pool.waits)
+        wait_time.add_metric(values, pool.wait_time)
+
+    return [size, connections, in_use, acquires, reuses, waits, wait_time]
+
+
+def bus_metrics():
+    """Metric families of the RS-485 bus schedulers by serial port."""
+
+    labels = ['port']
+    slave_labels = ['port', 'slave']
+    utilisation = GaugeMetricFamily('sunspec_bus_utilisation', 'Fraction of time the bus was in use', labels=labels)
+    busy = CounterMetricFamily('sunspec_bus_busy_seconds', 'Time the bus was in use', labels=labels)
+    depth = GaugeMetricFamily('sunspec_bus_queue_depth', 'Requests waiting for the bus', labels=labels)
+    requests = CounterMetricFamily('sunspec_bus_requests', 'Requests completed by slave', labels=slave_labels)
+    wait_time = CounterMetricFamily('sunspec_bus_wait_seconds', 'Time requests waited for the bus by slave',
+                                    labels=slave_labels)
+    request_time = CounterMetricFamily('sunspec_bus_request_seconds', 'Time requests used the bus by slave',
+                                       labels=slave_labels)
+
+    for rtu_client in list(modbus.modbus_rtu_clients.values()):
+        scheduler = rtu_client.scheduler
+        utilisation.add_metric([rtu_client.name], scheduler.utilisation())
+        busy.add_metric([rtu_client.name], scheduler.busy_time)
+        depth.add_metric([rtu_client.name], len(scheduler.queue))
+        for slave_id, (count, wait, used) in list(scheduler.slaves.items()):
+            values = [rtu_client.name, str(slave_id)]
+            requests.add_metric(values, count)
+            wait_time.add_metric(values, wait)
+            request_time.add_metric(values, used)
+
+    return [utilisation, busy, depth, requests, wait_time, request_time]
+
+
+def parse_preload(value):
+    """Parse MODEL_PRELOAD, 'all' or a comma separated list of model ids."""
+
+    if value.strip().lower() == 'all':
+        return None
+    return [int(model_id) for model_id in value.split(',') if model_id.strip()]
+
+
+def process_request(target):
+    with req_summary.labels(target.name).time():
+        # Read the models that are due, the collector picks up the updated samples
+        target.update(target.device.read(scheduled=True))
+
 
 #################################################################
 # Main
@@ -55,13 +333,24 @@ if __name__ == '__main__':
     killer = GracefulKiller()
 
     # Get ENV parameters
-    target_addr = os.environ.get('TARGET_IP') or '192.168.1.6'
+    # TARGETS is a comma separated list of ip[:port[:slave_id]] entries and
+    # rtu:port[:slave_id[:baudrate]] entries for slaves on a local serial
+    # port or rtutcp:ip[:port[:slave_id[:baudrate]]] entries for slaves
+    # behind a transparent serial converter. If not set, a single target is
+    # built from TARGET_IP and TARGET_PORT.
+    targets_env = os.environ.get('TARGETS')
+    if targets_env:
+        targets = parse_targets(targets_env)
+    else:
+        target_addr = os.environ.get('TARGET_IP') or '192.168.1.6'
 
-    # Target port
-    try:
-        target_port = int(os.environ.get('TARGET_PORT'))
-    except:
-        target_port = 502
+        # Target port
+        try:
+            target_port = int(os.environ.get('TARGET_PORT'))
+        except:
+            target_port = DEFAULT_TARGET_PORT
+
+        targets = [Target(target_addr, target_port)]
 
     # Listen port
     try:
@@ -75,75 +364,89 @@ if __name__ == '__main__':
     except:
         scrape_interval = 1
 
-    now = datetime.now() # current date and time
-    date_time = now.strftime("[%Y-%m-%d %H:%M:%S]")
+    # Idle time after which a target connection is re-established
+    try:
+        Target.idle_timeout = int(os.environ.get('IDLE_TIMEOUT'))
+    except:
+        Target.idle_timeout = IDLE_TIMEOUT_DEFAULT
+
+    # Per model read intervals, e.g. MODEL_INTERVALS="1:3600,120:3600,121:300".
+    # Models without an interval are read every scrape interval.
+    model_intervals_env = os.environ.get('MODEL_INTERVALS')
+    if model_intervals_env:
+        Target.poll_intervals = parse_intervals(model_intervals_env)
+
+    # Directory for the per target scan cache files
+    Target.scan_cache_dir = os.environ.get('SCAN_CACHE_DIR')
+
+    # Number of read requests in flight per connection, for gateways that
+    # support Modbus TCP transaction ids
+    try:
+        Target.pipeline = int(os.environ.get('PIPELINE'))
+    except:
+        Target.pipeline = 1
+
+    # Concurrent connections per gateway, most gateways accept only a few
+    # Modbus TCP clients
+    try:
+        Target.pool_size = int(os.environ.get('POOL_SIZE'))
+    except:
+        Target.pool_size = modbus.TCP_POOL_SIZE_DEFAULT
+
+    # Worker pool size
+    try:
+        max_workers = int(os.environ.get('MAX_WORKERS'))
+    except:
+        max_workers = min(len(targets), MAX_WORKERS_DEFAULT)
+    # The pool needs at least one worker
+    max_workers = max(max_workers, 1)
+
+    # Model definitions loaded before the first target is contacted, e.g.
+    # MODEL_PRELOAD="all" or MODEL_PRELOAD="1,103,160"
+    model_preload_env = os.environ.get('MODEL_PRELOAD')
+    if model_preload_env:
+        preload_start = time.time()
+        loaded, errors = device.model_types_preload(parse_preload(model_preload_env))
+        preload_time = time.time() - preload_start
+        preload_seconds.set(preload_time)
+        preload_models.set(len(loaded))
+        print(timestamp(), "Preloaded", len(loaded), "model definitions in", "%.3f" % preload_time, "seconds")
+        for model_id, error in sorted(errors.items()):
+            print(timestamp(), "Model", model_id, "preload error:", error)
+
     # Start up the server to expose the metrics.
-    print(date_time, "Starting metrics server on port ", listen_port)
+    prom.REGISTRY.register(SunSpecCollector(targets))
+
+    print(timestamp(), "Starting metrics server on port ", listen_port)
     try:
         prom.start_http_server(listen_port)
-        print(date_time, "Metrics server started")
+        print(timestamp(), "Metrics server started")
     except Exception as e:
-        print(date_time, str(e))
+        print(timestamp(), str(e))
         exit()
 
+    print(timestamp(), "Polling", len(targets), "targets with", max_workers, "workers")
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
     # Main loop
     while not killer.kill_now:
-        now = datetime.now() # current date and time
-        date_time = now.strftime("[%Y-%m-%d %H:%M:%S]")
+        cycle_start = time.time()
 
-        # Try to connect to target
-        print(date_time, "Connecting to SunSpec target on", target_addr, "port", target_port)
-        try:
-            SunSpecDevice = client.SunSpecClientDevice(client.TCP, 1, ipaddr=target_addr, ipport=target_port)
-            print(date_time, "Connected to SunSpec target")
-            
-            try:
-                # Read device once to check capabilities
-                SunSpecDevice.read()
-            
-                # Get all available parameters in device and create a gauge for each one
-                print(date_time, "Available models in device:", SunSpecDevice.models)
-                for model in SunSpecDevice.models:
-                    for param in SunSpecDevice[model].model.points:
-                        if not param in metrics:
-                            point = SunSpecDevice[model].model.points[param]
-                            value = SunSpecDevice[model][param]
-                            unit = point.point_type.units
-                            isNumeric = type(SunSpecDevice[model][param]) in [float, int]
-                            hasUnit = type(unit) is str
-                            if SunSpecDevice[model][param] != None:
-                                print(date_time, "Adding metric", param, "from model", model)
-                                try:
-                                    labels = ['model']
-                                    if isNumeric:
-                                        if hasUnit:
-                                            labels.append('unit')
-                                    else:
-                                        labels.append('value')
-                                    gauge = prom.Gauge( name=param, \
-                                        documentation = point.point_type.description or '', \
-                                        labelnames = labels )
-                                    metrics[param] = gauge
-                                except Exception as e:
-                                    print(date_time, str(e))
-
-                while not killer.kill_now:
-                    process_request()
-                    time.sleep(scrape_interval)
-
-            except Exception as e:
-                print(date_time, str(e))
-                SunSpecDevice.close()
-                print(date_time, "Closed connection to SunSpec server")
-            
-        except Exception as e:
-            print(date_time, str(e))
-            time.sleep(1)
-        
-    try:
-        SunSpecDevice.close()
-        print(date_time, "Closed connection to SunSpec server")
-    except:
-        None
-    
-    print(date_time, "Exited")
+        # Schedule every idle target. Targets still busy with a previous poll
+        # are skipped so they can not hold back the rest of the cycle.
+        for target in targets:
+            if not target.busy and cycle_start >= target.retry_time:
+                target.busy = True
+                executor.submit(target.poll)
+
+        time.sleep(max(0, scrape_interval - (time.time() - cycle_start)))
+
+    executor.shutdown(wait=True)
+
+    for target in targets:
+        target.close()
+
+    for pool in list(modbus.modbus_tcp_pools.values()):
+        pool.close()
+
+    print(timestamp(), "Exited")